@@ -1,8 +1,18 @@
-import xml.etree.ElementTree as ET
-import shutil
-import pandas as pd
+import io
 import os
+import re
+import fnmatch
+from collections import Counter, deque
+from cache import get_document, package_cache
+from utils import filter_frame, read_frame
+from model import load_package
+from profiling import measure, profiled
+from archive import exists_path, is_archive, member_path, open_archive, open_path
+from staging import StagingView, is_up_to_date, resolve, stage_file, staged_source, virtual_names, VIEW_NAME
 
+DTS = '{www.microsoft.com/SqlServer/Dts}'
+SQLTASK = '{www.microsoft.com/sqlserver/dts/tasks/sqltask}'
+EXECUTABLE_COLUMNS = ['RefId', 'ExecutableType', 'ObjectName', 'componentClassID', 'contactInfo', 'description', 'name', 'SqlTaskData']
 
 class SSISMigrator:
     """
@@ -16,6 +26,10 @@ class SSISMigrator:
         get_nodes_by_key: Searches for and retrieves nodes by key, optionally looking a specified number of levels up.
         extract_executable_type: Extracts information about executable types from the parsed XML data.
         get_df: Converts the extracted executable type information into a pandas DataFrame.
+        iter_executable_types: Streams the executable type rows of an XML file without building the nested dictionary.
+        get_df_streaming: Builds the get_df DataFrame straight from an XML file using incremental parsing.
+        parse_model: Parses an XML file into the compact Package model of model.py.
+        get_df_model: Builds the get_df DataFrame from the Package model.
     """
     def parse_node(self, node):
         """
@@ -32,6 +46,8 @@ class SSISMigrator:
 
         # Parse sub-nodes
         for sub_node in node:
+            if not isinstance(sub_node.tag, str):
+                continue
             sub_node_data = self.parse_node(sub_node)
             sub_node_tag = sub_node.tag
 
@@ -49,11 +65,12 @@ class SSISMigrator:
 
         return parsed_data
 
+    @profiled('parse', 'file_path')
     def parse_xml_file(self, file_path):
         """
         Parses an entire XML file into a nested dictionary structure.
         """
-        tree = ET.parse(file_path)
+        tree = get_document(file_path).tree
         root = tree.getroot()
         parsed_data = {root.tag: self.parse_node(root)}
         return parsed_data
@@ -143,58 +160,322 @@ class SSISMigrator:
                 self.extract_executable_type(item, result)
         return result
     
-    def get_df(self, data:dict) -> pd.DataFrame:
+    @profiled('get_df')
+    def get_df(self, data:dict) -> 'pd.DataFrame':
         """
         Converts the extracted executable type information into a pandas DataFrame.
         """
+        import pandas as pd
         executable_types = self.extract_executable_type(data)
         df = pd.DataFrame(executable_types)
         return df
 
+    @profiled('parse_streaming', 'file_path')
+    def iter_executable_types(self, file_path):
+        """
+        Streams the executable type rows of an XML file using incremental parsing.
+
+        Yields the same rows as extract_executable_type, in the same order, as soon as each one is complete: a
+        container's row before its children are read, a task's row at its end tag. Every element is cleared and
+        detached as soon as its end tag is read, so peak memory does not grow with the size of the package. A package that is
+        already in the shared document cache is streamed from its cached bytes instead of being read again.
+        """
+        document = package_cache.peek(file_path)
+        source = io.BytesIO(document.data) if document is not None else open_path(resolve(file_path))
+        with source:
+            yield from self._stream_executable_types(source)
+
+    def _stream_executable_types(self, source):
+        pending = deque()
+        stack = []
+        executables = []
+
+        import xml.etree.ElementTree as ET
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                parent = stack[-1] if stack else None
+                current = executables[-1] if executables else None
+                if f'{DTS}ExecutableType' in elem.attrib and ".EventHandlers" not in elem.attrib.get(f'{DTS}refId', ''):
+                    # a container's own row is complete once its first child starts, emit it before the children
+                    if current is not None and current['rows'] is None:
+                        self._finish_streamed_executable(current)
+                    current = {
+                        'element': elem,
+                        'RefId': elem.attrib.get(f'{DTS}refId', ''),
+                        'ExecutableType': elem.attrib[f'{DTS}ExecutableType'],
+                        'ObjectName': elem.attrib.get(f'{DTS}ObjectName', ''),
+                        'object_data': None,
+                        'components': [],
+                        'SqlTaskData': None,
+                        'rows': None,
+                    }
+                    executables.append(current)
+                    pending.append(current)
+                    while pending[0]['rows'] is not None:
+                        yield from pending.popleft()['rows']
+                elif current is not None and parent is current['element'] and elem.tag == f'{DTS}ObjectData':
+                    if current['object_data'] is None:
+                        current['object_data'] = elem
+                elif current is not None and current['object_data'] is not None:
+                    path = [node.tag for node in stack[-3:]] + [elem.tag]
+                    if elem.tag == f'{SQLTASK}SqlTaskData' and parent is current['object_data']:
+                        current['SqlTaskData'] = elem.attrib.get(f'{SQLTASK}SqlStatementSource')
+                    elif path == [f'{DTS}ObjectData', 'pipeline', 'components', 'component'] and stack[-3] is current['object_data']:
+                        current['components'].append(dict(elem.attrib))
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if executables and executables[-1]['element'] is elem:
+                executable = executables.pop()
+                if executable['rows'] is None:
+                    self._finish_streamed_executable(executable)
+                executable['element'] = executable['object_data'] = None
+                while pending and pending[0]['rows'] is not None:
+                    yield from pending.popleft()['rows']
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+    def _finish_streamed_executable(self, executable):
+        """
+        Turns the state collected for one streamed executable into its extract_executable_type rows. Called at its end
+        tag, or for a container at the start of its first child: containers hold no ObjectData of their own.
+        """
+        base = {
+            'RefId': executable['RefId'],
+            'ExecutableType': executable['ExecutableType'],
+            'ObjectName': executable['ObjectName'],
+        }
+        if executable['ExecutableType'].lower() == 'microsoft.pipeline' and executable['object_data'] is not None:
+            executable['rows'] = [dict(base, **{
+                'componentClassID': component.get('componentClassID', ''),
+                'contactInfo': component.get('contactInfo', ''),
+                'description': component.get('description', ''),
+                'name': component.get('name', ''),
+                'SqlTaskData': ''
+            }) for component in executable['components']]
+        else:
+            executable['rows'] = [dict(base, **{
+                'componentClassID': '',
+                'contactInfo': '',
+                'description': '',
+                'name': '',
+                'SqlTaskData': executable['SqlTaskData']
+            })]
+
+    def get_df_streaming(self, file_path) -> 'pd.DataFrame':
+        """
+        Builds the get_df DataFrame straight from an XML file using incremental parsing.
+        """
+        import pandas as pd
+        return pd.DataFrame(list(self.iter_executable_types(file_path)))
+
+    @profiled('parse_model', 'file_path')
+    def parse_model(self, file_path):
+        """
+        Parses an XML file into the compact Package model of model.py, with attribute access to its executables,
+        components, precedence constraints, connection managers, variables and parameters.
+        """
+        return load_package(file_path)
+
+    def get_df_model(self, file_path) -> 'pd.DataFrame':
+        """
+        Builds the get_df DataFrame from the Package model of an XML file.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.parse_model(file_path).rows())
+
+
+class PathMatcher:
+    """
+    Precompiled matcher for path components (directory or file names).
+
+    A plain word matches any component containing it, case-insensitively, as valid_dirs always did. A pattern with
+    glob characters (* ? [) must match a whole component, e.g. "DataLake*", and a pattern prefixed with "re:" is a
+    regular expression searched in each component. All patterns are compiled into a single regex.
+    """
+    def __init__(self, patterns):
+        alternatives = []
+        for pattern in patterns or []:
+            if pattern.startswith('re:'):
+                alternatives.append(f'.*?(?:{pattern[3:]}).*')
+            elif any(character in pattern for character in '*?['):
+                alternatives.append(fnmatch.translate(pattern))
+            else:
+                alternatives.append(f'.*{re.escape(pattern)}.*')
+        self.regex = re.compile('|'.join(f'(?:{alternative})' for alternative in alternatives), re.IGNORECASE | re.DOTALL) if alternatives else None
+
+    def __bool__(self) -> bool:
+        return self.regex is not None
+
+    def matches(self, component:str) -> bool:
+        return self.regex is not None and self.regex.fullmatch(component) is not None
+
+    def matches_any(self, path:str) -> bool:
+        return any(self.matches(component) for component in re.split(r'[\\/]', path) if component)
+
 
 class SSISDiscovery:
     """
     Discovers SSIS package files (.dtsx) within a specified directory.
     
     Methods:
+        iter_files: Lazily yields the file paths with the specified extension while the directory tree is walked.
         get_files: Retrieves a list of file paths for files with a specified extension.
-        extract_dtsx_files: Copies discovered .dtsx files to a target directory, renaming them for uniqueness.
+        target_path: Returns the path a discovered file is copied to.
+        extract_files: Stages discovered files in a target directory (copies, links or a virtual view), renaming them for uniqueness.
     """
-    def __init__(self, root_directory:str, valid_dirs:list=['csv'], file_extension:str=".dtsx"):
+    def __init__(self, root_directory:str, valid_dirs:list=['csv'], file_extension:str=".dtsx", exclude_dirs:list=['Archive'], workers:int=1):
         """
         Initializes the SSISDiscovery with a root directory to search within.
+
+        Args:
+            root_directory (str): directory to search.
+            valid_dirs (list): include patterns, a file is kept when any component of its path matches one (see PathMatcher).
+            file_extension (str): extension of the files to discover.
+            exclude_dirs (list): patterns of directories below root_directory that are skipped without descending into them.
+            workers (int): number of threads walking the top-level folders concurrently, useful on network shares.
         """
         self.root_directory = root_directory
         self.valid_dirs = valid_dirs
         self.file_extension = file_extension
+        self.exclude_dirs = exclude_dirs
+        self.workers = workers
+        self.include = PathMatcher(valid_dirs)
+        self.exclude = PathMatcher(exclude_dirs)
+
+    def _scan(self, directory:str, included:bool) -> tuple:
+        """
+        Lists one directory: returns the matching files (including the virtual ones of a staging view) and the
+        (path, included) pairs of the subdirectories that are not excluded.
+        """
+        files = []
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not self.exclude.matches(entry.name):
+                        subdirectories.append((entry.path, included or self.include.matches(entry.name)))
+                elif entry.name == VIEW_NAME:
+                    files.extend(os.path.join(directory, name) for name in virtual_names(directory)
+                                 if name.endswith(self.file_extension) and (included or self.include.matches(name)))
+                elif entry.name.endswith(self.file_extension) and (included or self.include.matches(entry.name)):
+                    files.append(entry.path)
+        return files, subdirectories
+
+    def _walk(self, directory:str, included:bool):
+        """
+        Yields the matching files below directory, files of a directory before its subdirectories.
+        included is True when a component above directory already matched the include patterns.
+        """
+        stack = [(directory, included)]
+        while stack:
+            try:
+                files, subdirectories = self._scan(*stack.pop())
+            except OSError:
+                continue
+            yield from files
+            stack.extend(reversed(subdirectories))
+
+    @profiled('discovery')
+    def iter_files(self):
+        """
+        Lazily yields the file paths with the specified extension, so processing can start while the walk continues.
+        Excluded directories are pruned before descending into them. With workers > 1 the top-level folders are
+        walked concurrently and their files are yielded folder by folder, in listing order.
+        """
+        included = not self.include or self.include.matches_any(self.root_directory)
+        if is_archive(self.root_directory):
+            yield from self._archive_files(included)
+            return
+        if self.workers <= 1:
+            yield from self._walk(self.root_directory, included)
+            return
+
+        try:
+            files, folders = self._scan(self.root_directory, included)
+        except OSError:
+            return
+        yield from files
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for files in executor.map(lambda folder: list(self._walk(*folder)), folders):
+                yield from files
+
+    def _archive_files(self, included:bool):
+        """
+        Yields the member paths of a zip or tar root_directory that match, filtering on the archive index alone.
+        """
+        for name, _, _ in open_archive(self.root_directory).members():
+            parts = name.split('/')
+            if not parts[-1].endswith(self.file_extension) or any(self.exclude.matches(part) for part in parts[:-1]):
+                continue
+            if included or any(self.include.matches(part) for part in parts):
+                yield member_path(self.root_directory, name)
 
     def get_files(self) -> list:
         """
         Retrieves a list of file paths for files with a specified extension.
         """
-        final_files = []
-        for root, dirs, files in os.walk(self.root_directory):
-            if 'Archive' not in root:
-                for file in files:
-                    file = os.path.join(root, file)
-                    if file.endswith(self.file_extension) and any(word.lower() in file.lower() for word in self.valid_dirs):
-                        final_files.append(file)
-        return final_files
+        return list(self.iter_files())
     
-    def extract_files(self, target_dir, files, add_prefix:bool=True):
+    def target_path(self, target_dir, file_path, add_prefix:bool=True) -> str:
         """
-        Copies discovered .dtsx files to a target directory, renaming them for uniqueness.
+        Returns the path a discovered file is copied to, prefixed with its parent directory name when add_prefix is set.
         """
         if add_prefix:
-            for file_path in files:
-                parent_dir_name = os.path.basename(os.path.dirname(file_path))
-                new_file_name = f"{parent_dir_name}_{os.path.basename(file_path)}"
-                target_path = os.path.join(target_dir, new_file_name)
-                shutil.copy(file_path, target_path)
-        else:
-            for file_path in files:
-                target_path = os.path.join(target_dir, os.path.basename(file_path))
-                shutil.copy(file_path, target_path)
+            parent_dir_name = os.path.basename(os.path.dirname(file_path))
+            return os.path.join(target_dir, f"{parent_dir_name}_{os.path.basename(file_path)}")
+        return os.path.join(target_dir, os.path.basename(file_path))
+
+    @profiled('staging')
+    def extract_files(self, target_dir, files, add_prefix:bool=True, mode:str='copy', owners:dict=None) -> list:
+        """
+        Stages discovered files in a target directory under names made unique by target_path.
+
+        mode is one of staging.STAGING_MODES: 'copy', 'hardlink', 'reflink' and 'symlink' (falling back to a copy
+        where the filesystem refuses links), 'auto' (hardlink, then reflink, then copy) or 'virtual', which writes
+        nothing but the directory's StagingView. Targets that already stage their source are skipped.
+
+        Two files that map to the same target name are never overwritten: the first one is kept, the others are
+        reported in self.collisions as (target, kept source, rejected source). owners maps the absolute targets
+        staged by earlier runs to their source, so a new file cannot take the name of an unchanged one that is not
+        passed again; an owner that no longer exists gives its name up. Returns the target paths, None for
+        the rejected files. self.staging_counts counts the files per method used, plus 'skipped'.
+        """
+        target_paths = []
+        claimed = {}
+        owners = owners or {}
+        self.collisions = []
+        self.staging_counts = Counter()
+        view = StagingView(target_dir) if mode == 'virtual' else None
+        for file_path in files:
+            target_path = self.target_path(target_dir, file_path, add_prefix)
+            current = claimed.get(target_path) or owners.get(os.path.abspath(target_path)) or staged_source(target_path)
+            if current is not None and os.path.abspath(current) != os.path.abspath(file_path) and exists_path(current):
+                self.collisions.append((target_path, current, file_path))
+                target_paths.append(None)
+                continue
+            claimed[target_path] = file_path
+
+            with measure('stage_file', file_path):
+                if view is not None:
+                    if os.path.lexists(target_path):
+                        os.remove(target_path)
+                    view.add(os.path.basename(target_path), file_path)
+                    self.staging_counts['virtual'] += 1
+                elif is_up_to_date(file_path, target_path, mode):
+                    self.staging_counts['skipped'] += 1
+                else:
+                    self.staging_counts[stage_file(file_path, target_path, mode)] += 1
+            target_paths.append(target_path)
+
+        if view is not None:
+            view.save()
+        for target_path, kept, rejected in self.collisions:
+            print(f"Name collision on {target_path}: keeping {kept}, skipping {rejected}")
+        return target_paths
     
 class SSISAnalyzer(SSISDiscovery):
     """
@@ -205,24 +486,54 @@ class SSISAnalyzer(SSISDiscovery):
         get_and_save_unique_values: Extracts and saves unique values from a specified column in the combined DataFrame.
     """
     
-    def read_all_files(self) -> pd.DataFrame:
+    @profiled('read_all_files')
+    def read_all_files(self, manifest=None, previous:'pd.DataFrame'=None, columns:list=None, filters:list=None) -> 'pd.DataFrame':
         """
         Reads and combines data from all discovered .dtsx files into a single DataFrame.
+
+        When a manifest and the previously combined DataFrame are given, only added or changed files are read; the
+        rows of unchanged files are reused from previous and every other row of previous is dropped.
+
+        Per-package .parquet and .arrow files already carry their File_path column and are loaded with column
+        projection and filter pushdown (see utils.read_frame); for CSV files columns and filters are applied after
+        reading.
         """
+        import pandas as pd
         # Iterate through the list of CSV file paths
         csv_files = self.get_files()
         dataframes = []
-        for file_path in csv_files:
-            df = pd.read_csv(file_path)
-            df['File_path'] = file_path.split("\\")[-1].replace('.csv', '')
-            dataframes.append(df)
+        if manifest is not None and previous is not None:
+            changes = manifest.diff(csv_files)
+            unchanged = {self._package_name(file_path) for file_path in changes['unchanged']}
+            for file_path in changes['deleted']:
+                manifest.remove(file_path)
+            dataframes.append(filter_frame(previous[previous['File_path'].isin(unchanged)], columns, filters))
+            csv_files = changes['added'] + changes['changed']
+
+        if self.file_extension in ('.parquet', '.arrow'):
+            if csv_files:
+                dataframes.append(read_frame(csv_files, columns, filters))
+        else:
+            for file_path in csv_files:
+                with measure('read_csv', file_path):
+                    df = pd.read_csv(file_path)
+                df['File_path'] = self._package_name(file_path)
+                dataframes.append(filter_frame(df, columns, filters))
+
+        if manifest is not None:
+            for file_path in csv_files:
+                manifest.record(file_path)
 
         return pd.concat(dataframes, ignore_index=True)
+
+    def _package_name(self, file_path:str) -> str:
+        return file_path.split("\\")[-1].replace(self.file_extension, '')
         
-    def get_and_save_unique_values(self, df: pd.DataFrame, column_name: str) -> None:
+    def get_and_save_unique_values(self, df: 'pd.DataFrame', column_name: str) -> None:
         """
         Extracts and saves unique values from a specified column in the combined DataFrame.
         """
+        import pandas as pd
         unique_values = df[column_name].unique()
         unique_df = pd.DataFrame(unique_values, columns=[column_name])
         unique_df.to_csv(self.root_directory.replace("\\csv", "\\analysis") + '\\' + f'total_{column_name}.csv', index=False)
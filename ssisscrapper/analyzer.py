@@ -1,119 +1,272 @@
 #%%
 
 #FIRST PART ANALYZING AND GROUPING DIFFERENT PACKAGES FOR DIFFERENT VARIABLES
+import argparse
+import glob
 import pandas as pd
 import json
 import os
 import re
-from utils import dependencies, extract_sql_data, extract_values
+from utils import dependencies, extract_sql_data, read_frame, write_frame, OUTPUT_FORMATS
 from SSISModule import SSISAnalyzer, SSISDiscovery
+from manifest import Manifest
+from spcatalog import StoredProcedureCatalog
+from catalog import Catalog
+from stages import StageRunner
+from lineage import LineageIndex
+from impact import ImpactIndex
+from params import ParameterResolver
+from profiling import Profiler
+from xpath import ExtractionEngine, XPathPattern, COMPONENT_PROPERTIES
 
 
 path = os.getcwd()
-root_directory = os.path.join(path, "csv")
+# csv, parquet or arrow, matching the --format used by main.py
+output_format = os.environ.get("SSIS_OUTPUT_FORMAT", "csv")
+extension = OUTPUT_FORMATS[output_format]
+# bing folder or a zip/tar archive of it, matching the --source used by main.py
+source = os.environ.get("SSIS_SOURCE", "bing")
+root_directory = os.path.join(path, output_format)
 target_dir = os.path.join(path, "analysis")
+all_joined_path = f"{target_dir}\\all_joined{extension}"
+valid_dirs = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart']
 
-disc = SSISAnalyzer(root_directory=root_directory, valid_dirs=['csv'], file_extension=".csv")
-df = disc.read_all_files()
-df.to_csv(f"{target_dir}\\all_joined.csv", index=True)
+manifest_dir = os.path.join(path, "manifest")
+os.makedirs(manifest_dir, exist_ok=True)
+# SQLITE CATALOG LOADED BY main.py --catalog, WHEN SET all_joined IS QUERIED FROM IT INSTEAD OF RE-READ FROM DISK
+catalog_path = os.environ.get("SSIS_CATALOG")
 
-#ALL DISTINCT EXEUTABLE TYPES THAT ARE IN THE PACKAGES WE ARE ANALYZING
-disc.get_and_save_unique_values(df, column_name='ExecutableType')
+# EVERY STEP IS A STAGE WITH DECLARED INPUTS AND OUTPUTS, UP TO DATE STAGES ARE SKIPPED ON THE NEXT RUN
+runner = StageRunner(os.path.join(manifest_dir, "analyzer_stages.json"))
 
-#ALL THE QUERIES AND STORE PROCEDURES THAT ARE IN THE PACKAGES WE ARE ANALYZING
-disc.get_and_save_unique_values(df, column_name='SqlTaskData')
 
-columns=['RefId', 'SqlTaskData']
-df_grouped = df.groupby(columns, as_index=True).count().reset_index(inplace=False)
-df_grouped.to_csv(f"{target_dir}\\group_by_{'-'.join(columns)}.csv", index=True)
+def package_tables():
+    return SSISAnalyzer(root_directory=root_directory, valid_dirs=[output_format], file_extension=extension).get_files()
 
+def source_packages():
+    return SSISDiscovery(os.path.join(path, source), valid_dirs=valid_dirs, file_extension=".dtsx").get_files()
 
+def params_files():
+    return SSISAnalyzer(root_directory=os.path.join(path, "Sources_and_catalogs"), valid_dirs=['Sources_and_catalogs'], file_extension=".params").get_files()
 
-#TOTAL PACKAGES BEING CALLED BY PARENT PACKAGES
-df_parent_packages = pd.read_csv(f"{target_dir}\\group_by_File_path-ExecutableType.csv")
-df_parent_packages.reset_index(inplace=True, drop=True)
-# df_parent_packages.drop(columns=['index'], inplace=True)
-# df_parent_packages = df_parent_packages[df_parent_packages.columns[:3]]
-df = df_parent_packages.where(df_parent_packages['ExecutableType'] == 'Microsoft.ExecutePackageTask').dropna()
-df.rename(columns={'RefId':'TotalPackagesCalled'}, inplace=True)
-df.to_csv(f"{target_dir}\\total_ParentPackages.csv", index=False)
+def connection_manager_files():
+    return SSISAnalyzer(root_directory=os.path.join(path, "Sources_and_catalogs"), valid_dirs=['Sources_and_catalogs'], file_extension=".conmgr").get_files()
 
+def sql_files():
+    return SSISAnalyzer(root_directory=os.path.join(path, "StoreProcedures"), valid_dirs=[".sql"], file_extension=".sql").get_files()
 
-#TOTAL STORE PROCEDURES CALLED IN ALL PACKAGES AND QUERIES
-#filter by "EXEC" or "EXECUTE" in each row in column "sql Task Data"
+def jams_files():
+    return sorted(glob.glob(os.path.join(target_dir, "*_Jams.json")))
 
-df = pd.read_csv(f"{target_dir}\\all_joined.csv")
-df = df[df['SqlTaskData'].str.contains('^[" ]?Exec', case=False, na=False)]
-df['store_procedure_name'] = df['SqlTaskData'].str.extract('(sp[a-zA-Z_]+)', flags=re.IGNORECASE)[0]
-#EXEC\s+([a-zA-Z_.\[\]]+)|Execute\s+([a-zA-Z_.\[\]]+)
-df = df[['File_path', 'store_procedure_name']].drop_duplicates()
-df.to_csv(f"{target_dir}\\total_StoreProcedures.csv", index=False)
+def read_csv(file_path, **kwargs):
+    return lambda: pd.read_csv(file_path, **kwargs)
 
 
+def load_all_joined():
+    # the csv is written with its index, read it back as the index so a skipped stage returns the same columns
+    return pd.read_csv(all_joined_path, index_col=0) if output_format == 'csv' else read_frame(all_joined_path)
 
-#GENERATE TREE OF DEPENDENCIES
-dir_path = os.path.join(path, "bing")
-target_dir = os.path.join(path, "analysis")
-valid_dirs = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart']
 
-discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".dtsx")
-files_path = discovery.get_files()
+#%%
+# REUSES THE ROWS OF UNCHANGED PACKAGES FROM THE PREVIOUS all_joined FILE
+@runner.stage('all_joined', files=lambda: [catalog_path] if catalog_path else package_tables(), outputs=[all_joined_path],
+              load=load_all_joined, params={'catalog': catalog_path, 'format': output_format})
+def all_joined():
+    if catalog_path:
+        with Catalog(catalog_path) as ssis_catalog:
+            df = ssis_catalog.all_joined()
+    else:
+        disc = SSISAnalyzer(root_directory=root_directory, valid_dirs=[output_format], file_extension=extension)
+        manifest = Manifest(os.path.join(manifest_dir, f"all_joined_{output_format}.json"))
+        previous = None
+        if os.path.exists(all_joined_path):
+            previous = load_all_joined()
+        df = disc.read_all_files(manifest=manifest, previous=previous)
+        manifest.save()
+    write_frame(df, all_joined_path, output_format, index=output_format == 'csv')
+    return df
+
+
+#ALL DISTINCT EXEUTABLE TYPES AND ALL THE QUERIES AND STORE PROCEDURES THAT ARE IN THE PACKAGES WE ARE ANALYZING
+def unique_values_stage(column_name):
+    output = f"{target_dir}\\total_{column_name}.csv"
+
+    def unique_values(df):
+        unique_df = pd.DataFrame(df[column_name].unique(), columns=[column_name])
+        unique_df.to_csv(output, index=False)
+        return unique_df
+    runner.add(f'total_{column_name}', unique_values, deps=['all_joined'], outputs=[output], load=read_csv(output), params={'column': column_name})
+
+unique_values_stage('ExecutableType')
+unique_values_stage('SqlTaskData')
+
+
+def group_by_stage(columns, count=None):
+    # counts the non-empty values of every other column, or of the count column only
+    output = f"{target_dir}\\group_by_{'-'.join(columns)}.csv"
+
+    def group_by(df):
+        grouped = df.groupby(columns, as_index=True)
+        df_grouped = (grouped[count] if count else grouped).count().reset_index(inplace=False)
+        df_grouped.to_csv(output, index=True)
+        return df_grouped
+    runner.add(f"group_by_{'-'.join(columns)}", group_by, deps=['all_joined'], outputs=[output],
+               load=read_csv(output, index_col=0), params={'columns': columns, 'count': count})
+
+group_by_stage(['RefId', 'SqlTaskData'])
+group_by_stage(['File_path', 'ExecutableType'], count='RefId')
+
+
+#%%
+#TOTAL PACKAGES BEING CALLED BY PARENT PACKAGES
+@runner.stage('total_ParentPackages', deps=['group_by_File_path-ExecutableType'], outputs=[f"{target_dir}\\total_ParentPackages.csv"],
+              load=read_csv(f"{target_dir}\\total_ParentPackages.csv"))
+def parent_packages(df_parent_packages):
+    df_parent_packages = df_parent_packages.reset_index(drop=True)
+    df = df_parent_packages.where(df_parent_packages['ExecutableType'] == 'Microsoft.ExecutePackageTask').dropna()
+    df = df.rename(columns={'RefId':'TotalPackagesCalled'})
+    df.to_csv(f"{target_dir}\\total_ParentPackages.csv", index=False)
+    return df
 
-map_dict = {}
 
-for file_path in files_path:
-    package_name = "|".join(file_path.split("\\")[-2:])
-    map_dict.update({package_name: dependencies(file_path)})
+#TOTAL STORE PROCEDURES CALLED IN ALL PACKAGES AND QUERIES
+#filter by "EXEC" or "EXECUTE" in each row in column "sql Task Data"
+@runner.stage('total_StoreProcedures', deps=['all_joined'], outputs=[f"{target_dir}\\total_StoreProcedures.csv"],
+              load=read_csv(f"{target_dir}\\total_StoreProcedures.csv"))
+def stored_procedures(df):
+    df = df[['File_path', 'SqlTaskData']]
+    df = df[df['SqlTaskData'].str.contains('^[" ]?Exec', case=False, na=False)]
+    df = df.assign(store_procedure_name=df['SqlTaskData'].str.extract('(sp[a-zA-Z_]+)', flags=re.IGNORECASE)[0])
+    #EXEC\s+([a-zA-Z_.\[\]]+)|Execute\s+([a-zA-Z_.\[\]]+)
+    df = df[['File_path', 'store_procedure_name']].drop_duplicates()
+    df.to_csv(f"{target_dir}\\total_StoreProcedures.csv", index=False)
+    return df
 
-with open(os.path.join(target_dir,'parenthood_relations.json') , "w") as f:
-    f.write(json.dumps(map_dict, indent=4))
 
 #%%
+#GENERATE TREE OF DEPENDENCIES
+def load_parenthood_relations():
+    with open(os.path.join(target_dir, 'parenthood_relations.json'), 'r') as f:
+        return json.load(f)
+
+@runner.stage('parenthood_relations', files=source_packages, outputs=[os.path.join(target_dir, 'parenthood_relations.json')],
+              load=load_parenthood_relations)
+def parenthood_relations():
+    files_path = source_packages()
+
+    map_dict = {}
+    manifest = Manifest(os.path.join(manifest_dir, "parenthood_relations.json"))
+    changes = manifest.diff(files_path)
+    unchanged = set(changes['unchanged'])
+    for file_path in changes['deleted']:
+        manifest.remove(file_path)
+
+    for file_path in files_path:
+        package_name = "|".join(file_path.split("\\")[-2:])
+        if file_path in unchanged:
+            map_dict.update({package_name: manifest.data(file_path)})
+        else:
+            map_dict.update({package_name: dependencies(file_path)})
+            manifest.record(file_path, data=map_dict[package_name])
+    manifest.save()
+
+    with open(os.path.join(target_dir,'parenthood_relations.json') , "w") as f:
+        f.write(json.dumps(map_dict, indent=4))
+    return map_dict
 
-# GETS ALL THE SOURCES AND CATALOGS USED IN THE PACKAGES FOR EACH PROJECT
-root_directory = os.path.join(path, "Sources_and_catalogs")
-disc = SSISAnalyzer(root_directory=root_directory, valid_dirs=['Sources_and_catalogs'], file_extension=".params")
-all_files_path = disc.get_files()
-pattern = "//*[local-name()='Parameter']/*[local-name()='Properties']/*[local-name()='Property'][7]/text()"
-df = extract_values(all_files_path, pattern, split_values=True, add_prefix=False)
-df.to_csv(f"{target_dir}\\sources_and_catalogs.csv", index=False)   
 
 #%%
-import pandas as pd
+# COLUMN LEVEL LINEAGE OF EVERY DATA FLOW, FROM SOURCE TABLE COLUMNS THROUGH TRANSFORMS TO DESTINATION TABLE COLUMNS
+# ids and names are read as text, so numeric lineage ids stay "123" and match the nodes of a fresh build
+@runner.stage('column_lineage', files=source_packages, outputs=[f"{target_dir}\\column_lineage.csv", f"{target_dir}\\column_lineage_paths.csv"],
+              load=lambda: LineageIndex.from_frame(pd.read_csv(f"{target_dir}\\column_lineage.csv", dtype=str),
+                                                   pd.read_csv(f"{target_dir}\\column_lineage_paths.csv", dtype=str)))
+def column_lineage():
+    index = LineageIndex.from_packages(source_packages(), add_prefix=True)
+    index.edges_frame().to_csv(f"{target_dir}\\column_lineage.csv", index=False)
+    index.paths_frame().to_csv(f"{target_dir}\\column_lineage_paths.csv", index=False)
+    return index
 
-df = pd.read_csv(path + "\\analysis\\total_StoreProcedures.csv")
 
-root_directory = os.path.join(path, "StoreProcedures")
-disc = SSISAnalyzer(root_directory=root_directory, valid_dirs=[".sql"], file_extension=".sql")
-all_files_path = disc.get_files()
-        
-for file_path in all_files_path:
-    with open(file_path, "r") as f:
-        data = f.read()
-        file_name = re.findall("(sp[a-zA-Z_]+)", file_path.replace(root_directory, ""))
-        file_name = file_name[0] if len(file_name) > 0 else ""       
-        df.loc[df['store_procedure_name'] == file_name, 'SqlTaskData'] = data
-        df.loc[df['store_procedure_name'] == file_name, 'Match'] = True
+#%%
+# GETS ALL THE SOURCES AND CATALOGS USED BY EACH PACKAGE, ITS CONNECTION MANAGERS RESOLVED AGAINST THE PROJECT PARAMETERS
+# ONE ROW PER PACKAGE, CONNECTION MANAGER (ITS OWN OR A PROJECT .conmgr IT USES) AND CONNECTION PROPERTY (Data Source, ...),
+# THEN THE PROJECT PARAMETERS NO CONNECTION MANAGER READS
+@runner.stage('sources_and_catalogs', files=lambda: params_files() + connection_manager_files() + source_packages(), outputs=[f"{target_dir}\\sources_and_catalogs.csv"],
+              load=read_csv(f"{target_dir}\\sources_and_catalogs.csv"))
+def sources_and_catalogs():
+    resolver = ParameterResolver(params_files(), connection_manager_files())
+    df = resolver.sources_and_catalogs(source_packages(), add_prefix=True)
+    df.to_csv(f"{target_dir}\\sources_and_catalogs.csv", index=False)
+    return df
 
-df_final = extract_sql_data(df, columns_to_keep=['File_path', 'store_procedure_name', 'Extracted', 'db'])        
-df = df[['File_path', 'store_procedure_name', 'Match']]
-df.to_csv(path + "\\analysis\\matching_SPname_with_SPfiles.csv", index=False)
-df_final.to_csv(path + "\\analysis\\extracted_sql_from_sp.csv", index=False)
 
+#%%
+# MATCHES EVERY REFERENCED SP AGAINST THE NORMALIZED NAME INDEX AND LOADS ONLY THE MATCHED BODIES
+@runner.stage('sp_matching', deps=['total_StoreProcedures'], files=sql_files,
+              outputs=[path + "\\analysis\\matching_SPname_with_SPfiles.csv", path + "\\analysis\\extracted_sql_from_sp.csv"],
+              load=read_csv(path + "\\analysis\\extracted_sql_from_sp.csv"))
+def sp_matching(df):
+    catalog = StoredProcedureCatalog(sql_files())
+    df = catalog.match(df, 'store_procedure_name')
+    df['SqlTaskData'] = catalog.load_bodies(df['sp_file'])
+
+    df_final = extract_sql_data(df, columns_to_keep=['File_path', 'store_procedure_name', 'Extracted', 'db'])
+    df = df[['File_path', 'store_procedure_name', 'Match']]
+    df.to_csv(path + "\\analysis\\matching_SPname_with_SPfiles.csv", index=False)
+    df_final.to_csv(path + "\\analysis\\extracted_sql_from_sp.csv", index=False)
+    return df_final
 
 
 #EXTRACTING ALL DATA CONSIDERED RELEVANT FROM QUERIES AND STORE PROCEDURES IN THE PACKAGES
-root_directory = os.path.join(path, "bing")
-disc = SSISAnalyzer(root_directory=root_directory, valid_dirs=['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart'], file_extension=".dtsx")
-all_files_path = disc.get_files()
+@runner.stage('tables_sql', deps=['all_joined'], files=source_packages, outputs=[path + "\\analysis\\tables_sql.csv"],
+              load=read_csv(path + "\\analysis\\tables_sql.csv"))
+def tables_sql(df):
+    engine = ExtractionEngine([XPathPattern('components', COMPONENT_PROPERTIES, add_prefix=True)])
+    df2 = engine.run(source_packages())['components']
 
-pattern = "//*[local-name()='component']/*[local-name()='properties']/*[local-name()='property']/text()"
-df2 = extract_values(all_files_path, pattern, add_prefix=True)
-df = pd.read_csv(path + "\\analysis\\all_joined.csv")
+    df_concatenated = pd.concat([df, df2], axis=0, ignore_index=True).sort_values(by="File_path")
 
-df_concatenated = pd.concat([df, df2], axis=0, ignore_index=True).sort_values(by="File_path")
+    df_final = extract_sql_data(df_concatenated)
+    df_final.to_csv(path + "\\analysis\\tables_sql.csv", index=False)
+    return df_final
 
-df_final = extract_sql_data(df_concatenated)
-df_final.to_csv(path + "\\analysis\\tables_sql.csv", index=False)
 
-#%%
\ No newline at end of file
+#%%
+# REACHABILITY INDEX OVER JAMS JOBS, PACKAGES, STORED PROCEDURES AND TABLES, e.g. EVERY JOB AND PACKAGE AFFECTED BY A TABLE
+# index.impact(('table', 'dbo.DimDate')) OR index.downstream(('job', name), kinds='table')
+@runner.stage('impact_index', deps=['parenthood_relations', 'total_StoreProcedures', 'tables_sql', 'sp_matching'], files=jams_files,
+              outputs=[f"{target_dir}\\impact_edges.csv"], load=lambda: ImpactIndex.from_frame(pd.read_csv(f"{target_dir}\\impact_edges.csv", dtype=str, keep_default_na=False)))
+def impact_index(map_dict, df_procedures, df_tables, df_procedure_tables):
+    index = ImpactIndex()
+    index.add_package_dependencies(map_dict)
+    index.add_procedure_calls(df_procedures)
+    index.add_table_references(df_tables)
+    index.add_table_references(df_procedure_tables, source='procedure')
+    for jobs_path in jams_files():
+        with open(jobs_path, 'r') as f:
+            index.add_jobs(json.load(f))
+    index.edges_frame().to_csv(f"{target_dir}\\impact_edges.csv", index=False)
+    return index.build()
+
+
+#%%
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Runs the analysis stages whose inputs changed since the last run.")
+    parser.add_argument('stages', nargs='*', help=f"Stages to run with their dependencies (default: all): {', '.join(runner.stages)}")
+    parser.add_argument('--workers', type=int, default=4, help="Number of independent stages run at the same time.")
+    parser.add_argument('--force', action='store_true', help="Run the stages even if they are up to date.")
+    parser.add_argument('--profile', default=os.environ.get('SSIS_PROFILE'), help="Writes a JSON report of the time, CPU, IO and memory used per stage and per file.")
+    parser.add_argument('--cprofile', default=os.environ.get('SSIS_CPROFILE'), help="With --profile, also dumps cProfile stats readable with pstats to this file.")
+    args, _ = parser.parse_known_args()
+
+    runner.workers = args.workers
+    profiler = Profiler(cprofile_path=args.cprofile).start() if args.profile else None
+    status = runner.run(args.stages or None, force=args.force)
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(args.profile)
+    print(f"{sum(value == 'ran' for value in status.values())} stages ran, {sum(value == 'skipped' for value in status.values())} up to date")
+
+#%%
@@ -0,0 +1,147 @@
+import io
+import os
+import posixpath
+import re
+import threading
+import time
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def is_archive(path:str) -> bool:
+    """
+    Returns True when path is a zip or tar file that packages can be read from.
+    """
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def member_path(archive_path:str, member:str) -> str:
+    """
+    Returns the path a member is known by in the rest of the tool, e.g. "bing.zip/BING SSIS/Project/Package.dtsx".
+    """
+    return os.path.join(archive_path, *member.split('/'))
+
+
+def split_archive_path(path:str):
+    """
+    Splits a member path into (archive path, member name), or returns None when path does not point inside an archive.
+    """
+    if os.path.exists(path):
+        return None
+    parts = re.split(r'[\\/]', path)
+    for i in range(len(parts) - 1, 0, -1):
+        candidate = os.sep.join(parts[:i]) or os.sep
+        if is_archive(candidate):
+            return candidate, posixpath.normpath('/'.join(parts[i:]))
+    return None
+
+
+class SourceArchive:
+    """
+    Read-only view of a zip or tar(.gz) archive of SSIS sources. The member index is read once; members are read
+    straight into memory, never extracted to disk. Member names are normalized ("./a/b" is "a/b").
+
+    Zip members are read by random access. Compressed tar members are cheapest read in index order, which is the
+    order in which members() lists them, since seeking backwards restarts decompression. A tar file has a single
+    read position, so tar members are read whole under a lock, which lets threads share the archive; zipfile already
+    locks its shared handle.
+
+    Methods:
+        members: Returns the (name, size, mtime_ns) of every file in the archive.
+        stat: Returns the size and mtime_ns of a member.
+        open: Returns a binary file object reading a member.
+        read: Returns the bytes of a member.
+    """
+    def __init__(self, archive_path:str):
+        import tarfile
+        import zipfile
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        if zipfile.is_zipfile(archive_path):
+            self._zip = zipfile.ZipFile(archive_path)
+            self._tar = None
+            self._index = {posixpath.normpath(info.filename): info for info in self._zip.infolist() if not info.is_dir()}
+        else:
+            self._zip = None
+            self._tar = tarfile.open(archive_path, 'r:*')
+            self._index = {posixpath.normpath(info.name): info for info in self._tar.getmembers() if info.isfile()}
+
+    def __contains__(self, member:str) -> bool:
+        return member in self._index
+
+    def members(self) -> list:
+        return [(name, *self.stat(name)) for name in self._index]
+
+    def stat(self, member:str) -> tuple:
+        info = self._index[member]
+        if self._zip is not None:
+            return info.file_size, int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+        return info.size, int(info.mtime) * 1_000_000_000
+
+    def open(self, member:str):
+        if self._zip is not None:
+            return self._zip.open(self._index[member])
+        with self._lock:
+            return io.BytesIO(self._tar.extractfile(self._index[member]).read())
+
+    def read(self, member:str) -> bytes:
+        with self.open(member) as file:
+            return file.read()
+
+    def close(self) -> None:
+        (self._zip or self._tar).close()
+
+
+def open_archive(archive_path:str) -> SourceArchive:
+    """
+    Returns the SourceArchive of a path, opened once per process and reopened when the archive changes on disk:
+    worker processes never share the parent's file handle, each opens the archive independently on first use.
+    """
+    key = (os.path.abspath(archive_path), os.getpid(), os.stat(archive_path).st_mtime_ns)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is None:
+            archive = _archives[key] = SourceArchive(archive_path)
+    return archive
+
+
+def stat_path(path:str) -> tuple:
+    """
+    Returns (size, mtime_ns) of a file on disk or of an archive member path.
+    """
+    location = split_archive_path(path)
+    if location is None:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    return open_archive(location[0]).stat(location[1])
+
+
+def exists_path(path:str) -> bool:
+    """
+    Returns True when a file on disk or an archive member path exists.
+    """
+    location = split_archive_path(path)
+    if location is None:
+        return os.path.exists(path)
+    return location[1] in open_archive(location[0])
+
+
+def open_path(path:str):
+    """
+    Opens a file on disk or an archive member path for binary reading.
+    """
+    location = split_archive_path(path)
+    if location is None:
+        return open(path, 'rb')
+    return open_archive(location[0]).open(location[1])
+
+
+def read_path(path:str) -> bytes:
+    """
+    Returns the bytes of a file on disk or of an archive member path.
+    """
+    with open_path(path) as file:
+        return file.read()
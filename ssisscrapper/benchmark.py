@@ -0,0 +1,336 @@
+#%%
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from cache import package_cache
+from graph import DependencyGraph
+from impact import ImpactIndex
+from lineage import LineageIndex
+from params import ParameterResolver
+from SSISModule import SSISMigrator, SSISDiscovery, SSISAnalyzer
+from spcatalog import StoredProcedureCatalog
+from synthetic import EstateGenerator, project_names
+from utils import build_dependencies, dependencies, extract_sql_data, extract_values
+from xpath import COMPONENT_PROPERTIES, PARAMETER_VALUES
+
+
+def stage_discovery(context:dict) -> int:
+    discovery = SSISDiscovery(context['estate'], valid_dirs=context['projects'], file_extension=".dtsx")
+    context['packages'] = discovery.get_files()
+    context['params'] = SSISDiscovery(context['estate'], valid_dirs=context['projects'], file_extension=".params").get_files()
+    context['sql_files'] = SSISDiscovery(context['estate'], valid_dirs=['Stored Procedures'], file_extension=".sql").get_files()
+    return len(context['packages'])
+
+
+def stage_parse(context:dict) -> int:
+    migrator = SSISMigrator()
+    context['frames'] = {file_path: migrator.get_df(migrator.parse_xml_file(file_path)) for file_path in context['packages']}
+    return sum(len(df) for df in context['frames'].values())
+
+
+def stage_parse_streaming(context:dict) -> int:
+    migrator = SSISMigrator()
+    return sum(len(migrator.get_df_streaming(file_path)) for file_path in context['packages'])
+
+
+def stage_parse_model(context:dict) -> int:
+    migrator = SSISMigrator()
+    return sum(len(migrator.get_df_model(file_path)) for file_path in context['packages'])
+
+
+def stage_write_csv(context:dict) -> int:
+    csv_dir = os.path.join(context['workdir'], 'csv')
+    shutil.rmtree(csv_dir, ignore_errors=True)
+    os.makedirs(csv_dir)
+    for file_path, df in context['frames'].items():
+        df.to_csv(os.path.join(csv_dir, os.path.basename(file_path).replace('.dtsx', '.csv')), index=False)
+    return len(context['frames'])
+
+
+def stage_build_dependencies(context:dict) -> int:
+    return sum(len(build_dependencies(file_path) or []) for file_path in context['packages'])
+
+
+def stage_dependency_graph(context:dict) -> int:
+    map_dict = {"|".join(file_path.split(os.sep)[-2:]): dependencies(file_path) for file_path in context['packages']}
+    context['map_dict'] = map_dict
+    graph = DependencyGraph.from_map_dict(map_dict)
+    graph.to_tree_deps()
+    return len(graph)
+
+
+def stage_column_lineage(context:dict) -> int:
+    return len(LineageIndex.from_packages(context['packages']).graph)
+
+
+def stage_extract_components(context:dict) -> int:
+    context['component_values'] = extract_values(context['packages'], COMPONENT_PROPERTIES, add_prefix=True)
+    return len(context['component_values'])
+
+
+def stage_extract_params(context:dict) -> int:
+    return len(extract_values(context['params'], PARAMETER_VALUES, split_values=True))
+
+
+def stage_sources_and_catalogs(context:dict) -> int:
+    return len(ParameterResolver(context['params']).sources_and_catalogs(context['packages']))
+
+
+def stage_read_all_files(context:dict) -> int:
+    analyzer = SSISAnalyzer(root_directory=os.path.join(context['workdir'], 'csv'), valid_dirs=['csv'], file_extension=".csv")
+    context['all_joined'] = analyzer.read_all_files()
+    return len(context['all_joined'])
+
+
+def stage_aggregations(context:dict) -> int:
+    df = context['all_joined']
+    df['ExecutableType'].unique()
+    df['SqlTaskData'].unique()
+    grouped = df.groupby(['RefId', 'SqlTaskData'], as_index=True).count().reset_index(inplace=False)
+    parents = df.groupby(['File_path', 'ExecutableType'], as_index=True).count().reset_index(inplace=False)
+    parents = parents[parents['ExecutableType'] == 'Microsoft.ExecutePackageTask']
+    return len(grouped) + len(parents)
+
+
+def stage_stored_procedures(context:dict) -> int:
+    df = context['all_joined'][['File_path', 'SqlTaskData']]
+    df = df[df['SqlTaskData'].str.contains('^[" ]?Exec', case=False, na=False)]
+    df = df.assign(store_procedure_name=df['SqlTaskData'].str.extract('(sp[a-zA-Z_]+)', flags=re.IGNORECASE)[0])
+    df = df[['File_path', 'store_procedure_name']].drop_duplicates()
+    context['procedures'] = df
+    catalog = StoredProcedureCatalog(context['sql_files'])
+    df = catalog.match(df, 'store_procedure_name')
+    df['SqlTaskData'] = catalog.load_bodies(df['sp_file'])
+    context['procedure_tables'] = extract_sql_data(df, columns_to_keep=['File_path', 'store_procedure_name', 'Extracted', 'db'])
+    return len(context['procedure_tables'])
+
+
+def stage_extract_sql(context:dict) -> int:
+    df = pd.concat([context['all_joined'], context['component_values']], axis=0, ignore_index=True)
+    context['tables'] = extract_sql_data(df)
+    return len(context['tables'])
+
+
+def stage_impact_index(context:dict) -> int:
+    index = ImpactIndex()
+    index.add_package_dependencies(context['map_dict'])
+    index.add_procedure_calls(context['procedures'])
+    index.add_table_references(context['tables'])
+    index.add_table_references(context['procedure_tables'], source='procedure')
+    context['impact_index'] = index.build()
+    return len(index.graph)
+
+
+def stage_impact_queries(context:dict) -> int:
+    # every package and job affected by every table
+    index = context['impact_index']
+    return sum(len(index.upstream(table, kinds=['package', 'job'])) for table in index.nodes('table'))
+
+
+# Stages run in this order, each one may use what the previous ones left in the context
+STAGES = [
+    ('discovery', stage_discovery),
+    ('parse', stage_parse),
+    ('parse_streaming', stage_parse_streaming),
+    ('parse_model', stage_parse_model),
+    ('write_csv', stage_write_csv),
+    ('build_dependencies', stage_build_dependencies),
+    ('dependency_graph', stage_dependency_graph),
+    ('column_lineage', stage_column_lineage),
+    ('extract_values_components', stage_extract_components),
+    ('extract_values_params', stage_extract_params),
+    ('sources_and_catalogs', stage_sources_and_catalogs),
+    ('read_all_files', stage_read_all_files),
+    ('aggregations', stage_aggregations),
+    ('stored_procedures', stage_stored_procedures),
+    ('extract_sql_data', stage_extract_sql),
+    ('impact_index', stage_impact_index),
+    ('impact_queries', stage_impact_queries),
+]
+PREREQUISITES = {'discovery', 'parse', 'write_csv', 'dependency_graph', 'extract_values_components', 'read_all_files',
+                 'stored_procedures', 'extract_sql_data', 'impact_index'}
+
+# modules behind the lightweight commands (dependency scan, discovery, the cli), which must not load the heavy libraries
+LIGHT_MODULES = ['utils', 'graph', 'SSISModule', 'manifest', 'main', 'cli']
+HEAVY_MODULES = ['pandas', 'lxml', 'bs4', 'pyarrow', 'numpy']
+IMPORT_BUDGET_SECONDS = 0.1
+IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "seconds = time.perf_counter() - start\n"
+    "print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))\n"
+)
+
+
+def measure(stage, context:dict, repeat:int=1, memory:bool=True, warm:bool=False) -> dict:
+    """
+    Runs a stage repeat times and returns its best and mean wall time, and, when memory is set, the peak traced
+    allocation of one extra run under tracemalloc (kept separate so tracing never inflates the timings).
+    Unless warm is set the package cache is emptied before every run, so each stage pays for its own file reads.
+    """
+    timings = []
+    for _ in range(repeat):
+        if not warm:
+            package_cache.clear()
+        gc.collect()
+        start = time.perf_counter()
+        items = stage(context)
+        timings.append(time.perf_counter() - start)
+    result = {'seconds': min(timings), 'mean_seconds': sum(timings) / len(timings), 'items': items}
+
+    if memory:
+        if not warm:
+            package_cache.clear()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            stage(context)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def import_times(modules:list=LIGHT_MODULES, repeat:int=3) -> dict:
+    """
+    Imports every module in a fresh interpreter repeat times and returns its best import time and the heavy
+    libraries it loaded: {module: {'seconds': ..., 'heavy': [...], 'over_budget': bool}}.
+    """
+    results = {}
+    for module in modules:
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)], capture_output=True,
+                                    text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+        best = min(runs, key=lambda result: result['seconds'])
+        best['over_budget'] = best['seconds'] > IMPORT_BUDGET_SECONDS or bool(best['heavy'])
+        results[module] = best
+        print(f"{'import':>7} {module:<28} {best['seconds']:>9.3f}s {', '.join(best['heavy']) or '-':>20}{'  OVER BUDGET' if best['over_budget'] else ''}")
+    return results
+
+
+def prepare_estate(workdir:str, size:int, options:dict) -> dict:
+    """
+    Generates the estate of a given size under workdir, reusing the one from a previous run when it was generated
+    with the same options. Returns the generation summary.
+    """
+    estate = os.path.join(workdir, 'bing')
+    summary_path = os.path.join(workdir, 'estate.json')
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+        if summary.get('options') == options:
+            return summary
+
+    shutil.rmtree(estate, ignore_errors=True)
+    start = time.perf_counter()
+    summary = EstateGenerator(packages=size, **options).generate(estate)
+    summary['seconds'] = time.perf_counter() - start
+    summary['options'] = options
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'pandas': pd.__version__, 'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(sizes:list, workdir:str, options:dict, stages:list=None, repeat:int=1, memory:bool=True, warm:bool=False) -> dict:
+    """
+    Benchmarks every stage at every estate size and returns the results document:
+    {'environment': {...}, 'options': {...}, 'results': {size: {'estate': {...}, 'stages': {stage: {...}}}},
+    'imports': {module: {...}}}.
+    """
+    report = {'environment': environment(), 'options': dict(options, repeat=repeat, memory=memory, warm=warm), 'results': {},
+              'imports': import_times(repeat=max(repeat, 3))}
+    for size in sizes:
+        size_dir = os.path.join(workdir, str(size))
+        estate = prepare_estate(size_dir, size, options)
+        context = {'estate': os.path.join(size_dir, 'bing'), 'workdir': size_dir, 'projects': project_names(options['projects'])}
+        results = {}
+        for name, stage in STAGES:
+            if stages and name not in stages:
+                # later stages read what these ones leave in the context, so they run unreported
+                if name in PREREQUISITES:
+                    stage(context)
+                continue
+            results[name] = measure(stage, context, repeat, memory, warm)
+            print(f"{size:>7} {name:<28} {results[name]['seconds']:>9.3f}s {results[name].get('peak_bytes', 0) / 2**20:>9.1f}MB {results[name]['items']:>9}")
+        report['results'][str(size)] = {'estate': estate, 'stages': results}
+        package_cache.clear()
+    return report
+
+
+def compare(baseline:dict, current:dict) -> pd.DataFrame:
+    """
+    Lines up two results documents by size and stage. speedup > 1 means the current run is faster; memory_ratio < 1
+    means it uses less memory.
+    """
+    rows = []
+    for size, result in current['results'].items():
+        for stage, numbers in result['stages'].items():
+            before = baseline['results'].get(size, {}).get('stages', {}).get(stage)
+            if before is None:
+                continue
+            row = {'size': int(size), 'stage': stage, 'baseline_seconds': before['seconds'], 'seconds': numbers['seconds'],
+                   'speedup': before['seconds'] / numbers['seconds'] if numbers['seconds'] else None}
+            if 'peak_bytes' in before and 'peak_bytes' in numbers:
+                row['memory_ratio'] = numbers['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else None
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Times and memory-profiles every stage on synthetic SSIS estates.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="Package counts to benchmark")
+    parser.add_argument('--workdir', default=os.path.join(os.getcwd(), 'benchmark'), help="Where estates and intermediates are written")
+    parser.add_argument('--output', default=None, help="Results JSON file (default: <workdir>/results.json)")
+    parser.add_argument('--compare', default=None, help="Previous results JSON to compare against")
+    parser.add_argument('--stages', nargs='+', default=None, choices=[name for name, _ in STAGES], help="Only report these stages")
+    parser.add_argument('--repeat', type=int, default=1, help="Timed runs per stage, the best one is reported")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run of every stage")
+    parser.add_argument('--warm', action='store_true', help="Keep the package cache between stages")
+    parser.add_argument('--projects', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--components', type=int, default=4)
+    parser.add_argument('--precedence-edges', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--imports-only', action='store_true', help="Only time the imports of the lightweight modules, exiting with 1 when one is over budget")
+    args = parser.parse_args()
+
+    if args.imports_only:
+        sys.exit(1 if any(result['over_budget'] for result in import_times(repeat=max(args.repeat, 3)).values()) else 0)
+
+    options = {'projects': args.projects, 'depth': args.depth, 'components': args.components,
+               'precedence_edges': args.precedence_edges, 'fanout': args.fanout, 'seed': args.seed}
+    report = run(args.sizes, args.workdir, options, args.stages, args.repeat, not args.no_memory, args.warm)
+
+    output = args.output or os.path.join(args.workdir, 'results.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report).to_string(index=False))
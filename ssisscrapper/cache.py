@@ -0,0 +1,149 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from staging import resolve
+from archive import open_path, stat_path
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class PackageDocument:
+    """
+    A single package file read once from disk, with its parsed forms built on demand and kept alongside it.
+
+    Methods:
+        derived: Returns a value computed from the document, building it on first use.
+        text: The decoded file content.
+        tree: The lxml ElementTree of the file.
+    """
+    def __init__(self, path:str, data:bytes):
+        self.path = path
+        self.data = data
+        self._derived = {}
+
+    def derived(self, name:str, factory):
+        """
+        Returns a value computed from the document, building it with factory(document) on first use.
+        """
+        if name not in self._derived:
+            self._derived[name] = factory(self)
+        return self._derived[name]
+
+    @property
+    def text(self) -> str:
+        return self.derived('text', lambda doc: doc.data.decode('utf-8-sig', errors='replace'))
+
+    @property
+    def tree(self):
+        def parse(doc):
+            from lxml import etree
+            return etree.parse(io.BytesIO(doc.data), etree.XMLParser(huge_tree=True, remove_blank_text=False))
+        return self.derived('tree', parse)
+
+
+class PackageCache:
+    """
+    LRU cache of package documents keyed by path, modification time and size. It is shared by the analysis stages
+    that run in parallel threads, so every access to the LRU order and byte count holds a lock; files are read outside
+    of it.
+
+    The memory used by a document is estimated as its file size times size_factor, which covers the raw bytes plus
+    the decoded text and parsed tree. Least recently used documents are evicted once the estimate exceeds max_bytes.
+
+    Methods:
+        get: Returns the document for a path, reading it only if it is not cached or has changed on disk.
+        peek: Returns the cached document for a path without reading it, or None.
+        clear: Drops every cached document.
+    """
+    def __init__(self, max_bytes:int=DEFAULT_MAX_BYTES, size_factor:int=10):
+        self.max_bytes = max_bytes
+        self.size_factor = size_factor
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path:str) -> tuple:
+        size, mtime_ns = stat_path(path)
+        return os.path.abspath(path), mtime_ns, size
+
+    def peek(self, path:str):
+        """
+        Returns the cached document for a path without reading it, or None if it is not cached or is stale.
+        """
+        path = resolve(path)
+        key = self._key(path)
+        with self._lock:
+            entry = self._documents.get(key[0])
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def get(self, path:str) -> PackageDocument:
+        """
+        Returns the document for a path, reading it only if it is not cached or has changed on disk.
+        Paths staged in virtual mode are read from their source, archive member paths from the archive.
+        """
+        path = resolve(path)
+        key = self._key(path)
+        with self._lock:
+            entry = self._documents.get(key[0])
+            if entry is not None and entry[0] == key:
+                self._documents.move_to_end(key[0])
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        with open_path(path) as file:
+            document = PackageDocument(path, file.read())
+
+        cost = len(document.data) * self.size_factor
+        with self._lock:
+            # another thread may have cached the same file, or an older version of it, in the meantime
+            if key[0] in self._documents:
+                self._discard(key[0])
+            if cost <= self.max_bytes:
+                self._documents[key[0]] = (key, document, cost)
+                self.used_bytes += cost
+                self._evict()
+        return document
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _discard(self, abspath:str) -> None:
+        # callers hold the lock
+        _, _, cost = self._documents.pop(abspath)
+        self.used_bytes -= cost
+
+    def _evict(self) -> None:
+        while self.used_bytes > self.max_bytes and self._documents:
+            self._discard(next(iter(self._documents)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+            self.used_bytes = 0
+
+
+package_cache = PackageCache()
+
+
+def get_document(path:str) -> PackageDocument:
+    """
+    Returns the shared cached document for a package file.
+    """
+    return package_cache.get(path)
+
+
+def configure_cache(max_bytes:int=DEFAULT_MAX_BYTES, size_factor:int=10) -> PackageCache:
+    """
+    Sets the memory budget of the shared package cache, evicting documents if it shrinks.
+    """
+    with package_cache._lock:
+        package_cache.max_bytes = max_bytes
+        package_cache.size_factor = size_factor
+        package_cache._evict()
+    return package_cache
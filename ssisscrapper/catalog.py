@@ -0,0 +1,343 @@
+import os
+import re
+import sqlite3
+import pandas as pd
+from spcatalog import normalize_procedure_name
+from sqlrefs import iter_sql_references
+from utils import extract_precedence_graph
+from model import load_package
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    package_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    file_path TEXT,
+    object_name TEXT
+);
+CREATE TABLE IF NOT EXISTS executables (
+    executable_id INTEGER PRIMARY KEY,
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    ordinal INTEGER NOT NULL,
+    ref_id TEXT,
+    executable_type TEXT,
+    object_name TEXT,
+    sql_task_data TEXT,
+    is_data_flow INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+    component_id INTEGER PRIMARY KEY,
+    executable_id INTEGER NOT NULL REFERENCES executables(executable_id) ON DELETE CASCADE,
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    ordinal INTEGER NOT NULL,
+    ref_id TEXT,
+    component_class_id TEXT,
+    contact_info TEXT,
+    description TEXT,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS sql_statements (
+    statement_id INTEGER PRIMARY KEY,
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    executable_id INTEGER REFERENCES executables(executable_id) ON DELETE CASCADE,
+    component_id INTEGER REFERENCES components(component_id) ON DELETE CASCADE,
+    source TEXT NOT NULL,
+    sql_text TEXT NOT NULL,
+    procedure_name TEXT,
+    procedure_key TEXT,
+    procedure_bare TEXT
+);
+CREATE TABLE IF NOT EXISTS sql_references (
+    statement_id INTEGER NOT NULL REFERENCES sql_statements(statement_id) ON DELETE CASCADE,
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    role TEXT,
+    object TEXT,
+    db TEXT,
+    schema_name TEXT
+);
+CREATE TABLE IF NOT EXISTS precedence_edges (
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    source TEXT,
+    target TEXT,
+    value TEXT,
+    eval_op TEXT,
+    expression TEXT,
+    logical_and INTEGER
+);
+CREATE TABLE IF NOT EXISTS package_calls (
+    package_id INTEGER NOT NULL REFERENCES packages(package_id) ON DELETE CASCADE,
+    executable_id INTEGER REFERENCES executables(executable_id) ON DELETE CASCADE,
+    called_package TEXT,
+    called_key TEXT,
+    use_project_reference INTEGER,
+    connection TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_executables_package ON executables(package_id, ordinal);
+CREATE INDEX IF NOT EXISTS ix_executables_type ON executables(executable_type);
+CREATE INDEX IF NOT EXISTS ix_components_executable ON components(executable_id, ordinal);
+CREATE INDEX IF NOT EXISTS ix_components_package ON components(package_id);
+CREATE INDEX IF NOT EXISTS ix_sql_statements_package ON sql_statements(package_id);
+CREATE INDEX IF NOT EXISTS ix_sql_statements_procedure ON sql_statements(procedure_key);
+CREATE INDEX IF NOT EXISTS ix_sql_statements_procedure_bare ON sql_statements(procedure_bare);
+CREATE INDEX IF NOT EXISTS ix_sql_references_object ON sql_references(object);
+CREATE INDEX IF NOT EXISTS ix_sql_references_package ON sql_references(package_id);
+CREATE INDEX IF NOT EXISTS ix_precedence_edges_package ON precedence_edges(package_id, target);
+CREATE INDEX IF NOT EXISTS ix_package_calls_package ON package_calls(package_id);
+CREATE INDEX IF NOT EXISTS ix_package_calls_called ON package_calls(called_key);
+"""
+
+# Same rules analyzer.py uses for total_StoreProcedures.csv
+EXEC_REGEX = re.compile('^[" ]?Exec', re.IGNORECASE)
+PROCEDURE_REGEX = re.compile('(sp[a-zA-Z_]+)', re.IGNORECASE)
+# Full name of the executed procedure, used for lookups by procedure_key
+EXEC_TARGET_REGEX = re.compile(r'\bEXEC(?:UTE)?\s+(?:@\w+\s*=\s*)?((?:\[[^\]]+\]|"[^"]+"|[\w#$@]+)(?:\s*\.\s*(?:\[[^\]]+\]|"[^"]+"|[\w#$@]+))*)', re.IGNORECASE)
+
+# the all_joined rows: one per executable, or one per component for data flows
+JOINED_ROWS = """
+            FROM packages p
+            JOIN executables e ON e.package_id = p.package_id
+            LEFT JOIN components c ON c.executable_id = e.executable_id
+            WHERE e.is_data_flow = 0 OR c.component_id IS NOT NULL"""
+# all_joined columns that belong to the executable, the same on every component row of a data flow
+EXECUTABLE_COLUMNS = {'RefId': 'e.ref_id', 'ExecutableType': 'e.executable_type', 'ObjectName': 'e.object_name',
+                      'SqlTaskData': "CASE WHEN e.is_data_flow THEN '' ELSE e.sql_task_data END"}
+
+
+def package_key(name:str) -> str:
+    """
+    Normalizes a called package name for lookups: directory, .dtsx extension and case are ignored.
+    """
+    if not name:
+        return None
+    return re.split(r'[\\/]', name.strip())[-1].casefold().removesuffix('.dtsx')
+
+
+class Catalog:
+    """
+    Normalized SQLite catalog of parsed SSIS packages: packages, executables, pipeline components, SQL statements
+    with the objects they reference, precedence edges and package-call edges, all indexed for ad-hoc queries.
+
+    Methods:
+        load_package: Parses a .dtsx file and replaces its rows in the catalog.
+        sync: Deletes, reloads and adds packages so the catalog matches a set of package files.
+        remove_package: Deletes a package and everything extracted from it.
+        query: Runs any SQL against the catalog and returns a DataFrame.
+        all_joined: The all_joined table analyzer.py builds from the per-package csv files.
+        unique_values: The total_<column>.csv values.
+        executable_type_counts: The group_by_File_path-ExecutableType counts.
+        parent_packages: The total_ParentPackages.csv table.
+        stored_procedures: The total_StoreProcedures.csv table.
+        sql_references: The tables_sql.csv table.
+        packages_calling_procedure: Packages whose SQL executes a stored procedure.
+        package_calls: Parent package -> called package edges.
+        precedence: Precedence constraints of a package.
+    """
+    def __init__(self, catalog_path:str):
+        """
+        Opens (or creates) the catalog at catalog_path.
+        """
+        self.catalog_path = catalog_path
+        self.connection = sqlite3.connect(catalog_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def package_names(self) -> set:
+        return {name for name, in self.connection.execute("SELECT name FROM packages")}
+
+    def sync(self, file_paths:list, changed:list=()) -> int:
+        """
+        Brings the catalog in line with a set of package files: packages no longer present are deleted, changed ones
+        and ones missing from the catalog are (re)loaded. Commits and returns the number of packages loaded.
+        """
+        names = {os.path.splitext(os.path.basename(file_path))[0]: file_path for file_path in file_paths}
+        existing = self.package_names()
+        for name in existing - names.keys():
+            self.remove_package(name)
+        to_load = {os.path.splitext(os.path.basename(file_path))[0] for file_path in changed} | (names.keys() - existing)
+        for name in to_load & names.keys():
+            self.load_package(names[name], name)
+        self.commit()
+        return len(to_load & names.keys())
+
+    def remove_package(self, name:str) -> None:
+        """
+        Deletes a package and everything extracted from it.
+        """
+        self.connection.execute("DELETE FROM packages WHERE name = ?", (name,))
+
+    def load_package(self, file_path:str, name:str=None) -> int:
+        """
+        Parses a .dtsx file and replaces its rows in the catalog. name defaults to the file name without extension,
+        which is the File_path value of the csv tables. Returns the package id. Changes are committed by commit().
+        """
+        name = name or os.path.splitext(os.path.basename(file_path))[0]
+        package = load_package(file_path)
+        cursor = self.connection.cursor()
+        self.remove_package(name)
+        cursor.execute("INSERT INTO packages (name, file_path, object_name) VALUES (?, ?, ?)",
+                       (name, file_path, package.object_name))
+        package_id = cursor.lastrowid
+
+        statements = []
+        calls = []
+        for ordinal, executable in enumerate(package.walk()):
+            cursor.execute("INSERT INTO executables (package_id, ordinal, ref_id, executable_type, object_name, sql_task_data, is_data_flow) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (package_id, ordinal, executable.ref_id or '', executable.executable_type,
+                            executable.object_name or '', executable.sql_task_data, int(executable.is_data_flow)))
+            executable_id = cursor.lastrowid
+            if executable.sql_task_data:
+                statements.append((executable_id, None, 'ExecuteSQLTask', executable.sql_task_data))
+
+            if executable.is_data_flow:
+                for position, component in enumerate(executable.components):
+                    cursor.execute("INSERT INTO components (executable_id, package_id, ordinal, ref_id, component_class_id, contact_info, description, name) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (executable_id, package_id, position, component.ref_id, component.component_class_id or '',
+                                    component.contact_info or '', component.description or '', component.name or ''))
+                    component_id = cursor.lastrowid
+                    for value in component.properties.values():
+                        if value:
+                            statements.append((executable_id, component_id, 'component', value))
+            elif executable.executable_type == 'Microsoft.ExecutePackageTask' and (executable.package_name is not None or executable.use_project_reference is not None):
+                calls.append((package_id, executable_id, executable.package_name, package_key(executable.package_name),
+                              None if executable.use_project_reference is None else int(executable.use_project_reference), executable.package_connection))
+
+        references = []
+        for executable_id, component_id, source, sql_text in statements:
+            procedure = PROCEDURE_REGEX.search(sql_text) if EXEC_REGEX.search(sql_text) else None
+            procedure_name = procedure.group(1) if procedure else None
+            target = EXEC_TARGET_REGEX.search(sql_text)
+            procedure_key = normalize_procedure_name(re.sub(r'\s*\.\s*', '.', target.group(1))) if target else None
+            cursor.execute("INSERT INTO sql_statements (package_id, executable_id, component_id, source, sql_text, procedure_name, procedure_key, procedure_bare) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (package_id, executable_id, component_id, source, sql_text, procedure_name, procedure_key,
+                            procedure_key.rsplit('.', 1)[-1] if procedure_key else None))
+            statement_id = cursor.lastrowid
+            references.extend((statement_id, package_id, reference.role, reference.object, reference.db, reference.schema)
+                              for reference in iter_sql_references(sql_text))
+        cursor.executemany("INSERT INTO sql_references (statement_id, package_id, role, object, db, schema_name) VALUES (?, ?, ?, ?, ?, ?)", references)
+        cursor.executemany("INSERT INTO package_calls (package_id, executable_id, called_package, called_key, use_project_reference, connection) VALUES (?, ?, ?, ?, ?, ?)", calls)
+
+        graph = extract_precedence_graph(file_path)
+        cursor.executemany("INSERT INTO precedence_edges (package_id, source, target, value, eval_op, expression, logical_and) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [(package_id, edge.source, edge.target, edge.value, edge.eval_op, edge.expression, int(edge.logical_and))
+                            for edges in graph['successors'].values() for edge in edges])
+        return package_id
+
+    def query(self, sql:str, params=()) -> pd.DataFrame:
+        """
+        Runs any SQL against the catalog and returns the result as a DataFrame.
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def all_joined(self) -> pd.DataFrame:
+        """
+        Returns the all_joined table: one row per executable, or one per component for data flows, with File_path.
+        """
+        return self.query(f"""
+            SELECT e.ref_id AS RefId, e.executable_type AS ExecutableType, e.object_name AS ObjectName,
+                   COALESCE(c.component_class_id, '') AS componentClassID, COALESCE(c.contact_info, '') AS contactInfo,
+                   COALESCE(c.description, '') AS description, COALESCE(c.name, '') AS name,
+                   {EXECUTABLE_COLUMNS['SqlTaskData']} AS SqlTaskData,
+                   p.name AS File_path{JOINED_ROWS}
+            ORDER BY p.package_id, e.ordinal, c.ordinal""")
+
+    def unique_values(self, column:str) -> pd.DataFrame:
+        """
+        Returns the distinct values of an all_joined column in order of first appearance, as in total_<column>.csv.
+        """
+        return self.query(f"""
+            SELECT {EXECUTABLE_COLUMNS[column]} AS {column}{JOINED_ROWS}
+            GROUP BY 1 ORDER BY MIN(e.executable_id)""")
+
+    def executable_type_counts(self) -> pd.DataFrame:
+        """
+        Returns the number of all_joined rows of each type in each package, one per component for data flows, as
+        in group_by_File_path-ExecutableType.csv.
+        """
+        return self.query(f"""
+            SELECT p.name AS File_path, e.executable_type AS ExecutableType, COUNT(*) AS RefId{JOINED_ROWS}
+            GROUP BY p.name, e.executable_type ORDER BY p.name, e.executable_type""")
+
+    def parent_packages(self) -> pd.DataFrame:
+        """
+        Returns the packages that call other packages with the number of ExecutePackageTasks, as in total_ParentPackages.csv.
+        """
+        return self.query("""
+            SELECT p.name AS File_path, e.executable_type AS ExecutableType, COUNT(*) AS TotalPackagesCalled
+            FROM executables e JOIN packages p ON p.package_id = e.package_id
+            WHERE e.executable_type = 'Microsoft.ExecutePackageTask'
+            GROUP BY p.name ORDER BY p.name""")
+
+    def stored_procedures(self) -> pd.DataFrame:
+        """
+        Returns the stored procedures executed by the Execute SQL tasks of each package, as in total_StoreProcedures.csv.
+        """
+        return self.query("""
+            SELECT DISTINCT p.name AS File_path, s.procedure_name AS store_procedure_name
+            FROM sql_statements s JOIN packages p ON p.package_id = s.package_id
+            WHERE s.source = 'ExecuteSQLTask' AND s.procedure_name IS NOT NULL
+            ORDER BY p.name""")
+
+    def sql_references(self, sources:tuple=('ExecuteSQLTask', 'component')) -> pd.DataFrame:
+        """
+        Returns the objects referenced by the SQL of each package (File_path, Extracted, db), as in tables_sql.csv.
+        """
+        marks = ', '.join('?' * len(sources))
+        return self.query(f"""
+            SELECT DISTINCT p.name AS File_path, r.role || ' ' || r.object AS Extracted, COALESCE(r.db, 'No db found') AS db
+            FROM sql_references r
+            JOIN sql_statements s ON s.statement_id = r.statement_id
+            JOIN packages p ON p.package_id = r.package_id
+            WHERE s.source IN ({marks}) ORDER BY p.name""", tuple(sources))
+
+    def packages_calling_procedure(self, procedure:str) -> pd.DataFrame:
+        """
+        Returns the packages whose SQL executes a stored procedure, matched by normalized name. A schema-qualified
+        name also matches unqualified calls, a bare name matches calls in any schema.
+        """
+        key = normalize_procedure_name(procedure)
+        bare = key.rsplit('.', 1)[-1] if key else None
+        condition, params = ("s.procedure_key IN (?, ?)", (key, bare)) if key and '.' in key else ("s.procedure_bare = ?", (bare,))
+        return self.query(f"""
+            SELECT DISTINCT p.name AS File_path, s.procedure_name AS store_procedure_name, e.ref_id AS RefId
+            FROM sql_statements s
+            JOIN packages p ON p.package_id = s.package_id
+            JOIN executables e ON e.executable_id = s.executable_id
+            WHERE {condition} ORDER BY p.name""", params)
+
+    def package_calls(self, called:str=None) -> pd.DataFrame:
+        """
+        Returns the parent package -> called package edges, or only the callers of one package when called is given.
+        """
+        sql = """
+            SELECT p.name AS parent, c.called_package AS child, c.use_project_reference, c.connection, e.ref_id AS RefId
+            FROM package_calls c
+            JOIN packages p ON p.package_id = c.package_id
+            JOIN executables e ON e.executable_id = c.executable_id"""
+        if called is None:
+            return self.query(sql + " ORDER BY p.name")
+        return self.query(sql + " WHERE c.called_key = ? ORDER BY p.name", (package_key(called),))
+
+    def precedence(self, package:str) -> pd.DataFrame:
+        """
+        Returns the precedence constraints of a package.
+        """
+        return self.query("""
+            SELECT source, target, value, eval_op, expression, logical_and
+            FROM precedence_edges WHERE package_id = (SELECT package_id FROM packages WHERE name = ?)""", (package,))
@@ -0,0 +1,218 @@
+import argparse
+import functools
+import os
+from SSISModule import SSISDiscovery
+from graph import DependencyGraph
+from jsonstream import dump
+from main import extract_changed_files, parse_package_frame
+from manifest import Manifest
+from profiling import Profiler
+from staging import STAGING_MODES, staged_files
+from utils import create_directories, dependencies, write_frame, OUTPUT_FORMATS
+
+PARAMS_DIRS = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart']
+SQL_DIRS = ['Stored Procedures']
+PACKAGE_DIRS = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart', 'DataLakeADPToBase']
+# intermediate files the parse step can write; by default 'all' writes none of them
+WRITE_CHOICES = ['json', 'tables']
+# node kinds of impact.ImpactIndex, kept here so building the parser does not import pandas
+IMPACT_KINDS = ['job', 'package', 'procedure', 'table']
+
+
+def discover(root:str, source:str='bing', staging:str='auto', full:bool=False) -> dict:
+    """
+    Stages the .params, .conmgr, .sql and .dtsx files of the source folder or archive into root, as main.py does. Returns
+    {'packages': source .dtsx files, 'staged': staged .dtsx files}.
+    """
+    create_directories(['dtsx', 'analysis', 'StoreProcedures', 'Sources_and_catalogs', 'manifest'], root)
+    source_path = os.path.join(root, source)
+    manifest_dir = os.path.join(root, 'manifest')
+    for target, valid_dirs, extension, add_prefix in [('Sources_and_catalogs', PARAMS_DIRS, '.params', True),
+                                                       ('Sources_and_catalogs', PARAMS_DIRS, '.conmgr', True),
+                                                       ('StoreProcedures', SQL_DIRS, '.sql', False)]:
+        discovery = SSISDiscovery(source_path, valid_dirs=valid_dirs, file_extension=extension)
+        extract_changed_files(discovery, os.path.join(root, target), Manifest(os.path.join(manifest_dir, f'{extension[1:]}.json')),
+                              add_prefix=add_prefix, full=full, mode=staging)
+
+    target_dir = os.path.join(root, 'dtsx')
+    discovery = SSISDiscovery(source_path, valid_dirs=PACKAGE_DIRS, file_extension='.dtsx')
+    packages = extract_changed_files(discovery, target_dir, Manifest(os.path.join(manifest_dir, 'dtsx.json')), full=full, mode=staging)
+    return {'packages': packages, 'staged': staged_files(target_dir, '.dtsx')}
+
+
+def package_table(file_path:str, df:'pd.DataFrame') -> 'pd.DataFrame':
+    """
+    Turns a get_df DataFrame into the rows read_all_files would read back from its csv: empty strings become
+    missing values and the File_path column holds the package name.
+    """
+    table = df.mask(df.eq(''))
+    table['File_path'] = os.path.splitext(os.path.basename(file_path))[0]
+    return table
+
+
+def parse(root:str, file_paths:list, output_format:str='csv', workers:int=1, write:list=()) -> tuple:
+    """
+    Parses .dtsx files into their get_df DataFrames, in a process pool when workers > 1, writing the json and table
+    outputs only for the kinds listed in write. Returns ({file_path: DataFrame}, [(file_path, error)]).
+    """
+    if 'json' in write or 'tables' in write:
+        create_directories(['json', output_format], root)
+    parse_one = functools.partial(parse_package_frame, output_format=output_format, write_json='json' in write, write_table='tables' in write)
+    frames, failures = {}, []
+    if workers <= 1:
+        results = map(parse_one, file_paths)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(parse_one, file_paths)
+    for file_path, df, error in results:
+        if error is None:
+            frames[file_path] = df
+        else:
+            print(f"Failed to parse {file_path}")
+            failures.append((file_path, error))
+    if workers > 1:
+        executor.shutdown()
+    print(f"Parsed {len(frames)} of {len(file_paths)} packages")
+    return frames, failures
+
+
+def combine(frames:dict) -> 'pd.DataFrame':
+    """
+    Builds the all_joined table straight from parsed DataFrames, without writing and re-reading per-package tables.
+    Returns an empty DataFrame when no package was parsed.
+    """
+    import pandas as pd
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat([package_table(file_path, df) for file_path, df in frames.items()], ignore_index=True)
+
+
+def analyze(root:str, all_joined:'pd.DataFrame'=None, stages:list=None, workers:int=4, force:bool=False,
+            output_format:str='csv', source:str='bing') -> dict:
+    """
+    Runs the analyzer.py stages in root. A given all_joined DataFrame is handed to the runner in memory, so its
+    per-package tables are never read. It is still written to the all_joined file, which the runner then records as
+    up to date, so a later standalone analyze reuses it instead of rebuilding it from per-package tables.
+    """
+    os.chdir(root)
+    os.environ['SSIS_OUTPUT_FORMAT'] = output_format
+    os.environ['SSIS_SOURCE'] = source
+    create_directories(['analysis', 'manifest'], root)
+    import analyzer
+    if all_joined is not None:
+        write_frame(all_joined, analyzer.all_joined_path, output_format, index=output_format == 'csv')
+        analyzer.runner.provide('all_joined', all_joined)
+    analyzer.runner.workers = workers
+    status = analyzer.runner.run(stages or None, force=force)
+    print(f"{sum(value == 'ran' for value in status.values())} stages ran, {sum(value == 'skipped' for value in status.values())} up to date")
+    return status
+
+
+def deps(root:str, source:str='bing', packages:list=None) -> DependencyGraph:
+    """
+    Builds the package dependency graph of the source packages, reports its cycles and writes analysis/tree_deps.json.
+    """
+    if packages is None:
+        packages = SSISDiscovery(os.path.join(root, source), valid_dirs=PACKAGE_DIRS, file_extension='.dtsx').get_files()
+    graph = DependencyGraph.from_map_dict({file_path: dependencies(file_path) for file_path in packages})
+    for cycle in graph.find_cycles():
+        print(f"Circular package dependency: {' -> '.join(cycle)}")
+    create_directories(['analysis'], root)
+    dump(graph.to_tree_deps(), os.path.join(root, 'analysis', 'tree_deps.json'))
+    print(f"Dependency tree of {len(graph)} packages written to {os.path.join(root, 'analysis', 'tree_deps.json')}")
+    return graph
+
+
+def impact_query(root:str, kind:str, name:str, downstream:bool=False, kinds:list=None) -> list:
+    """
+    Prints every job, package, procedure or table that uses a node (or, downstream, that it uses), from the
+    analysis/impact_edges.csv written by the impact_index stage, or from the other analysis outputs without it.
+    """
+    import pandas as pd
+    from impact import ImpactIndex
+    edges_path = os.path.join(root, 'analysis', 'impact_edges.csv')
+    if os.path.exists(edges_path):
+        index = ImpactIndex.from_frame(pd.read_csv(edges_path, dtype=str, keep_default_na=False))
+    else:
+        index = ImpactIndex.from_analysis(os.path.join(root, 'analysis'))
+    try:
+        nodes = (index.downstream if downstream else index.upstream)((kind, name), kinds=kinds or None)
+    except KeyError as error:
+        print(error.args[0])
+        return []
+    for node in sorted(nodes):
+        print(f"{node.kind:<10} {node.name}")
+    print(f"{len(nodes)} nodes {'used by' if downstream else 'using'} {kind} {name}")
+    return nodes
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ssisscrapper', description="Discovers, parses and analyzes the SSIS packages of a client's sources.")
+    parser.add_argument('--root', default=os.getcwd(), help="Working folder holding the sources and receiving every output (default: current folder).")
+    parser.add_argument('--source', default='bing', help="Folder, or zip/tar(.gz) archive, under root holding the client's sources.")
+    parser.add_argument('--format', choices=list(OUTPUT_FORMATS), default='csv', help="Format of the per-package tables.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used to parse, and of analysis stages run at the same time.")
+    parser.add_argument('--profile', default=os.environ.get('SSIS_PROFILE'), help="Writes a JSON report of the time, CPU, IO and memory used per stage and per file.")
+    parser.add_argument('--cprofile', default=os.environ.get('SSIS_CPROFILE'), help="With --profile, also dumps cProfile stats readable with pstats to this file.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    discover_parser = commands.add_parser('discover', help="Stages the .params, .sql and .dtsx files of the sources.")
+    parse_parser = commands.add_parser('parse', help="Parses the staged packages and writes their json and table files.")
+    analyze_parser = commands.add_parser('analyze', help="Runs the analysis stages over the per-package tables.")
+    commands.add_parser('deps', help="Builds the package dependency tree.")
+    all_parser = commands.add_parser('all', help="Runs discover, parse, analyze and deps in one process, passing the parsed packages in memory.")
+    impact_parser = commands.add_parser('impact', help="Lists every job, package and procedure affected by a change to a table, procedure or package.")
+
+    for command in (discover_parser, all_parser):
+        command.add_argument('--staging', choices=STAGING_MODES, default='auto', help="How files are staged into root.")
+        command.add_argument('--full', action='store_true', help="Stage every file, ignoring the manifest of the previous run.")
+    parse_parser.add_argument('--write', nargs='*', choices=WRITE_CHOICES, default=['json', 'tables'], help="Intermediate files to write (default: json tables).")
+    all_parser.add_argument('--write', nargs='*', choices=WRITE_CHOICES, default=[], help="Intermediate files to write (default: none).")
+    for command in (analyze_parser, all_parser):
+        command.add_argument('--stages', nargs='*', default=None, help="Analysis stages to run with their dependencies (default: all).")
+        command.add_argument('--force', action='store_true', help="Run the analysis stages even if they are up to date.")
+    impact_parser.add_argument('kind', choices=IMPACT_KINDS, help="Kind of the changed node.")
+    impact_parser.add_argument('name', help="Name of the changed node, e.g. dbo.DimDate or StagingToEDW_LoadDimDate.")
+    impact_parser.add_argument('--downstream', action='store_true', help="List what the node uses instead of what uses it.")
+    impact_parser.add_argument('--kinds', nargs='*', choices=IMPACT_KINDS, default=None, help="Only list nodes of these kinds (default: all).")
+    return parser
+
+
+def main(argv:list=None) -> int:
+    args = build_parser().parse_args(argv)
+    root = os.path.abspath(args.root)
+    profiler = Profiler(cprofile_path=args.cprofile).start() if args.profile else None
+    failures = []
+    try:
+        if args.command == 'discover':
+            discover(root, args.source, args.staging, args.full)
+        elif args.command == 'parse':
+            _, failures = parse(root, staged_files(os.path.join(root, 'dtsx'), '.dtsx'), args.format, args.workers, args.write)
+        elif args.command == 'analyze':
+            analyze(root, stages=args.stages, workers=max(args.workers, 1), force=args.force, output_format=args.format, source=args.source)
+        elif args.command == 'deps':
+            deps(root, args.source)
+        elif args.command == 'all':
+            discovered = discover(root, args.source, args.staging, args.full)
+            frames, failures = parse(root, discovered['staged'], args.format, args.workers, args.write)
+            if frames:
+                analyze(root, combine(frames), stages=args.stages, workers=max(args.workers, 1), force=args.force,
+                        output_format=args.format, source=args.source)
+            else:
+                print("No package was parsed, skipping the analysis")
+            deps(root, args.source, discovered['packages'])
+        elif args.command == 'impact':
+            impact_query(root, args.kind, args.name, args.downstream, args.kinds)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profiler.save(args.profile)
+
+    for file_path, error in failures:
+        print(f"  {file_path}: {error.strip().splitlines()[-1]}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+from collections import deque
+
+
+class DependencyGraph:
+    """
+    Package dependency graph stored as adjacency lists over integer node ids.
+
+    Methods:
+        from_map_dict: Builds the graph from a {package: [child packages] or None} dictionary, as produced by dependencies().
+        add_node: Returns the id of a package, registering it if needed.
+        add_edge: Records that a parent package calls a child package.
+        children / parents: Direct neighbours of a package.
+        roots / leaves: Packages nobody calls / packages that call nobody.
+        topological_order: Parents-before-children ordering of every package.
+        find_cycles: Groups of packages that call each other.
+        ancestors / descendants: Every package that transitively calls / is called by a package.
+        to_tree_deps: Builds the tree_deps.json structure.
+    """
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._children = []
+        self._parents = []
+        self._edges = set()
+
+    @classmethod
+    def from_map_dict(cls, map_dict:dict) -> 'DependencyGraph':
+        """
+        Builds the graph from a {package: [child packages] or None} dictionary, as produced by dependencies().
+        """
+        graph = cls()
+        for parent, children in map_dict.items():
+            graph.add_node(parent)
+            for child in children or []:
+                graph.add_edge(parent, child)
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._ids
+
+    def add_node(self, name) -> int:
+        """
+        Returns the id of a package, registering it if needed.
+        """
+        node = self._ids.get(name)
+        if node is None:
+            node = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._children.append([])
+            self._parents.append([])
+        return node
+
+    def add_edge(self, parent, child) -> None:
+        """
+        Records that a parent package calls a child package. Repeated calls between the same packages are kept once.
+        """
+        edge = (self.add_node(parent), self.add_node(child))
+        if edge not in self._edges:
+            self._edges.add(edge)
+            self._children[edge[0]].append(edge[1])
+            self._parents[edge[1]].append(edge[0])
+
+    def node_id(self, name) -> int:
+        return self._ids[name]
+
+    def name(self, node:int):
+        return self._names[node]
+
+    def children(self, name) -> list:
+        return [self._names[node] for node in self._children[self._ids[name]]]
+
+    def parents(self, name) -> list:
+        return [self._names[node] for node in self._parents[self._ids[name]]]
+
+    def roots(self) -> list:
+        """
+        Returns the packages that no other package calls.
+        """
+        return [self._names[node] for node in range(len(self._names)) if not self._parents[node]]
+
+    def leaves(self) -> list:
+        """
+        Returns the packages that call no other package.
+        """
+        return [self._names[node] for node in range(len(self._names)) if not self._children[node]]
+
+    def topological_order(self) -> list:
+        """
+        Returns every package ordered so that parents come before the packages they call.
+        Raises ValueError if the graph contains cycles, use find_cycles to list them.
+        """
+        in_degree = [len(parents) for parents in self._parents]
+        queue = deque(node for node, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for child in self._children[node]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+        if len(order) != len(self._names):
+            raise ValueError(f"Dependency graph has {len(self.find_cycles())} cycles, no topological order exists")
+        return [self._names[node] for node in order]
+
+    def strongly_connected_components(self) -> list:
+        """
+        Returns the strongly connected components as lists of node ids, in reverse topological order
+        (a component is listed before any component that calls it). Iterative Tarjan, linear in nodes and edges.
+        """
+        index = [-1] * len(self._names)
+        low = [0] * len(self._names)
+        on_stack = [False] * len(self._names)
+        stack = []
+        components = []
+        counter = 0
+
+        for start in range(len(self._names)):
+            if index[start] != -1:
+                continue
+            work = [(start, 0)]
+            while work:
+                node, position = work.pop()
+                if position == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                children = self._children[node]
+                while position < len(children):
+                    child = children[position]
+                    position += 1
+                    if index[child] == -1:
+                        work.append((node, position))
+                        work.append((child, 0))
+                        break
+                    if on_stack[child]:
+                        low[node] = min(low[node], index[child])
+                else:
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+        return components
+
+    def find_cycles(self) -> list:
+        """
+        Returns the groups of packages that call each other, directly or transitively, including self-calls.
+        """
+        return [[self._names[node] for node in component] for component in self.strongly_connected_components()
+                if len(component) > 1 or component[0] in self._children[component[0]]]
+
+    def _reach(self, name, adjacency:list) -> list:
+        start = self._ids[name]
+        seen = bytearray(len(self._names))
+        seen[start] = 1
+        queue = deque([start])
+        result = []
+        while queue:
+            for neighbour in adjacency[queue.popleft()]:
+                if not seen[neighbour]:
+                    seen[neighbour] = 1
+                    result.append(self._names[neighbour])
+                    queue.append(neighbour)
+        return result
+
+    def ancestors(self, name) -> list:
+        """
+        Returns every package that calls the given package, directly or transitively.
+        """
+        return self._reach(name, self._parents)
+
+    def descendants(self, name) -> list:
+        """
+        Returns every package called by the given package, directly or transitively.
+        """
+        return self._reach(name, self._children)
+
+    def to_tree_deps(self) -> dict:
+        """
+        Builds the tree_deps.json structure: every top-level package mapped to {child: [grandchildren] or None}, or to
+        None when it calls nothing, sorted by number of children. Top-level packages are those nobody calls, plus one
+        representative of every cycle that nobody outside the cycle calls, so no package is lost.
+        """
+        component_of = [0] * len(self._names)
+        components = self.strongly_connected_components()
+        for number, component in enumerate(components):
+            for node in component:
+                component_of[node] = number
+        called_from_outside = [False] * len(components)
+        for parent, child in self._edges:
+            if component_of[parent] != component_of[child]:
+                called_from_outside[component_of[child]] = True
+
+        top_level = [min(component) for number, component in enumerate(components) if not called_from_outside[number]]
+        top_level.sort(key=lambda node: (-len(self._children[node]), node))
+
+        tree = {}
+        for node in top_level:
+            if self._children[node]:
+                tree[self._names[node]] = {
+                    self._names[child]: [self._names[grandchild] for grandchild in self._children[child]] or None
+                    for child in self._children[node]}
+            else:
+                tree[self._names[node]] = None
+        return tree
@@ -0,0 +1,447 @@
+import glob
+import json
+import os
+import re
+from array import array
+from collections import namedtuple
+from graph import DependencyGraph
+from lineage import table_key
+from spcatalog import normalize_procedure_name
+
+# a Jams job, package, stored procedure or table; an edge A -> B means A uses B (runs, calls, reads or writes it)
+ImpactNode = namedtuple('ImpactNode', ['kind', 'name'])
+NODE_KINDS = ('job', 'package', 'procedure', 'table')
+NODE_FLAGS = {kind: 1 << number for number, kind in enumerate(NODE_KINDS)}
+
+EDGE_COLUMNS = ['source_kind', 'source', 'target_kind', 'target']
+
+# a closure with fewer members than 1/SPARSE_RATIO of the positions it spans, 32 bits per member against one bit per
+# spanned position for a bitset, or with fewer than SPARSE_MINIMUM members is stored as an array of positions
+SPARSE_RATIO = 32
+SPARSE_MINIMUM = 64
+NONZERO_BYTE_REGEX = re.compile(rb'[^\x00]')
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+# roles of the Extracted column of extract_sql_data that name a table, and what a table name may look like
+TABLE_ROLES = {'FROM', 'JOIN', 'UPDATE', 'INSERT', 'INTO'}
+TABLE_NAME_REGEX = re.compile(r'^[\w\[\]"#.]+$')
+# words that follow FROM/JOIN/UPDATE in comments and dynamic SQL fragments rather than table names
+NOT_TABLES = {'all', 'and', 'as', 'from', 'in', 'null', 'on', 'or', 'select', 'set', 'the', 'to', 'update', 'where', 'with'}
+
+
+def package_key(name:str) -> str:
+    """
+    Names a package the way the per-package tables do, <project>_<package>, from any of the forms found in the
+    analysis outputs: "Project_Package", "Project|Package.dtsx", "Project_Package.dtsx" or a path ending in
+    Project\\Package.dtsx.
+    """
+    if not isinstance(name, str) or not name.strip():
+        return None
+    parts = [part for part in re.split(r'[\\/|]', name.strip()) if part]
+    name = '_'.join(parts[-2:])
+    return name[:-len('.dtsx')] if name.lower().endswith('.dtsx') else name
+
+
+def procedure_key(name:str) -> str:
+    """
+    Normalizes a stored procedure name like a table name, so "spLoad", "[dbo].[spLoad]" and "EDW.dbo.spLoad" meet.
+    """
+    return table_key(normalize_procedure_name(name))
+
+
+def extracted_table(extracted:str) -> str:
+    """
+    The table named by an Extracted value of extract_sql_data, e.g. "INSERT INTO [dbo].[Fact]" -> "dbo.fact", or None
+    for variables, comments and other non-table references.
+    """
+    if not isinstance(extracted, str):
+        return None
+    words = extracted.strip().strip('"').split()
+    if len(words) < 2 or words[0].upper() not in TABLE_ROLES:
+        return None
+    name = words[2] if words[1].upper() == 'INTO' and len(words) > 2 else words[1]
+    if name.startswith('@') or not TABLE_NAME_REGEX.match(name):
+        return None
+    # Database..Table is the default schema
+    key = table_key(name.replace('..', '.dbo.'))
+    table = key.split('.')[-1]
+    if not all(key.split('.')) or table in NOT_TABLES or table.isdigit():
+        return None
+    return key
+
+
+def node_key(kind:str, name:str) -> ImpactNode:
+    """
+    Returns the normalized node of a name, e.g. node_key('table', '[BING_EDW].[dbo].[DimDate]').
+    """
+    if kind not in NODE_KINDS:
+        raise ValueError(f"Unknown node kind {kind}, expected one of {NODE_KINDS}")
+    key = {'package': package_key, 'procedure': procedure_key, 'table': table_key}.get(kind, str.strip)(name)
+    return ImpactNode(kind, key) if key else None
+
+
+def _post_order(adjacency:list) -> list:
+    """
+    Iterative depth-first post-order: every node comes after the nodes it reaches, and the nodes first reached
+    from a node sit right before it, so reachable sets are mostly contiguous ranges of positions.
+    """
+    seen = bytearray(len(adjacency))
+    order = []
+    for start in range(len(adjacency)):
+        if seen[start]:
+            continue
+        seen[start] = 1
+        stack = [(start, iter(adjacency[start]))]
+        while stack:
+            node, neighbours = stack[-1]
+            for neighbour in neighbours:
+                if not seen[neighbour]:
+                    seen[neighbour] = 1
+                    stack.append((neighbour, iter(adjacency[neighbour])))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+    return order
+
+
+def _bitset(positions) -> tuple:
+    """
+    Packs positions into (offset, bits), bit i of bits standing for position offset + i.
+    """
+    offset = min(positions)
+    data = bytearray((max(positions) - offset) // 8 + 1)
+    for position in positions:
+        position -= offset
+        data[position >> 3] |= 1 << (position & 7)
+    return offset, int.from_bytes(data, 'little')
+
+
+def _members(offset:int, bits:int) -> array:
+    # scans the bytes of the bitset for non-zero ones in C and expands those through a per-byte table
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    members = array('I')
+    for match in NONZERO_BYTE_REGEX.finditer(data):
+        start = offset + match.start() * 8
+        members.extend([start + bit for bit in BYTE_BITS[data[match.start()]]])
+    return members
+
+
+def _is_sparse(count:int, span:int) -> bool:
+    return count < SPARSE_MINIMUM or count * SPARSE_RATIO < span
+
+
+def _compress(offset:int, bits:int):
+    """
+    A closure as the smaller of its two forms: a sorted array of positions (4 bytes per member) or (offset, bits).
+    """
+    if _is_sparse(bits.bit_count(), bits.bit_length()):
+        return _members(offset, bits)
+    return offset, bits
+
+
+class _Closures:
+    """
+    Transitive closures of a DAG of components over depth-first post-order positions, where the components first
+    reached from a component sit right before it. Like a roaring bitmap, each closure is kept in the smaller of two
+    forms: a sorted array of positions when sparse, or an integer bitset (offset, bits) spanning only the positions
+    from its lowest member to its highest. flags holds per component the NODE_FLAGS of its members, so results can be
+    filtered by kind without looking the members up.
+    """
+    def __init__(self, adjacency:list, flags:list):
+        self.order = _post_order(adjacency)
+        self.position = [0] * len(adjacency)
+        for position, component in enumerate(self.order):
+            self.position[component] = position
+        self.flags = bytes(flags[component] for component in self.order)
+        self._masks = {}
+
+        self.closures = [None] * len(adjacency)
+        for component in self.order:
+            position = self.position[component]
+            reached = [self.closures[neighbour] for neighbour in adjacency[component]]
+            if all(isinstance(closure, array) for closure in reached):
+                members = {position}
+                for closure in reached:
+                    members.update(closure)
+                if _is_sparse(len(members), max(members) - min(members) + 1):
+                    self.closures[component] = array('I', sorted(members))
+                else:
+                    self.closures[component] = _bitset(members)
+                continue
+            reached = [_bitset(closure) if isinstance(closure, array) else closure for closure in reached]
+            offset = min([position] + [start for start, _ in reached])
+            bits = 1 << (position - offset)
+            for start, neighbour_bits in reached:
+                bits |= neighbour_bits << (start - offset)
+            self.closures[component] = _compress(offset, bits)
+
+    def _mask(self, wanted:int) -> int:
+        mask = self._masks.get(wanted)
+        if mask is None:
+            mask = self._masks[wanted] = _bitset([position for position, flags in enumerate(self.flags) if flags & wanted] or [0])
+        return mask
+
+    def _filtered(self, component:int, wanted:int):
+        closure = self.closures[component]
+        if isinstance(closure, array):
+            if wanted is None:
+                return closure
+            return array('I', [position for position in closure if self.flags[position] & wanted])
+        offset, bits = closure
+        if wanted is not None:
+            mask_offset, mask = self._mask(wanted)
+            bits &= mask >> offset - mask_offset if offset >= mask_offset else mask << mask_offset - offset
+        return offset, bits
+
+    def components(self, component:int, wanted:int=None) -> list:
+        """
+        Returns the components of a closure, only those holding a node of the wanted NODE_FLAGS when given.
+        """
+        closure = self._filtered(component, wanted)
+        positions = closure if isinstance(closure, array) else _members(*closure)
+        return [self.order[position] for position in positions]
+
+    def count(self, component:int, wanted:int=None) -> int:
+        closure = self._filtered(component, wanted)
+        return len(closure) if isinstance(closure, array) else closure[1].bit_count()
+
+
+class ImpactIndex:
+    """
+    Reachability index over Jams jobs, packages, stored procedures and tables, answering "what is affected if this
+    changes" (upstream) and "what does this use" (downstream) from precomputed transitive closures.
+
+    Edges come from Jams jobs (job -> package, job -> job it depends on), dependencies() (package -> child package),
+    the EXEC extraction of analyzer.py (package -> procedure) and extract_sql_data (package or procedure -> table).
+    Cycles are collapsed to their strongly connected components and one closure per component and direction is
+    built in a single pass over the condensation, each stored as a sorted array of positions or an integer bitset,
+    whichever is smaller. A query decodes only the members it returns; on an acyclic graph counting is a popcount.
+
+    Methods:
+        from_analysis: Builds the index from the outputs analyzer.py writes in the analysis folder.
+        add_edge / add_package_dependencies / add_procedure_calls / add_table_references / add_jobs: Add edges.
+        nodes: Every node, optionally of one kind only.
+        upstream / downstream: Every node that uses / is used by a node, optionally of some kinds only.
+        count_upstream / count_downstream: How many nodes a query would return, without listing them.
+        impact: The jobs, packages and procedures affected by a change to a table, procedure or package.
+        edges_frame / from_frame: The graph as a DataFrame of edges, and back.
+    """
+    def __init__(self):
+        self.graph = DependencyGraph()
+        self._built = False
+
+    def add_edge(self, source:ImpactNode, target:ImpactNode) -> None:
+        if source is not None and target is not None and source != target:
+            self.graph.add_edge(source, target)
+            self._built = False
+
+    def add_node(self, node:ImpactNode) -> None:
+        if node is not None:
+            self.graph.add_node(node)
+            self._built = False
+
+    def add_package_dependencies(self, map_dict:dict) -> None:
+        """
+        Adds package -> child package edges from a {package: [child packages] or None} dictionary, as produced by
+        dependencies() or stored in parenthood_relations.json.
+        """
+        for parent, children in map_dict.items():
+            self.add_node(node_key('package', parent))
+            for child in children or []:
+                self.add_edge(node_key('package', parent), node_key('package', child))
+
+    def add_procedure_calls(self, df) -> None:
+        """
+        Adds package -> procedure edges from a File_path, store_procedure_name frame, e.g. total_StoreProcedures.csv.
+        """
+        for package, procedure in df[['File_path', 'store_procedure_name']].itertuples(index=False):
+            if isinstance(procedure, str):
+                self.add_edge(node_key('package', package), node_key('procedure', procedure))
+
+    def add_table_references(self, df, source:str='package') -> None:
+        """
+        Adds package -> table edges from a File_path, Extracted frame (tables_sql.csv), or with source='procedure'
+        procedure -> table edges from a store_procedure_name, Extracted frame (extracted_sql_from_sp.csv).
+        """
+        column = 'File_path' if source == 'package' else 'store_procedure_name'
+        for name, extracted in df[[column, 'Extracted']].itertuples(index=False):
+            table = extracted_table(extracted)
+            if table is not None and isinstance(name, str):
+                self.add_edge(node_key(source, name), ImpactNode('table', table))
+
+    def add_jobs(self, jobs:dict) -> None:
+        """
+        Adds the edges of a Jams jobs file: {job: {'package_name': ..., 'depends_on': job or list of jobs or None}}.
+        A job uses its package and the jobs it depends on, so it is affected by anything that affects them.
+        """
+        for job, definition in jobs.items():
+            self.add_node(node_key('job', job))
+            if definition.get('package_name'):
+                self.add_edge(node_key('job', job), node_key('package', definition['package_name']))
+            depends_on = definition.get('depends_on') or []
+            for upstream_job in [depends_on] if isinstance(depends_on, str) else depends_on:
+                self.add_edge(node_key('job', job), node_key('job', upstream_job))
+
+    @classmethod
+    def from_analysis(cls, analysis_dir:str) -> 'ImpactIndex':
+        """
+        Builds the index from parenthood_relations.json, total_StoreProcedures.csv, tables_sql.csv,
+        extracted_sql_from_sp.csv and every *_Jams.json of an analysis folder, skipping the ones that are missing.
+        """
+        import pandas as pd
+        index = cls()
+
+        def path(name):
+            return os.path.join(analysis_dir, name)
+
+        if os.path.exists(path('parenthood_relations.json')):
+            with open(path('parenthood_relations.json')) as f:
+                index.add_package_dependencies(json.load(f))
+        if os.path.exists(path('total_StoreProcedures.csv')):
+            index.add_procedure_calls(pd.read_csv(path('total_StoreProcedures.csv')))
+        if os.path.exists(path('tables_sql.csv')):
+            index.add_table_references(pd.read_csv(path('tables_sql.csv')))
+        if os.path.exists(path('extracted_sql_from_sp.csv')):
+            index.add_table_references(pd.read_csv(path('extracted_sql_from_sp.csv')), source='procedure')
+        for jobs_path in sorted(glob.glob(path('*_Jams.json'))):
+            with open(jobs_path) as f:
+                index.add_jobs(json.load(f))
+        return index
+
+    def build(self) -> 'ImpactIndex':
+        """
+        Precomputes the upstream and downstream closures. Queries build the index on first use, so calling it is
+        only needed to pay the cost up front.
+        """
+        graph = self.graph
+        self._components = graph.strongly_connected_components()
+        self._component_of = [0] * len(graph)
+        for number, component in enumerate(self._components):
+            for member in component:
+                self._component_of[member] = number
+
+        children = [set() for _ in self._components]
+        parents = [set() for _ in self._components]
+        for parent, child in graph._edges:
+            parent, child = self._component_of[parent], self._component_of[child]
+            if parent != child:
+                children[parent].add(child)
+                parents[child].add(parent)
+        flags = [0] * len(self._components)
+        for number, component in enumerate(self._components):
+            for member in component:
+                flags[number] |= NODE_FLAGS[graph.name(member).kind]
+        self._closures = {'down': _Closures(children, flags), 'up': _Closures(parents, flags)}
+        self._cyclic = any(len(component) > 1 for component in self._components)
+        self._built = True
+        return self
+
+    def nodes(self, kind:str=None) -> list:
+        return [node for node in self.graph._names if kind is None or node.kind == kind]
+
+    def _node(self, node) -> int:
+        if not self._built:
+            self.build()
+        key = node if isinstance(node, ImpactNode) else node_key(*node)
+        if key is None:
+            raise KeyError(f"{node[0]} {node[1]!r} is not a valid impact index node")
+        node = key
+        if node not in self.graph:
+            raise KeyError(f"{node.kind} {node.name} is not in the impact index")
+        return self.graph.node_id(node)
+
+    @staticmethod
+    def _kinds(kinds) -> tuple:
+        """
+        Normalizes a kinds argument, None, a kind or a list of kinds, to (kinds, NODE_FLAGS of them).
+        """
+        if kinds is None:
+            return None, None
+        kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+        wanted = 0
+        for kind in kinds:
+            wanted |= NODE_FLAGS[kind]
+        return kinds, wanted
+
+    def _reach(self, node, direction:str, kinds) -> list:
+        member = self._node(node)
+        component = self._component_of[member]
+        kinds, wanted = self._kinds(kinds)
+        result = []
+        for reached in self._closures[direction].components(component, wanted):
+            for other in self._components[reached]:
+                if other == member:
+                    continue
+                name = self.graph.name(other)
+                if kinds is None or name.kind in kinds:
+                    result.append(name)
+        return result
+
+    def _count(self, node, direction:str, kinds) -> int:
+        # a cycle is one position for several nodes, possibly of several kinds, so only acyclic graphs are counted
+        # straight from the closures
+        member = self._node(node)
+        if self._cyclic:
+            return len(self._reach(node, direction, kinds))
+        kinds, wanted = self._kinds(kinds)
+        count = self._closures[direction].count(self._component_of[member], wanted)
+        return count - (kinds is None or self.graph.name(member).kind in kinds)
+
+    def upstream(self, node, kinds=None) -> list:
+        """
+        Returns every node that uses the given one directly or transitively, i.e. everything affected when it
+        changes, optionally only of the given kinds. Like DependencyGraph.ancestors, the node itself is left out even
+        when it sits in a cycle. node is an ImpactNode or a (kind, name) pair, e.g.
+        upstream(('table', 'dbo.DimDate'), kinds=['package', 'job']).
+        """
+        return self._reach(node, 'up', kinds)
+
+    def downstream(self, node, kinds=None) -> list:
+        """
+        Returns every node the given one uses directly or transitively, optionally only of the given kinds, e.g.
+        downstream(('job', 'BING_HRIS_BaseB0ToBN_Load_Daily'), kinds='table').
+        """
+        return self._reach(node, 'down', kinds)
+
+    def count_upstream(self, node, kinds=None) -> int:
+        return self._count(node, 'up', kinds)
+
+    def count_downstream(self, node, kinds=None) -> int:
+        return self._count(node, 'down', kinds)
+
+    def impact(self, node) -> dict:
+        """
+        What has to be checked when a table, procedure or package changes: {'job': [...], 'package': [...],
+        'procedure': [...]} of the names that use it, directly or transitively.
+        """
+        affected = {'job': [], 'package': [], 'procedure': []}
+        for name in self.upstream(node, kinds=list(affected)):
+            affected[name.kind].append(name.name)
+        return affected
+
+    def edges_frame(self):
+        """
+        Returns one row per edge: source_kind, source, target_kind and target, then one row per isolated node with
+        an empty target, so a job without packages or a package calling nothing survives a round trip.
+        """
+        import pandas as pd
+        rows = [self.graph.name(parent) + self.graph.name(child) for parent, child in sorted(self.graph._edges)]
+        rows.extend(self.graph.name(node) + (None, None) for node in range(len(self.graph))
+                    if not self.graph._children[node] and not self.graph._parents[node])
+        return pd.DataFrame(rows, columns=EDGE_COLUMNS)
+
+    @classmethod
+    def from_frame(cls, df) -> 'ImpactIndex':
+        """
+        Rebuilds an index from edges_frame output, e.g. the impact_edges.csv written by analyzer.py. Rows with an
+        empty target are isolated nodes. Read the file with dtype=str and keep_default_na=False, or names such as
+        2021 or NA come back as numbers or NaN and no longer match their nodes.
+        """
+        index = cls()
+        for source_kind, source, target_kind, target in df[EDGE_COLUMNS].itertuples(index=False):
+            if isinstance(target_kind, str) and target_kind:
+                index.add_edge(ImpactNode(source_kind, source), ImpactNode(target_kind, target))
+            else:
+                index.add_node(ImpactNode(source_kind, source))
+        return index
@@ -0,0 +1,161 @@
+import json
+import os
+
+# files with the msgpack extension are written as msgpack, every other one as JSON
+FORMATS = {'json': '.json', 'msgpack': '.msgpack'}
+BINARY_EXTENSIONS = (FORMATS['msgpack'],)
+INDEX_SUFFIX = '.idx'
+
+
+def is_binary(file_path:str) -> bool:
+    return os.path.splitext(file_path)[1] in BINARY_EXTENSIONS
+
+
+def index_path(file_path:str) -> str:
+    """
+    The offset index written next to a file by dump, e.g. json/Project_Package.json.idx.
+    """
+    return file_path + INDEX_SUFFIX
+
+
+class StreamWriter:
+    """
+    Writes a nested dict/list document to a binary file handle piece by piece, so neither the whole encoded text nor
+    a copy of the document is ever held in memory, and records the byte range of every value found in a dict at
+    less than index_depth levels deep.
+
+    JSON is produced by json.JSONEncoder.iterencode, compact unless indent is given; msgpack (needs the msgpack
+    package) by packing map headers and values one at a time.
+
+    Methods:
+        write: Writes a document and returns its index entries, [path, offset, length] lists.
+    """
+    def __init__(self, f, binary:bool=False, indent:int=None, index_depth:int=1):
+        self.f = f
+        self.binary = binary
+        self.indent = indent
+        self.index_depth = index_depth
+        self.offset = 0
+        self.entries = []
+        if binary:
+            import msgpack
+            self.packer = msgpack.Packer(use_bin_type=True)
+        else:
+            separators = (',', ': ') if indent is not None else (',', ':')
+            self.encoder = json.JSONEncoder(indent=indent, separators=separators)
+
+    def _emit(self, data:bytes) -> None:
+        self.f.write(data)
+        self.offset += len(data)
+
+    def _text(self, text:str) -> None:
+        # iterencode escapes every non-ASCII character, so one character is one byte
+        self._emit(text.encode('ascii'))
+
+    def _newline(self, level:int) -> None:
+        if self.indent is not None:
+            self._text('\n' + ' ' * (self.indent * level))
+
+    def _value(self, value, level:int) -> None:
+        if self.binary:
+            self._emit(self.packer.pack(value))
+            return
+        # nested values are encoded from indent level 0, JSON strings never hold a raw newline so shifting is safe
+        shift = '\n' + ' ' * (self.indent * level) if self.indent is not None and level else None
+        for chunk in self.encoder.iterencode(value):
+            self._text(chunk.replace('\n', shift) if shift else chunk)
+
+    def _write(self, value, path:tuple) -> None:
+        if not isinstance(value, dict) or len(path) >= self.index_depth:
+            self._value(value, len(path))
+            return
+        if self.binary:
+            self._emit(self.packer.pack_map_header(len(value)))
+        else:
+            self._text('{')
+        for position, (key, item) in enumerate(value.items()):
+            if self.binary:
+                self._emit(self.packer.pack(key))
+            else:
+                self._text(',' if position else '')
+                self._newline(len(path) + 1)
+                self._text(json.dumps(str(key)) + (': ' if self.indent is not None else ':'))
+            start = self.offset
+            self._write(item, path + (key,))
+            self.entries.append([list(path + (key,)), start, self.offset - start])
+        if not self.binary:
+            if value:
+                self._newline(len(path))
+            self._text('}')
+
+    def write(self, document) -> list:
+        self._write(document, ())
+        return self.entries
+
+
+def dump(document, file_path:str, indent:int=None, index_depth:int=1) -> None:
+    """
+    Streams a document to file_path, as msgpack when the extension is .msgpack and as JSON otherwise (compact unless
+    indent is given). With index_depth > 0 an offset index of the values at the first index_depth dict levels is
+    written to index_path(file_path), so load_entry can read one of them without parsing the rest.
+    """
+    binary = is_binary(file_path)
+    with open(file_path, 'wb') as f:
+        entries = StreamWriter(f, binary, indent, index_depth).write(document)
+    if index_depth > 0:
+        with open(index_path(file_path), 'w') as f:
+            json.dump({'format': 'msgpack' if binary else 'json', 'entries': entries}, f, separators=(',', ':'))
+    elif os.path.exists(index_path(file_path)):
+        os.remove(index_path(file_path))
+
+
+def _decode(data:bytes, binary:bool):
+    if binary:
+        import msgpack
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def load(file_path:str):
+    """
+    Reads a whole document written by dump, or any JSON file.
+    """
+    with open(file_path, 'rb') as f:
+        return _decode(f.read(), is_binary(file_path))
+
+
+def entries(file_path:str) -> list:
+    """
+    Returns the key paths indexed for file_path, an empty list when it has no index.
+    """
+    if not os.path.exists(index_path(file_path)):
+        return []
+    with open(index_path(file_path)) as f:
+        return [tuple(path) for path, _, _ in json.load(f)['entries']]
+
+
+def load_entry(file_path:str, *path):
+    """
+    Reads the value at a key path, e.g. load_entry('analysis/tree_deps.json', package) or
+    load_entry(json_path, '{www.microsoft.com/SqlServer/Dts}Executable', '{www.microsoft.com/SqlServer/Dts}Executables').
+    Only the bytes of the deepest indexed value on the path are read and parsed; the remaining keys are looked up in
+    it. Files without an index are loaded whole. Raises KeyError when the path does not exist.
+    """
+    best = None
+    if os.path.exists(index_path(file_path)):
+        with open(index_path(file_path)) as f:
+            for entry_path, offset, length in json.load(f)['entries']:
+                depth = len(entry_path)
+                if tuple(entry_path) == path[:depth] and (best is None or depth > len(best[0])):
+                    best = (entry_path, offset, length)
+
+    if best is None:
+        value, rest = load(file_path), path
+    else:
+        with open(file_path, 'rb') as f:
+            f.seek(best[1])
+            value = _decode(f.read(best[2]), is_binary(file_path))
+        rest = path[len(best[0]):]
+    for key in rest:
+        value = value[key]
+    return value
@@ -0,0 +1,308 @@
+import os
+import re
+from collections import namedtuple
+import pandas as pd
+from cache import get_document
+from graph import DependencyGraph
+from sqlrefs import iter_sql_references
+
+DTS = '{www.microsoft.com/SqlServer/Dts}'
+
+# a column flowing inside a data flow, identified by its lineageId within the package
+ColumnNode = namedtuple('ColumnNode', ['package', 'component', 'column', 'lineage_id'])
+# a column of a table read by a source or written by a destination, shared by every package that touches it
+TableColumn = namedtuple('TableColumn', ['table', 'column'])
+
+# #{Package\DFT.Outputs[Output].Columns[Col]} in SSIS 2012+ expressions, #123 in older lineage ids
+COLUMN_REFERENCE_REGEX = re.compile(r'#\{([^}]*)\}|#(\d+)')
+
+EDGE_COLUMNS = ['source_table', 'source_package', 'source_component', 'source_column', 'source_lineage_id',
+                'target_table', 'target_package', 'target_component', 'target_column', 'target_lineage_id']
+PATH_COLUMNS = ['package', 'dataflow', 'start_component', 'end_component']
+
+
+def table_key(name:str) -> str:
+    """
+    Normalizes a table name so sources and destinations of different packages meet on the same node: brackets,
+    quotes, the database part and case are dropped and a missing schema defaults to dbo, e.g.
+    "[BING_EDW].[dbo].[Stage_15]" -> "dbo.stage_15".
+    """
+    if not isinstance(name, str) or not name.strip():
+        return None
+    parts = [part.strip().strip('[]"').strip() for part in name.strip().split('.')]
+    parts = ['dbo'] + parts if len(parts) == 1 else parts[-2:]
+    return '.'.join(parts).casefold()
+
+
+def table_column(table:str, column:str) -> TableColumn:
+    """
+    Returns the lineage node of a table column, e.g. table_column('[dbo].[Dim_15]', 'Col0').
+    """
+    return TableColumn(table_key(table), column)
+
+
+def _column_ids(element) -> list:
+    return [value for value in (element.get('refId'), element.get('lineageId'), element.get('id')) if value]
+
+
+def _references(element) -> list:
+    references = []
+    for prop in element.iterfind('properties/property'):
+        for braced, numeric in COLUMN_REFERENCE_REGEX.findall(prop.text or ''):
+            references.append(braced or numeric)
+    return references
+
+
+def _component_table(package:str, component) -> str:
+    """
+    The table a source reads or a destination writes: OpenRowset when set, otherwise the single table of SqlCommand.
+    A query over several tables gets its own pseudo table, so its columns are not attributed to the wrong one.
+    """
+    properties = {prop.get('name'): prop.text for prop in component.iterfind('properties/property')}
+    if properties.get('OpenRowset'):
+        return table_key(properties['OpenRowset'])
+    if properties.get('SqlCommand'):
+        tables = {table_key(f"{reference.schema or 'dbo'}.{reference.object}")
+                  for reference in iter_sql_references(properties['SqlCommand']) if reference.role in ('FROM', 'JOIN')}
+        if len(tables) == 1:
+            return tables.pop()
+        return f"query:{package}|{component.get('refId') or component.get('id')}"
+    return None
+
+
+def extract_pipeline_lineage(package:str, pipeline) -> tuple:
+    """
+    Extracts the column lineage of one <pipeline> element. Returns (edges, paths): edges are (upstream, downstream)
+    node pairs and paths are (start component, end component) pairs of the data flow.
+
+    Source output columns come from their table through externalMetadataColumnId, input columns point at the
+    upstream column they read through lineageId, derived and async output columns come from the columns their
+    properties reference (#{lineageId} expressions, SortColumnId, ...) and destination input columns flow into their
+    table through externalMetadataColumnId. An async output column with no reference comes from the input columns
+    of the same name.
+    """
+    nodes = {}
+    pending_outputs = []
+    pending_inputs = []
+    components = {}
+
+    for component in pipeline.iterfind('components/component'):
+        name = component.get('name')
+        table = _component_table(package, component)
+        external = {}
+        for column in component.iter('externalMetadataColumn'):
+            for column_id in _column_ids(column):
+                external[column_id] = column.get('name')
+        input_columns = []
+        for input_element in component.iterfind('inputs/input'):
+            components.update({input_id: name for input_id in _column_ids(input_element)})
+            for column in input_element.iterfind('inputColumns/inputColumn'):
+                pending_inputs.append((column, table, external))
+                input_columns.append(column)
+        for output in component.iterfind('outputs/output'):
+            components.update({output_id: name for output_id in _column_ids(output)})
+            for column in output.iterfind('outputColumns/outputColumn'):
+                node = ColumnNode(package, name, column.get('name'), column.get('lineageId') or column.get('id'))
+                for column_id in _column_ids(column):
+                    nodes[column_id] = node
+                synchronous = output.get('synchronousInputId') not in (None, '', '0')
+                pending_outputs.append((node, column, table, external, None if synchronous else input_columns))
+
+    # input columns are known by their own refId too, expressions of later components may reference them that way
+    for column, _, _ in pending_inputs:
+        upstream = nodes.get(column.get('lineageId'))
+        if upstream is not None:
+            for column_id in _column_ids(column):
+                nodes.setdefault(column_id, upstream)
+
+    edges = []
+    for node, column, table, external, input_columns in pending_outputs:
+        external_name = external.get(column.get('externalMetadataColumnId'))
+        if table and external_name:
+            edges.append((TableColumn(table, external_name), node))
+        references = [nodes[reference] for reference in _references(column) if reference in nodes]
+        edges.extend((upstream, node) for upstream in references)
+        if not references and not external_name and input_columns:
+            edges.extend((nodes[upstream.get('lineageId')], node) for upstream in input_columns
+                         if upstream.get('lineageId') in nodes and (upstream.get('cachedName') or upstream.get('name')) == node.column)
+
+    for column, table, external in pending_inputs:
+        upstream = nodes.get(column.get('lineageId'))
+        if upstream is None:
+            continue
+        external_name = external.get(column.get('externalMetadataColumnId'))
+        if table and external_name:
+            edges.append((upstream, TableColumn(table, external_name)))
+        edges.extend((upstream, nodes[reference]) for reference in _references(column)
+                     if reference in nodes and nodes[reference] != upstream)
+
+    paths = [(components.get(path.get('startId')), components.get(path.get('endId'))) for path in pipeline.iterfind('paths/path')]
+    return edges, paths
+
+
+def extract_package_lineage(file_path:str, package:str=None) -> tuple:
+    """
+    Extracts the column lineage of every data flow of a package. Returns (edges, paths) as extract_pipeline_lineage,
+    paths carrying the data flow refId as a first item. Built once per cached document.
+    """
+    package = package or os.path.splitext(os.path.basename(file_path))[0]
+
+    def build(doc):
+        edges, paths = [], []
+        for executable in doc.tree.getroot().iter(f'{DTS}Executable'):
+            if (executable.get(f'{DTS}ExecutableType') or '').lower() != 'microsoft.pipeline':
+                continue
+            for pipeline in executable.iterfind(f'{DTS}ObjectData/pipeline'):
+                pipeline_edges, pipeline_paths = extract_pipeline_lineage(package, pipeline)
+                edges.extend(pipeline_edges)
+                paths.extend((executable.get(f'{DTS}refId'), start, end) for start, end in pipeline_paths)
+        return edges, paths
+
+    return get_document(file_path).derived(f'lineage:{package}', build)
+
+
+class LineageIndex:
+    """
+    Column-level lineage graph across packages, from source table columns through data flow transforms to
+    destination table columns. Tables written by one package and read by another link their data flows together.
+
+    Closures are memoized per strongly connected component: the first question about a column walks only the part
+    of the graph above (or below) it, and every later question about any column in that part is a dictionary lookup.
+
+    Methods:
+        add_package: Adds the lineage of the data flows of a package.
+        upstream / downstream: Every node a column comes from / flows into.
+        origins: The columns a column ultimately comes from, table columns where they are known.
+        impact: The table columns affected by changing or dropping a column.
+        edges_frame / paths_frame / from_frame: The graph and the data flow paths as DataFrames, and back.
+    """
+    def __init__(self):
+        self.graph = DependencyGraph()
+        self.paths = []
+        self._component_of = None
+        self._closures = {}
+
+    @classmethod
+    def from_packages(cls, file_paths:list, add_prefix:bool=False) -> 'LineageIndex':
+        """
+        Builds the index over a list of .dtsx files. With add_prefix packages are named after their parent folder
+        and file, as extract_values names them.
+        """
+        index = cls()
+        for file_path in file_paths:
+            name = '_'.join(file_path.split('\\')[-2:]) if add_prefix else os.path.basename(file_path)
+            index.add_package(file_path, os.path.splitext(name)[0])
+        return index
+
+    def add_package(self, file_path:str, package:str=None) -> int:
+        """
+        Adds the lineage of the data flows of a package. Returns the number of edges added.
+        """
+        edges, paths = extract_package_lineage(file_path, package)
+        for upstream, downstream in edges:
+            self.graph.add_edge(upstream, downstream)
+        self.paths.extend((package,) + path for path in paths)
+        self._component_of = None
+        self._closures = {}
+        return len(edges)
+
+    def add_edge(self, upstream, downstream) -> None:
+        self.graph.add_edge(upstream, downstream)
+        self._component_of = None
+        self._closures = {}
+
+    def __contains__(self, node) -> bool:
+        return node in self.graph
+
+    def _closure(self, node, direction:str) -> frozenset:
+        if self._component_of is None:
+            self._components = self.graph.strongly_connected_components()
+            self._component_of = [0] * len(self.graph)
+            for number, component in enumerate(self._components):
+                for member in component:
+                    self._component_of[member] = number
+        adjacency = self.graph._children if direction == 'down' else self.graph._parents
+        start = self._component_of[self.graph.node_id(node)]
+
+        # iterative post-order over components, so long chains never hit the recursion limit
+        stack = [(start, False)]
+        while stack:
+            number, expanded = stack.pop()
+            if (direction, number) in self._closures:
+                continue
+            neighbours = {self._component_of[neighbour] for member in self._components[number] for neighbour in adjacency[member]} - {number}
+            if not expanded:
+                stack.append((number, True))
+                stack.extend((neighbour, False) for neighbour in neighbours if (direction, neighbour) not in self._closures)
+                continue
+            closure = set(self._components[number])
+            for neighbour in neighbours:
+                closure |= self._closures[(direction, neighbour)]
+            self._closures[(direction, number)] = frozenset(closure)
+
+        closure = self._closures[(direction, start)]
+        return closure if len(self._components[start]) > 1 else closure - {self.graph.node_id(node)}
+
+    def upstream(self, node) -> list:
+        """
+        Returns every node the given column comes from, directly or through any number of transforms and packages.
+        """
+        return [self.graph.name(member) for member in self._closure(node, 'up')]
+
+    def downstream(self, node) -> list:
+        """
+        Returns every node the given column flows into, directly or through any number of transforms and packages.
+        """
+        return [self.graph.name(member) for member in self._closure(node, 'down')]
+
+    def origins(self, node) -> list:
+        """
+        Where does this column come from: the upstream nodes nothing flows into, source table columns when the
+        source component names its table.
+        """
+        return [self.graph.name(member) for member in self._closure(node, 'up') if not self.graph._parents[member]]
+
+    def impact(self, node) -> list:
+        """
+        What is affected by dropping this column: the table columns it flows into, in any package.
+        """
+        return [name for name in self.downstream(node) if isinstance(name, TableColumn)]
+
+    def edges_frame(self) -> pd.DataFrame:
+        """
+        Returns one row per edge, with the table and column of table nodes and the package, component, column and
+        lineageId of data flow columns.
+        """
+        def fields(node):
+            if isinstance(node, TableColumn):
+                return [node.table, None, None, node.column, None]
+            return [None, node.package, node.component, node.column, node.lineage_id]
+
+        rows = [fields(self.graph.name(parent)) + fields(self.graph.name(child))
+                for parent in range(len(self.graph)) for child in self.graph._children[parent]]
+        return pd.DataFrame(rows, columns=EDGE_COLUMNS)
+
+    def paths_frame(self) -> pd.DataFrame:
+        """
+        Returns one row per data flow path: the package, the data flow refId and the start and end components.
+        """
+        return pd.DataFrame(self.paths, columns=PATH_COLUMNS)
+
+    @classmethod
+    def from_frame(cls, df:pd.DataFrame, paths:pd.DataFrame=None) -> 'LineageIndex':
+        """
+        Rebuilds an index from edges_frame output, and its paths from paths_frame output, e.g. the
+        column_lineage.csv and column_lineage_paths.csv written by analyzer.py. Read the files with dtype=str, or
+        numeric lineage ids come back as floats and no longer match the nodes of from_packages.
+        """
+        def node(row, prefix):
+            if isinstance(row[f'{prefix}_table'], str):
+                return TableColumn(row[f'{prefix}_table'], row[f'{prefix}_column'])
+            return ColumnNode(row[f'{prefix}_package'], row[f'{prefix}_component'], row[f'{prefix}_column'], row[f'{prefix}_lineage_id'])
+
+        index = cls()
+        for row in df[EDGE_COLUMNS].astype(object).where(df[EDGE_COLUMNS].notna(), None).to_dict('records'):
+            index.graph.add_edge(node(row, 'source'), node(row, 'target'))
+        if paths is not None:
+            index.paths = [tuple(path) for path in paths[PATH_COLUMNS].astype(object).where(paths[PATH_COLUMNS].notna(), None).itertuples(index=False)]
+        return index
@@ -1,11 +1,160 @@
 #%%
-from SSISModule import SSISMigrator, SSISDiscovery
-from utils import create_directories
-import json
+from SSISModule import SSISMigrator, SSISDiscovery, EXECUTABLE_COLUMNS
+from utils import create_directories, write_frame, OUTPUT_FORMATS
+from manifest import Manifest, remove_outputs
+from staging import STAGING_MODES, resolve, staged_files
+from profiling import Profiler, active, measure
+from jsonstream import FORMATS as JSON_FORMATS, dump, index_path
+import argparse
 import os
+import traceback
+
+# the parsed package is {root tag: {...}}, so the index reaches its sections (executables, variables...)
+PACKAGE_INDEX_DEPTH = 2
+
+
+def json_output(file_path, json_format='json'):
+    """
+    Returns the json (or msgpack) file a parsed .dtsx file is written to.
+    """
+    return os.path.splitext(file_path.replace('dtsx', 'json'))[0] + JSON_FORMATS[json_format]
+
+
+def package_outputs(file_path, output_format='csv', json_format='json'):
+    """
+    Returns the json (or msgpack), its offset index and the csv (or parquet/arrow) files written for a parsed .dtsx
+    file.
+    """
+    return [json_output(file_path, json_format), index_path(json_output(file_path, json_format)), file_path.replace('dtsx', output_format)]
+
+
+def select_changed(manifest, files, full=False):
+    """
+    Compares files against the manifest, forgets deleted files and removes their outputs. Returns the files that need
+    processing: every file when full is set, otherwise the added, changed and unchanged-but-missing-output ones.
+    """
+    changes = manifest.diff(files)
+    for file_path in changes['deleted']:
+        remove_outputs(manifest.remove(file_path))
+    if full:
+        return list(files)
+    missing = [file_path for file_path in changes['unchanged'] if not all(os.path.exists(resolve(output)) for output in manifest.outputs(file_path))]
+    print(f"{len(changes['added'])} added, {len(changes['changed'])} changed, {len(changes['deleted'])} deleted, {len(changes['unchanged']) - len(missing)} unchanged")
+    return changes['added'] + changes['changed'] + missing
+
+
+def extract_changed_files(discovery, target_dir, manifest, add_prefix=True, full=False, mode='copy'):
+    """
+    Stages only the discovered files that were added or changed since the last run, removes the staged files of
+    deleted ones and records the result in the manifest. Files rejected for a name collision are not recorded, so
+    they are reported again on the next run. Returns every discovered file.
+    """
+    discovered = discovery.get_files()
+    files = select_changed(manifest, discovered, full)
+    # targets of the files staged by earlier runs, which the changed files must not take over
+    owners = {os.path.abspath(output): file_path for file_path, entry in manifest.entries.items() for output in entry['outputs']}
+    for file_path, target_path in zip(files, discovery.extract_files(target_dir, files, add_prefix=add_prefix, mode=mode, owners=owners)):
+        if target_path is not None:
+            manifest.record(file_path, outputs=[target_path])
+    print(f"Staged into {target_dir}: {dict(discovery.staging_counts)}, {len(discovery.collisions)} name collisions")
+    manifest.save()
+    return discovered
+
+
+def parse_package_frame(file_path, output_format='csv', write_json=True, write_table=True, json_format='json', json_indent=None):
+    """
+    Parses one .dtsx file into its get_df DataFrame, writing its json and csv (or parquet/arrow) outputs only when
+    asked. Returns the file path, the DataFrame (None on failure) and the error traceback, or None on success.
+
+    With a columnar output_format the table is written as .parquet or .arrow and carries its own File_path column,
+    so the per-package files can be scanned as one dataset without a rename step.
+
+    The parsed data is streamed to its json file, compact unless json_indent is given, or to a .msgpack file, with an
+    offset index so jsonstream.load_entry can read one section of it.
+    """
+    try:
+        with measure('parse_package', file_path):
+            migrator = SSISMigrator()
+            parsed_data = migrator.parse_xml_file(file_path)
+            df = migrator.get_df(parsed_data)
+
+            if write_json:
+                with measure('write_json', file_path):
+                    dump(parsed_data, json_output(file_path, json_format), indent=json_indent, index_depth=PACKAGE_INDEX_DEPTH)
+
+            if write_table:
+                with measure('write_table', file_path):
+                    if output_format == 'csv':
+                        df.to_csv(file_path.replace('dtsx', 'csv'), index=False)
+                    else:
+                        table = df.reindex(columns=EXECUTABLE_COLUMNS).astype('string')
+                        table['File_path'] = os.path.splitext(os.path.basename(file_path))[0]
+                        write_frame(table, file_path.replace('dtsx', output_format), output_format)
+    except Exception:
+        return file_path, None, traceback.format_exc()
+    return file_path, df, None
+
+
+def parse_package(file_path, output_format='csv', profile=False, json_format='json', json_indent=None):
+    """
+    Parses one .dtsx file and writes its json and csv outputs. Returns the file path and the error traceback, or None
+    when the package was parsed successfully, so a malformed package never stops the rest of the batch.
+
+    With profile set the package is measured by a profiler of its own, whose records are returned as a third item so
+    a worker process can hand them back to the profiler of the main process.
+    """
+    profiler = Profiler().start() if profile else None
+    file_path, _, error = parse_package_frame(file_path, output_format, json_format=json_format, json_indent=json_indent)
+    if profiler is None:
+        return file_path, error
+    profiler.stop()
+    return file_path, error, profiler.records()
+
+
+def parse_packages(file_paths, workers=1, ordered=True, output_format='csv', json_format='json', json_indent=None):
+    """
+    Parses .dtsx files with parse_package, in a process pool when workers > 1, yielding (file_path, error) pairs
+    either in input order or as soon as each package finishes. When profiling is on, the measurements taken in the
+    worker processes are merged into the active profiler.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            yield parse_package(file_path, output_format, json_format=json_format, json_indent=json_indent)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    profiler = active()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(parse_package, file_path, output_format, profiler is not None, json_format, json_indent): file_path for file_path in file_paths}
+        completed = futures if ordered else as_completed(futures)
+        for future in completed:
+            try:
+                result = future.result()
+            except Exception:
+                yield futures[future], traceback.format_exc()
+                continue
+            if profiler is not None:
+                profiler.merge(result[2])
+            yield result[:2]
+
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description="Extracts and parses the SSIS packages found in the bing folder.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used to parse the .dtsx files.")
+    parser.add_argument('--unordered', action='store_true', help="Report parsed packages as they finish instead of in input order.")
+    parser.add_argument('--full', action='store_true', help="Copy and parse every file, ignoring the manifest of the previous run.")
+    parser.add_argument('--format', choices=list(OUTPUT_FORMATS), default='csv', help="Format of the per-package tables.")
+    parser.add_argument('--json-format', choices=list(JSON_FORMATS), default='json', help="Format of the parsed package files, msgpack needs the msgpack package.")
+    parser.add_argument('--json-indent', type=int, default=None, help="Indents the parsed package json files (default: compact).")
+    parser.add_argument('--catalog', default=None, help="SQLite catalog the parsed packages are loaded into, e.g. analysis/catalog.db.")
+    parser.add_argument('--source', default='bing', help="Folder, or zip/tar(.gz) archive read without extracting it, holding the client's sources.")
+    parser.add_argument('--staging', choices=STAGING_MODES, default='auto', help="How files are staged into the dtsx, Sources_and_catalogs and StoreProcedures folders.")
+    parser.add_argument('--profile', default=os.environ.get('SSIS_PROFILE'), help="Writes a JSON report of the time, CPU, IO and memory used per stage and per package, e.g. analysis/profile.json.")
+    parser.add_argument('--cprofile', default=os.environ.get('SSIS_CPROFILE'), help="With --profile, also dumps cProfile stats readable with pstats to this file.")
+    args = parser.parse_args()
+    profiler = Profiler(cprofile_path=args.cprofile).start() if args.profile else None
+
     #--------------------------------------
     # EXTRACITING ALL SP FROM BING.RAR FILE
     from SSISModule import SSISDiscovery
@@ -13,57 +162,82 @@ if __name__ == '__main__':
     # EXTRACITING ALL SP FROM BING.RAR FILE
 
     path = os.getcwd()
-    create_directories(['dtsx', 'json', 'csv', 'analysis', 'StoreProcedures', 'Sources_and_catalogs'], path)
+    create_directories(['dtsx', 'json', args.format, 'analysis', 'StoreProcedures', 'Sources_and_catalogs', 'manifest'], path)
+    manifest_dir = os.path.join(path, 'manifest')
 
     # EXTRACTING ALL .params files From bing folder
-    dir_path = os.path.join(path, "bing")
+    dir_path = os.path.join(path, args.source)
     target_dir = os.path.join(path, "Sources_and_catalogs")
     valid_dirs = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart']
 
     #--------------------------------------
     discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".params")
-    files = discovery.get_files()
-    discovery.extract_files(target_dir, files)
+    manifest = Manifest(os.path.join(manifest_dir, 'params.json'))
+    extract_changed_files(discovery, target_dir, manifest, full=args.full, mode=args.staging)
+
+    # PROJECT CONNECTION MANAGERS, WHERE THE PROJECT PARAMETERS ARE USUALLY READ
+    discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".conmgr")
+    manifest = Manifest(os.path.join(manifest_dir, 'conmgr.json'))
+    extract_changed_files(discovery, target_dir, manifest, full=args.full, mode=args.staging)
     #--------------------------------------
 
 
     #--------------------------------------
     # EXTRACITING ALL .dtsx files From bing folder
-    dir_path = os.path.join(path, "bing")
+    dir_path = os.path.join(path, args.source)
     target_dir = os.path.join(path, "StoreProcedures")
     valid_dirs = ['Stored Procedures']
 
     #--------------------------------------
     discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".sql")
-    files = discovery.get_files()
-    discovery.extract_files(target_dir, files, add_prefix=False)
+    manifest = Manifest(os.path.join(manifest_dir, 'sql.json'))
+    extract_changed_files(discovery, target_dir, manifest, add_prefix=False, full=args.full, mode=args.staging)
     #--------------------------------------
 
 
     #--------------------------------------
     # EXTRACITING ALL .dtsx files From bing folder
-    dir_path = os.path.join(path, "bing")
+    dir_path = os.path.join(path, args.source)
     target_dir = os.path.join(path, "dtsx")
     valid_dirs = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart','DataLakeADPToBase']
 
     discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".dtsx")
-    files = discovery.get_files()
-    discovery.extract_files(target_dir, files)
+    manifest = Manifest(os.path.join(manifest_dir, 'dtsx.json'))
+    extract_changed_files(discovery, target_dir, manifest, full=args.full, mode=args.staging)
     #--------------------------------------
 
     #--------------------------------------
     # PARSING ALL .dtsx files
-    migrator = SSISMigrator()
-    file_paths = os.listdir(target_dir)
+    manifest = Manifest(os.path.join(manifest_dir, f'parse_{args.format}.json'))
+    file_paths = select_changed(manifest, staged_files(target_dir, '.dtsx'), args.full)
+
+    failures = []
+    for file_path, error in parse_packages(file_paths, workers=args.workers, ordered=not args.unordered, output_format=args.format,
+                                            json_format=args.json_format, json_indent=args.json_indent):
+        if error is None:
+            manifest.record(file_path, outputs=package_outputs(file_path, args.format, args.json_format))
+            print(f"Parsed Data is written out to file: {file_path}")
+        else:
+            print(f"Failed to parse {file_path}")
+            failures.append((file_path, error))
 
+    manifest.save()
 
-    for file_name in file_paths:
-        file_path = target_dir + "\\" + file_name
-        parsed_data = migrator.parse_xml_file(file_path)
-        df = migrator.get_df(parsed_data)
-        
-        with open(file_path.replace('dtsx', 'json'), "w") as f:
-            f.write(json.dumps(parsed_data, indent=4))
-        print("Parsed Data is written out to file")
+    if args.catalog:
+        from catalog import Catalog
+        failed = {file_path for file_path, _ in failures}
+        with Catalog(args.catalog) as catalog:
+            loaded = catalog.sync([file_path for file_path in staged_files(target_dir, '.dtsx') if file_path not in failed],
+                                  changed=[file_path for file_path in file_paths if file_path not in failed])
+        print(f"Loaded {loaded} packages into the catalog {args.catalog}")
 
-        df.to_csv(file_path.replace('dtsx', 'csv'), index=False)
+    print(f"Parsed {len(file_paths) - len(failures)} of {len(file_paths)} packages")
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(args.profile)
+        print(f"Profile written to {args.profile}")
+    if failures:
+        print(f"{len(failures)} packages failed:")
+        for file_path, error in failures:
+            print(f"  {file_path}: {error.strip().splitlines()[-1]}")
+        raise SystemExit(1)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from staging import resolve, unstage
+from archive import open_path, stat_path
+
+
+def file_hash(file_path:str, chunk_size:int=1024 * 1024) -> str:
+    """
+    Returns the sha256 hex digest of a file or archive member, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open_path(file_path) as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Persisted record of the source files processed by a stage: size, mtime and content hash of each file, plus the
+    outputs and derived data it produced, so the next run only reprocesses what was added, changed or deleted.
+
+    Methods:
+        diff: Classifies a list of files as added, changed, unchanged or deleted against the manifest.
+        record: Stores the current fingerprint of a file together with its outputs and derived data.
+        remove: Forgets a file and returns the outputs it had produced.
+        outputs: Returns the outputs recorded for a file.
+        data: Returns the derived data recorded for a file.
+        save: Writes the manifest back to disk.
+    """
+    def __init__(self, manifest_path:str):
+        """
+        Initializes the Manifest, loading it from manifest_path if it already exists.
+        """
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self._fingerprints = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.entries = json.load(f)
+
+    def _fingerprint(self, file_path:str) -> dict:
+        """
+        Returns the size, mtime and content hash of a file, hashing it only when size or mtime moved.
+        """
+        source = resolve(file_path)
+        size, mtime_ns = stat_path(source)
+        entry = self.entries.get(file_path)
+        if entry is not None and entry['size'] == size and entry['mtime'] == mtime_ns:
+            sha256 = entry['sha256']
+        else:
+            sha256 = file_hash(source)
+        return {'size': size, 'mtime': mtime_ns, 'sha256': sha256}
+
+    def diff(self, files:list) -> dict:
+        """
+        Classifies files as added, changed, unchanged or deleted against the manifest. A file whose mtime moved but
+        whose content hash is unchanged counts as unchanged.
+        """
+        result = {'added': [], 'changed': [], 'unchanged': [], 'deleted': []}
+        seen = set()
+        for file_path in files:
+            seen.add(file_path)
+            fingerprint = self._fingerprint(file_path)
+            self._fingerprints[file_path] = fingerprint
+            entry = self.entries.get(file_path)
+            if entry is None:
+                result['added'].append(file_path)
+            elif entry['sha256'] != fingerprint['sha256']:
+                result['changed'].append(file_path)
+            else:
+                entry.update(fingerprint)
+                result['unchanged'].append(file_path)
+        result['deleted'] = [file_path for file_path in self.entries if file_path not in seen]
+        return result
+
+    def record(self, file_path:str, outputs:list=None, data=None) -> None:
+        """
+        Stores the current fingerprint of a file together with the outputs and derived data it produced.
+        """
+        fingerprint = self._fingerprints.pop(file_path, None) or self._fingerprint(file_path)
+        self.entries[file_path] = dict(fingerprint, outputs=outputs or [], data=data)
+
+    def remove(self, file_path:str) -> list:
+        """
+        Forgets a file and returns the outputs it had produced, so the caller can delete them.
+        """
+        entry = self.entries.pop(file_path, None)
+        return entry['outputs'] if entry else []
+
+    def outputs(self, file_path:str) -> list:
+        return self.entries[file_path]['outputs']
+
+    def data(self, file_path:str):
+        return self.entries[file_path].get('data')
+
+    def save(self) -> None:
+        """
+        Writes the manifest back to disk, replacing the previous version atomically.
+        """
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def remove_outputs(outputs:list) -> None:
+    """
+    Deletes the output files left behind by a deleted source, including staged copies, links and virtual entries.
+    """
+    for output in outputs:
+        unstage(output)
@@ -2,7 +2,9 @@
 import os
 import json
 import os
-from utils import dependencies, process_map_dict, clean_dep_dict, collect_keys_values, build_dependencies
+from utils import dependencies, build_dependencies
+from graph import DependencyGraph
+from jsonstream import dump
 from SSISModule import SSISDiscovery
 #site to generate grapphs of dependencies from json 
 #https://jsoncrack.com/editor
@@ -14,18 +16,19 @@ target_dir = path+"\\"+"dtsx"
 valid_dirs = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart','DataLakeADPToBase']
 
 discovery = SSISDiscovery(dir_path, valid_dirs=valid_dirs, file_extension=".dtsx")
-files_path = discovery.get_files()
-
 map_dict = {}
 
-for file_path in files_path:
+# packages are read while the walk is still running
+for file_path in discovery.iter_files():
     map_dict.update({file_path: dependencies(file_path)})
 
-new_dep_dict, iterated_keys = process_map_dict(map_dict)
-new_dep_dict = clean_dep_dict(new_dep_dict, iterated_keys)
+graph = DependencyGraph.from_map_dict(map_dict)
+for cycle in graph.find_cycles():
+    print(f"Circular package dependency: {' -> '.join(cycle)}")
+new_dep_dict = graph.to_tree_deps()
 
-with open(path+"\\analysis\\"+"tree_deps.json", "w") as f:
-    f.write(json.dumps(new_dep_dict, indent=4))
+# compact, with an offset index so a single package subtree can be read back with jsonstream.load_entry
+dump(new_dep_dict, path+"\\analysis\\"+"tree_deps.json")
 
 ## HR
 with open(path+"\\analysis\\"+"HR_Jams.json", "r") as f:
@@ -55,8 +58,7 @@ for k in HR_Jams.keys():
         }
     })
 
-with open(path+"\\analysis\\"+"HR_total_dependencies.json", "w") as f:
-    f.write(json.dumps(total_deps, indent=4))
+dump(total_deps, path+"\\analysis\\"+"HR_total_dependencies.json")
 
 ### Payroll
 with open(path+"\\analysis\\"+"Payroll_Jams.json", "r") as f:
@@ -78,5 +80,4 @@ for k in HR_Jams.keys():
         }
     })
 
-with open(path+"\\analysis\\"+"Payroll_total_dependencies.json", "w") as f:
-    f.write(json.dumps(total_deps, indent=4))
\ No newline at end of file
+dump(total_deps, path+"\\analysis\\"+"Payroll_total_dependencies.json")
\ No newline at end of file
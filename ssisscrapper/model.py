@@ -0,0 +1,343 @@
+import json
+import os
+import sys
+from cache import get_document
+from utils import PRECEDENCE_EVAL_OPS, PRECEDENCE_VALUES
+
+DTS = '{www.microsoft.com/SqlServer/Dts}'
+SQLTASK = '{www.microsoft.com/sqlserver/dts/tasks/sqltask}'
+SSIS = '{www.microsoft.com/SqlServer/SSIS}'
+
+# qualified tag and attribute names, interned once so every lookup hashes and compares the same string objects
+REF_ID, EXECUTABLE_TYPE, CREATION_NAME, OBJECT_NAME, DTSID, DESCRIPTION, NAME = (
+    sys.intern(DTS + name) for name in ('refId', 'ExecutableType', 'CreationName', 'ObjectName', 'DTSID', 'Description', 'Name'))
+EXECUTABLES, EXECUTABLE, OBJECT_DATA, VARIABLES, VARIABLE, VARIABLE_VALUE = (
+    sys.intern(DTS + name) for name in ('Executables', 'Executable', 'ObjectData', 'Variables', 'Variable', 'VariableValue'))
+PRECEDENCE_CONSTRAINTS, PRECEDENCE_CONSTRAINT, CONNECTION_MANAGERS, CONNECTION_MANAGER, PROPERTY_EXPRESSION = (
+    sys.intern(DTS + name) for name in ('PrecedenceConstraints', 'PrecedenceConstraint', 'ConnectionManagers', 'ConnectionManager', 'PropertyExpression'))
+PACKAGE_PARAMETERS, PACKAGE_PARAMETER, PROPERTY = (sys.intern(DTS + name) for name in ('PackageParameters', 'PackageParameter', 'Property'))
+SQL_TASK_DATA, SQL_STATEMENT_SOURCE, SQL_CONNECTION = (sys.intern(SQLTASK + name) for name in ('SqlTaskData', 'SqlStatementSource', 'Connection'))
+
+MODEL_TYPES = {}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _bool(value):
+    if value is None:
+        return None
+    return value.strip().lower() in ('true', '1')
+
+
+def _local_child(element, name:str):
+    for child in element:
+        if isinstance(child.tag, str) and child.tag.rsplit('}', 1)[-1] == name:
+            return child
+    return None
+
+
+class ModelObject:
+    """
+    Base of the package model: fixed __slots__ fields, equality by value and a lossless dict form.
+
+    Fields listed in _interned hold values that repeat across every package (types, class ids, namespaces); they are
+    interned so each distinct value is stored once however many objects carry it.
+
+    Methods:
+        to_dict: Returns the object as plain dicts and lists, tagged with its type.
+        from_dict: Rebuilds an object from to_dict output.
+    """
+    __slots__ = ()
+    _interned = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = tuple(field for klass in reversed(cls.__mro__) for field in klass.__dict__.get('__slots__', ()))
+        MODEL_TYPES[cls.__name__] = cls
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            value = values.get(field)
+            setattr(self, field, _intern(value) if field in self._interned else value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, field) == getattr(other, field) for field in self.FIELDS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({getattr(self, 'ref_id', None) or getattr(self, 'name', None)!r})"
+
+    def to_dict(self) -> dict:
+        """
+        Returns the object as plain dicts and lists, tagged with its type. None fields are left out.
+        """
+        result = {'_type': type(self).__name__}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = _dump(value)
+        return result
+
+    @staticmethod
+    def from_dict(data:dict):
+        """
+        Rebuilds an object from to_dict output.
+        """
+        return _load(data)
+
+
+def _dump(value):
+    if isinstance(value, ModelObject):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_dump(item) for item in value]
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and '_type' in value:
+        return MODEL_TYPES[value['_type']](**{key: _load(item) for key, item in value.items() if key != '_type'})
+    if isinstance(value, list):
+        return [_load(item) for item in value]
+    return value
+
+
+class Variable(ModelObject):
+    __slots__ = ('namespace', 'name', 'dtsid', 'data_type', 'value', 'expression', 'evaluate_as_expression')
+    _interned = ('namespace', 'data_type')
+
+
+class Parameter(ModelObject):
+    __slots__ = ('name', 'data_type', 'value', 'required', 'sensitive', 'description')
+    _interned = ('data_type',)
+
+
+class ConnectionManager(ModelObject):
+    __slots__ = ('ref_id', 'name', 'creation_name', 'dtsid', 'connection_string', 'property_expressions')
+    _interned = ('creation_name',)
+
+
+class PrecedenceConstraint(ModelObject):
+    __slots__ = ('ref_id', 'source', 'target', 'value', 'eval_op', 'expression', 'logical_and')
+    _interned = ('value', 'eval_op')
+
+
+class PipelineComponent(ModelObject):
+    __slots__ = ('ref_id', 'name', 'component_class_id', 'contact_info', 'description', 'properties')
+    _interned = ('component_class_id', 'contact_info', 'description')
+
+
+class Executable(ModelObject):
+    """
+    A task. components is a list only for data flows that have an ObjectData element, sql_task_data and
+    sql_connection are set for Execute SQL tasks and package_name, use_project_reference and package_connection for
+    Execute Package tasks.
+
+    Methods:
+        is_data_flow: Whether the rows of this executable are its pipeline components.
+        rows: The get_df rows of this executable.
+    """
+    __slots__ = ('ref_id', 'executable_type', 'creation_name', 'object_name', 'dtsid', 'description', 'variables',
+                 'sql_task_data', 'sql_connection', 'package_name', 'use_project_reference', 'package_connection', 'components')
+    _interned = ('executable_type', 'creation_name')
+
+    @property
+    def is_data_flow(self) -> bool:
+        return self.executable_type.lower() == 'microsoft.pipeline' and self.components is not None
+
+    def rows(self) -> list:
+        """
+        The rows SSISMigrator.get_df produces for this executable alone.
+        """
+        base = {'RefId': self.ref_id or '', 'ExecutableType': self.executable_type, 'ObjectName': self.object_name or ''}
+        if self.is_data_flow:
+            return [dict(base, componentClassID=component.component_class_id or '', contactInfo=component.contact_info or '',
+                         description=component.description or '', name=component.name or '', SqlTaskData='')
+                    for component in self.components]
+        return [dict(base, componentClassID='', contactInfo='', description='', name='', SqlTaskData=self.sql_task_data)]
+
+    def walk(self):
+        yield self
+
+
+class Container(Executable):
+    """
+    An executable holding other executables (sequence, loops) and the precedence constraints between them.
+
+    Methods:
+        walk: Yields this executable and every executable below it, in document order.
+    """
+    __slots__ = ('executables', 'precedence_constraints')
+
+    def walk(self):
+        yield self
+        for executable in self.executables or ():
+            yield from executable.walk()
+
+
+class Package(Container):
+    """
+    A parsed .dtsx package: the root container plus its connection managers and package parameters.
+
+    Methods:
+        rows: The get_df rows of the whole package.
+        find: Returns the executable with a given refId.
+        precedence: Every precedence constraint of the package.
+    """
+    __slots__ = ('file_path', 'connection_managers', 'parameters')
+
+    def rows(self) -> list:
+        return [row for executable in self.walk() for row in Executable.rows(executable)]
+
+    def find(self, ref_id:str):
+        return next((executable for executable in self.walk() if executable.ref_id == ref_id), None)
+
+    def precedence(self) -> list:
+        return [constraint for executable in self.walk() if isinstance(executable, Container)
+                for constraint in executable.precedence_constraints or ()]
+
+
+def _variables(element) -> list:
+    variables = []
+    for variable in element.iterfind(f'{VARIABLES}/{VARIABLE}'):
+        value = variable.find(VARIABLE_VALUE)
+        variables.append(Variable(
+            namespace=variable.get(DTS + 'Namespace'), name=variable.get(OBJECT_NAME), dtsid=variable.get(DTSID),
+            data_type=value.get(DTS + 'DataType') if value is not None else None, value=value.text if value is not None else None,
+            expression=variable.get(DTS + 'Expression'), evaluate_as_expression=_bool(variable.get(DTS + 'EvaluateAsExpression'))))
+    return variables
+
+
+def _precedence_constraint(element) -> PrecedenceConstraint:
+    attrib = element.attrib
+    return PrecedenceConstraint(
+        ref_id=attrib.get(REF_ID), source=attrib.get(DTS + 'From'), target=attrib.get(DTS + 'To'),
+        value=PRECEDENCE_VALUES.get(attrib.get(DTS + 'Value', '0'), attrib.get(DTS + 'Value')),
+        eval_op=PRECEDENCE_EVAL_OPS.get(attrib.get(DTS + 'EvalOp', '2'), attrib.get(DTS + 'EvalOp')),
+        expression=attrib.get(DTS + 'Expression'), logical_and=attrib.get(DTS + 'LogicalAnd', 'True').lower() != 'false')
+
+
+def _component(element) -> PipelineComponent:
+    return PipelineComponent(
+        ref_id=element.get('refId'), name=element.get('name'), component_class_id=element.get('componentClassID'),
+        contact_info=element.get('contactInfo'), description=element.get('description'),
+        properties={prop.get('name'): prop.text for prop in element.iterfind('properties/property') if prop.get('name') is not None})
+
+
+def _executable(element, cls=None, **extra) -> Executable:
+    attrib = element.attrib
+    children = [child for child in element.iterfind(f'{EXECUTABLES}/{EXECUTABLE}') if ".EventHandlers" not in child.get(REF_ID, '')]
+    constraints = element.findall(f'{PRECEDENCE_CONSTRAINTS}/{PRECEDENCE_CONSTRAINT}')
+    if cls is None:
+        cls = Container if children or constraints or element.find(EXECUTABLES) is not None else Executable
+    fields = dict(ref_id=attrib.get(REF_ID), executable_type=attrib.get(EXECUTABLE_TYPE), creation_name=attrib.get(CREATION_NAME),
+                  object_name=attrib.get(OBJECT_NAME), dtsid=attrib.get(DTSID), description=attrib.get(DESCRIPTION),
+                  variables=_variables(element) or None, **extra)
+
+    object_data = element.find(OBJECT_DATA)
+    if object_data is not None:
+        sql_task = object_data.find(SQL_TASK_DATA)
+        if sql_task is not None:
+            fields.update(sql_task_data=sql_task.get(SQL_STATEMENT_SOURCE), sql_connection=sql_task.get(SQL_CONNECTION))
+        if fields['executable_type'] and fields['executable_type'].lower() == 'microsoft.pipeline':
+            fields['components'] = [_component(component) for component in object_data.iterfind('pipeline/components/component')]
+        elif fields['executable_type'] == 'Microsoft.ExecutePackageTask':
+            task = _local_child(object_data, 'ExecutePackageTask')
+            if task is not None:
+                fields.update(package_name=task.findtext('PackageName'), use_project_reference=_bool(task.findtext('UseProjectReference')),
+                              package_connection=task.findtext('Connection'))
+
+    if issubclass(cls, Container):
+        fields.update(executables=[_executable(child) for child in children], precedence_constraints=[_precedence_constraint(c) for c in constraints])
+    return cls(**fields)
+
+
+def _connection_manager(manager, ref_id:str=None) -> ConnectionManager:
+    inner = manager.find(f'{OBJECT_DATA}/{CONNECTION_MANAGER}')
+    return ConnectionManager(
+        ref_id=ref_id or manager.get(REF_ID), name=manager.get(OBJECT_NAME), creation_name=manager.get(CREATION_NAME), dtsid=manager.get(DTSID),
+        connection_string=inner.get(DTS + 'ConnectionString') if inner is not None else None,
+        property_expressions={expression.get(NAME): expression.text for expression in manager.iterfind(PROPERTY_EXPRESSION)
+                              if expression.get(NAME) is not None})
+
+
+def _connection_managers(root) -> list:
+    return [_connection_manager(manager) for manager in root.iterfind(f'{CONNECTION_MANAGERS}/{CONNECTION_MANAGER}')]
+
+
+def _package_parameters(root) -> list:
+    parameters = []
+    for parameter in root.iterfind(f'{PACKAGE_PARAMETERS}/{PACKAGE_PARAMETER}'):
+        value = next((prop.text for prop in parameter.iterfind(PROPERTY) if prop.get(NAME) == 'ParameterValue'), None)
+        parameters.append(Parameter(
+            name=parameter.get(OBJECT_NAME), data_type=parameter.get(DTS + 'DataType'), value=value,
+            required=_bool(parameter.get(DTS + 'Required')), sensitive=_bool(parameter.get(DTS + 'Sensitive')),
+            description=parameter.get(DESCRIPTION)))
+    return parameters
+
+
+def build_package(root, file_path:str=None) -> Package:
+    """
+    Builds the Package model from the root element of a parsed .dtsx tree.
+    """
+    return _executable(root, Package, file_path=file_path, connection_managers=_connection_managers(root),
+                       parameters=_package_parameters(root))
+
+
+def load_package(file_path:str) -> Package:
+    """
+    Returns the Package model of a .dtsx file, built once per cached document.
+    """
+    return get_document(file_path).derived('model', lambda doc: build_package(doc.tree.getroot(), file_path))
+
+
+def load_project_parameters(file_path:str) -> list:
+    """
+    Returns the parameters declared in a project .params file.
+    """
+    parameters = []
+    for parameter in get_document(file_path).tree.getroot().iterfind(f'{SSIS}Parameter'):
+        properties = {prop.get(f'{SSIS}Name'): prop.text for prop in parameter.iterfind(f'{SSIS}Properties/{SSIS}Property')}
+        parameters.append(Parameter(
+            name=parameter.get(f'{SSIS}Name'), data_type=properties.get('DataType'), value=properties.get('Value'),
+            required=_bool(properties.get('Required')), sensitive=_bool(properties.get('Sensitive')),
+            description=properties.get('Description')))
+    return parameters
+
+
+def load_project_connection_manager(file_path:str) -> ConnectionManager:
+    """
+    Returns the connection manager of a project .conmgr file, whose root element is the DTS:ConnectionManager itself.
+    Packages refer to it as Project.ConnectionManagers[<name>], which is used as its ref_id.
+    """
+    root = get_document(file_path).tree.getroot()
+    return _connection_manager(root, ref_id=f"Project.ConnectionManagers[{root.get(OBJECT_NAME)}]")
+
+
+def dump(obj, file_path:str) -> None:
+    """
+    Writes a model object (or a list of them) to file_path, as msgpack when the extension is .msgpack and as compact
+    JSON otherwise. load(file_path) returns an equal object: property dicts only hold named properties, since a JSON
+    key cannot be None.
+    """
+    data = _dump(obj)
+    if os.path.splitext(file_path)[1] == '.msgpack':
+        import msgpack
+        with open(file_path, 'wb') as f:
+            f.write(msgpack.packb(data, use_bin_type=True))
+    else:
+        with open(file_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+
+def load(file_path:str):
+    """
+    Reads a model object written by dump.
+    """
+    if os.path.splitext(file_path)[1] == '.msgpack':
+        import msgpack
+        with open(file_path, 'rb') as f:
+            return _load(msgpack.unpackb(f.read(), raw=False))
+    with open(file_path, 'r') as f:
+        return _load(json.load(f))
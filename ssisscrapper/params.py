@@ -0,0 +1,247 @@
+import os
+import re
+import pandas as pd
+from cache import get_document
+from model import load_package, load_project_connection_manager, load_project_parameters
+
+PARAMETER_REFERENCE_REGEX = re.compile(r'^@\[\$(Project|Package)::([^\]]+)\]$')
+# how a package refers to a project connection manager: components by refId, tasks by DTSID
+PROJECT_CONNECTION_REGEX = re.compile(r'Project\.ConnectionManagers\[([^\]]+)\]')
+STRING_LITERAL_REGEX = re.compile(r'^"((?:[^"\\]|\\.)*)"$', re.DOTALL)
+
+# connection string keywords that mean the same thing, and the connection manager properties an expression can set
+CONNECTION_KEYWORDS = {'server': 'Data Source', 'address': 'Data Source', 'addr': 'Data Source', 'network address': 'Data Source',
+                       'data source': 'Data Source', 'database': 'Initial Catalog', 'initial catalog': 'Initial Catalog'}
+EXPRESSION_PROPERTIES = {'ServerName': 'Data Source', 'InitialCatalog': 'Initial Catalog'}
+
+SOURCES_AND_CATALOGS_COLUMNS = ['File_path', 'project', 'connection_manager', 'parameter', 'property', 'value']
+
+
+def project_name(params_path:str) -> str:
+    """
+    Name of the project a .params file belongs to: its folder for Project.params in the source tree, the file name
+    prefix for the <project>_Project.params files staged by main.py.
+    """
+    name = os.path.splitext(os.path.basename(params_path))[0]
+    if name == 'Project':
+        return os.path.basename(os.path.dirname(params_path))
+    return name.removesuffix('_Project')
+
+
+def _longest_prefix(name:str, projects) -> str:
+    matches = [project for project in projects if name.startswith(project + '_')]
+    return max(matches, key=len) if matches else None
+
+
+def parse_connection_string(connection_string:str) -> list:
+    """
+    Splits a connection string into (keyword, value) pairs, with the server and database keywords normalized to
+    Data Source and Initial Catalog.
+    """
+    pairs = []
+    for part in (connection_string or '').split(';'):
+        keyword, separator, value = part.partition('=')
+        if separator and keyword.strip():
+            pairs.append((CONNECTION_KEYWORDS.get(keyword.strip().lower(), keyword.strip()), value.strip()))
+    return pairs
+
+
+def _split_concatenation(expression:str) -> list:
+    terms, current, quoted, escaped = [], [], False, False
+    for char in expression:
+        if quoted:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                quoted = False
+        elif char == '"':
+            quoted = True
+        elif char == '+':
+            terms.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    terms.append(''.join(current).strip())
+    return terms
+
+
+def _parameter_name(expression:str) -> str:
+    """
+    The parameter an expression reads, when it reads exactly one.
+    """
+    names = re.findall(r'@\[\$(?:Project|Package)::([^\]]+)\]', expression or '')
+    return names[0] if len(names) == 1 else None
+
+
+class ParameterResolver:
+    """
+    Index of project parameters by project and parameter name, used to resolve the @[$Project::...] and
+    @[$Package::...] expressions of package connection managers and of the project connection managers (.conmgr
+    files) that packages refer to as Project.ConnectionManagers[<name>].
+
+    Every .params and .conmgr file is parsed once, on first use of its project, and every distinct expression is
+    resolved once per project.
+
+    Methods:
+        parameters: The {parameter: value} lookup of a project.
+        project_connection_managers: The connection managers shared by the packages of a project.
+        project_of: The project a package belongs to.
+        resolve_expression: The value of an expression made of parameter references and string literals.
+        connection_rows: The resolved connection properties of a package, one row per property.
+        parameter_rows: The connection properties of the project parameters no connection manager used.
+        sources_and_catalogs: The long-format connection properties of a list of packages.
+    """
+    def __init__(self, params_files:list, connection_manager_files:list=()):
+        """
+        Initializes the resolver with the .params files and the .conmgr files of every project.
+        """
+        self.params_files = {project_name(file_path): file_path for file_path in params_files}
+        self.connection_manager_files = {}
+        for file_path in connection_manager_files:
+            self.connection_manager_files.setdefault(self._project_of_file(file_path), []).append(file_path)
+        self._parameters = {}
+        self._project_managers = {}
+        self._expressions = {}
+
+    def _project_of_file(self, file_path:str) -> str:
+        # the folder in the source tree, the longest project prefix for the <project>_<name> files staged by main.py
+        folder = os.path.basename(os.path.dirname(file_path))
+        if folder in self.params_files:
+            return folder
+        return _longest_prefix(os.path.basename(file_path), self.params_files) or folder
+
+    def parameters(self, project:str) -> dict:
+        """
+        Returns the {parameter: value} lookup of a project, empty for a project without a .params file.
+        """
+        if project not in self._parameters:
+            file_path = self.params_files.get(project)
+            self._parameters[project] = {parameter.name: parameter.value for parameter in load_project_parameters(file_path)} if file_path else {}
+        return self._parameters[project]
+
+    def project_connection_managers(self, project:str) -> list:
+        """
+        Returns the ConnectionManagers of the .conmgr files of a project, empty for a project without any.
+        """
+        if project not in self._project_managers:
+            self._project_managers[project] = [load_project_connection_manager(file_path)
+                                               for file_path in sorted(self.connection_manager_files.get(project, ()))]
+        return self._project_managers[project]
+
+    def project_of(self, package_path:str) -> str:
+        """
+        Returns the project of a package: its folder in the source tree, or for the files staged by main.py the
+        longest project name its file name starts with.
+        """
+        return self._project_of_file(package_path)
+
+    def resolve_expression(self, expression:str, project:str, package_parameters:dict=None) -> str:
+        """
+        Returns the value of an expression made of parameter references and string literals joined with +, or None
+        when it uses anything else (variables, functions) or an unknown parameter. Package parameters are not
+        memoized since they differ between packages of the same project.
+        """
+        key = (project, expression)
+        if package_parameters is None and key in self._expressions:
+            return self._expressions[key]
+
+        values = []
+        for term in _split_concatenation(expression or ''):
+            reference = PARAMETER_REFERENCE_REGEX.match(term)
+            literal = STRING_LITERAL_REGEX.match(term)
+            if reference:
+                scope, name = reference.groups()
+                lookup = self.parameters(project) if scope == 'Project' else (package_parameters or {})
+                value = lookup.get(name)
+            elif literal:
+                value = re.sub(r'\\(.)', r'\1', literal.group(1))
+            else:
+                value = None
+            if value is None:
+                values = None
+                break
+            values.append(value)
+        value = ''.join(values) if values is not None else None
+
+        if package_parameters is None:
+            self._expressions[key] = value
+        return value
+
+    def _manager_rows(self, manager, project:str, name:str, package_parameters:dict) -> list:
+        properties, parameters = {}, {}
+        expressions = manager.property_expressions or {}
+        connection_string = manager.connection_string
+        parameter = None
+        if 'ConnectionString' in expressions:
+            resolved = self.resolve_expression(expressions['ConnectionString'], project, package_parameters or None)
+            if resolved is not None:
+                connection_string, parameter = resolved, _parameter_name(expressions['ConnectionString'])
+        for keyword, value in parse_connection_string(connection_string):
+            properties[keyword] = value
+            parameters[keyword] = parameter
+        for property_name, expression in expressions.items():
+            if property_name == 'ConnectionString':
+                continue
+            resolved = self.resolve_expression(expression, project, package_parameters or None)
+            if resolved is not None:
+                keyword = EXPRESSION_PROPERTIES.get(property_name, property_name)
+                properties[keyword] = resolved
+                parameters[keyword] = _parameter_name(expression)
+        return [{'File_path': name, 'project': project, 'connection_manager': manager.name,
+                 'parameter': parameters[keyword], 'property': keyword, 'value': value}
+                for keyword, value in properties.items()]
+
+    def connection_rows(self, package_path:str, name:str=None) -> list:
+        """
+        Returns one row per connection property of every connection manager of a package, after applying its
+        property expressions: its own connection managers, then the project connection managers it refers to by
+        refId or DTSID. parameter names the project or package parameter the value came from, if any.
+        """
+        package = load_package(package_path)
+        project = self.project_of(package_path)
+        name = name or os.path.splitext(os.path.basename(package_path))[0]
+        package_parameters = {parameter.name: parameter.value for parameter in package.parameters or ()}
+        rows = []
+        for manager in package.connection_managers or ():
+            rows.extend(self._manager_rows(manager, project, name, package_parameters))
+
+        project_managers = self.project_connection_managers(project)
+        if project_managers:
+            text = get_document(package_path).text
+            referenced = set(PROJECT_CONNECTION_REGEX.findall(text))
+            for manager in project_managers:
+                if manager.name in referenced or (manager.dtsid and manager.dtsid in text):
+                    rows.extend(self._manager_rows(manager, project, name, package_parameters))
+        return rows
+
+    def parameter_rows(self, used:set=frozenset()) -> list:
+        """
+        Returns the connection properties of every project parameter holding a connection string that is not in
+        used, a set of (project, parameter) pairs, so parameters no connection manager reads are still listed. The
+        rows are named after the .params file and have no connection manager.
+        """
+        rows = []
+        for project, file_path in sorted(self.params_files.items()):
+            for parameter, value in self.parameters(project).items():
+                if (project, parameter) in used:
+                    continue
+                rows.extend({'File_path': os.path.basename(file_path), 'project': project, 'connection_manager': None,
+                             'parameter': parameter, 'property': keyword, 'value': keyword_value}
+                            for keyword, keyword_value in parse_connection_string(value))
+        return rows
+
+    def sources_and_catalogs(self, package_paths:list, add_prefix:bool=False) -> pd.DataFrame:
+        """
+        Returns the connection properties of every package in long format: File_path, project, connection_manager,
+        parameter, property and value, followed by the parameter_rows of the project parameters none of them used.
+        With add_prefix packages are named after their parent folder and file, as extract_values names them.
+        """
+        rows = []
+        for package_path in package_paths:
+            name = '_'.join(package_path.split('\\')[-2:]) if add_prefix else os.path.basename(package_path)
+            rows.extend(self.connection_rows(package_path, os.path.splitext(name)[0]))
+        rows.extend(self.parameter_rows({(row['project'], row['parameter']) for row in rows}))
+        return pd.DataFrame(rows, columns=SOURCES_AND_CATALOGS_COLUMNS)
+
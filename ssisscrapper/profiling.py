@@ -0,0 +1,262 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# the running Profiler, None when profiling is off; every hook checks only this
+_active = None
+_DISABLED = contextlib.nullcontext()
+
+METRICS = ('wall', 'cpu', 'read_bytes', 'written_bytes', 'rss_delta')
+
+
+def _io_counters() -> tuple:
+    """
+    Bytes read and written by the process so far: /proc/self/io on Linux, psutil where it is installed, else zeros.
+    """
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            counters = dict(line.split(b':') for line in f.read().splitlines())
+        return int(counters[b'rchar']), int(counters[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        counters = psutil.Process().io_counters()
+        return counters.read_bytes, counters.write_bytes
+    except (ImportError, AttributeError, OSError):
+        return 0, 0
+
+
+def peak_rss() -> int:
+    """
+    Peak resident set size of the process so far, in bytes, or None when the platform does not report it.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+    except ImportError:
+        return None
+
+
+def current_rss() -> int:
+    """
+    Resident set size of the process now, in bytes: /proc/self/statm on Linux, psutil where it is installed, else 0.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return 0
+
+
+def _snapshot() -> tuple:
+    return (time.perf_counter(), time.process_time()) + _io_counters() + (current_rss(),)
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the pipeline: wall time, CPU time, bytes read and written and RSS growth per stage and
+    per file, plus the peak RSS of the run, reported as JSON, with an optional cProfile dump of the whole run.
+
+    Stages are the instrumented functions (discovery, staging, parse, get_df, write_json, read_all_files, extractors,
+    analyzer stages...). Times are inclusive, so a stage that calls another one also counts its time. CPU and IO are
+    process-wide counters, exact when stages do not overlap and approximate under threads. rss_delta is the change in
+    resident memory across the stage, so it shows what a stage kept alive, not what it briefly allocated.
+
+    Methods:
+        start / stop: Makes this profiler the active one / stops it. Also usable as a context manager.
+        measure: Context manager recording one call of a stage, optionally for one file.
+        records / merge: Export the measurements / add the ones of another process.
+        report: The JSON report, stages and files sorted slowest first.
+        save: Writes the report, and the cProfile stats when requested.
+    """
+    def __init__(self, cprofile_path:str=None, slowest:int=20):
+        self.cprofile_path = cprofile_path
+        self.slowest = slowest
+        self.stages = {}
+        self.files = {}
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self._started = None
+
+    def start(self) -> 'Profiler':
+        global _active
+        _active = self
+        self._started = _snapshot()
+        if self.cprofile_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def stop(self) -> None:
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if _active is self:
+            _active = None
+        self._record('total', None, self._started, _snapshot())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextlib.contextmanager
+    def measure(self, stage:str, file_path:str=None, calls:int=1):
+        before = _snapshot()
+        try:
+            yield
+        finally:
+            self._record(stage, file_path, before, _snapshot(), calls)
+
+    def _record(self, stage:str, file_path, before:tuple, after:tuple, calls:int=1) -> None:
+        deltas = [end - start for start, end in zip(before, after)]
+        with self._lock:
+            targets = [self.stages.setdefault(stage, dict.fromkeys(('calls',) + METRICS, 0))]
+            if file_path is not None:
+                targets.append(self.files.setdefault((stage, str(file_path)), dict.fromkeys(('calls',) + METRICS, 0)))
+            for entry in targets:
+                entry['calls'] += calls
+                for metric, delta in zip(METRICS, deltas):
+                    entry[metric] += delta
+
+    def records(self) -> dict:
+        """
+        The raw measurements, picklable, for merging into the profiler of another process.
+        """
+        return {'stages': self.stages, 'files': self.files}
+
+    def merge(self, records:dict) -> None:
+        """
+        Adds the measurements of another profiler, e.g. one that ran in a worker process, except its total.
+        """
+        with self._lock:
+            for key, source in [('stages', records['stages']), ('files', records['files'])]:
+                target = getattr(self, key)
+                for name, values in source.items():
+                    if name == 'total':
+                        continue
+                    entry = target.setdefault(name, dict.fromkeys(('calls',) + METRICS, 0))
+                    for metric in ('calls',) + METRICS:
+                        entry[metric] += values.get(metric, 0)
+
+    def report(self) -> dict:
+        """
+        Returns the report: peak RSS, every stage with the slowest files of each one, then the slowest packages with
+        their most expensive stage, each sorted by wall time.
+        """
+        def rounded(values):
+            return {metric: round(value, 6) if isinstance(value, float) else value for metric, value in values.items()}
+
+        # stages nest (parse_package holds parse, write_json...), so a package is ranked by its outermost one
+        packages = {}
+        for (stage, file_path), values in self.files.items():
+            if file_path not in packages or values['wall'] > packages[file_path]['wall']:
+                packages[file_path] = dict(stage=stage, **values)
+
+        stages = []
+        for stage, values in sorted(self.stages.items(), key=lambda item: -item[1]['wall']):
+            files = sorted(((file_path, file_values) for (name, file_path), file_values in self.files.items() if name == stage),
+                           key=lambda item: -item[1]['wall'])
+            stages.append(dict(stage=stage, **rounded(values),
+                               slowest_files=[dict(file_path=file_path, **rounded(file_values)) for file_path, file_values in files[:self.slowest]]))
+
+        return {
+            'peak_rss': peak_rss(),
+            'stages': stages,
+            'slowest_packages': [dict(file_path=file_path, **rounded(values)) for file_path, values
+                                 in sorted(packages.items(), key=lambda item: -item[1]['wall'])[:self.slowest]],
+        }
+
+    def save(self, report_path:str) -> None:
+        """
+        Writes the JSON report to report_path, and the cProfile stats to cprofile_path when it was set (read them with
+        pstats.Stats(path).sort_stats('cumulative').print_stats(30)).
+        """
+        with open(report_path, 'w') as f:
+            f.write(json.dumps(self.report(), indent=4))
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.cprofile_path)
+
+
+def active() -> Profiler:
+    return _active
+
+
+def measure(stage:str, file_path:str=None):
+    """
+    Context manager recording a block as one call of stage in the active profiler; a shared no-op when profiling is
+    off.
+    """
+    if _active is None:
+        return _DISABLED
+    return _active.measure(stage, file_path)
+
+
+def profiled(stage:str, file_arg:str=None):
+    """
+    Decorator recording every call of a function as one call of stage, per file when file_arg names the argument
+    holding the file path. Generators are measured only while they produce items, not while their consumer works.
+    With profiling off the wrapper adds a single global lookup per call.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def file_of(args, kwargs):
+            if file_arg is None:
+                return None
+            try:
+                return signature.bind_partial(*args, **kwargs).arguments.get(file_arg)
+            except TypeError:
+                return None
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                profiler = _active
+                if profiler is None:
+                    yield from func(*args, **kwargs)
+                    return
+                file_path = file_of(args, kwargs)
+                iterator = func(*args, **kwargs)
+                calls = 1
+                while True:
+                    with profiler.measure(stage, file_path, calls):
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                    calls = 0
+                    yield item
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.measure(stage, file_of(args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,156 @@
+import mmap
+import os
+import re
+from collections import namedtuple
+from html import unescape
+from archive import open_path, split_archive_path
+from cache import package_cache
+from staging import resolve
+
+# kind is 'project' for <UseProjectReference>True</UseProjectReference> tasks and 'connection' for tasks that reach
+# their child through a connection manager: a FILE connection to a .dtsx on disk, or an OLEDB one to msdb
+PackageReference = namedtuple('PackageReference', ['task', 'kind', 'package_name', 'connection', 'connection_type', 'connection_string'])
+
+# task blocks are located with bytes.find, about twice as fast as a regex over the whole file
+TASK_START = b'<ExecutePackageTask>'
+TASK_END = b'</ExecutePackageTask>'
+FIELD_REGEX = re.compile(rb'<(UseProjectReference|PackageName|Connection)>([^<]*)</\1>')
+# SSIS 2012+ writes the attributes of an executable on the lines after its tag name
+EXECUTABLE_TAG = b'<DTS:Executable'
+EXECUTABLE_REGEX = re.compile(rb'<DTS:Executable\s')
+CONNECTION_MANAGER_REGEX = re.compile(rb'<DTS:ConnectionManager\b([^>]*)>')
+ATTRIBUTE_REGEX = re.compile(rb'DTS:(\w+)="([^"]*)"')
+
+
+def _encoding(head:bytes) -> str:
+    """
+    The encoding of a file from its first bytes: utf-16 when it starts with a UTF-16 BOM or a NUL-padded '<', else
+    utf-8 (a UTF-8 BOM never gets in the way of the byte patterns).
+    """
+    if head.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return 'utf-16'
+    if head.startswith(b'<\x00'):
+        return 'utf-16-le'
+    if head.startswith(b'\x00<'):
+        return 'utf-16-be'
+    return 'utf-8'
+
+
+def _text(value:bytes) -> str:
+    return unescape(value.decode('utf-8', errors='replace')).strip()
+
+
+def _attributes(tag:bytes) -> dict:
+    return {name.decode('ascii'): value for name, value in ATTRIBUTE_REGEX.findall(tag)}
+
+
+def _connection_managers(data) -> dict:
+    """
+    Maps the DTSID, refId and name of every connection manager to its (name, CreationName, ConnectionString). The
+    connection string sits on the inner <DTS:ConnectionManager> tag of the ObjectData of the outer one.
+    """
+    managers = {}
+    current = None
+    for match in CONNECTION_MANAGER_REGEX.finditer(data):
+        attributes = _attributes(match.group(1))
+        if 'ConnectionString' in attributes and current is not None:
+            current[2] = _text(attributes['ConnectionString'])
+            continue
+        current = [_text(attributes.get('ObjectName', b'')), _text(attributes.get('CreationName', b'')), None]
+        for key in ('DTSID', 'refId', 'ObjectName'):
+            if key in attributes:
+                managers[_text(attributes[key])] = current
+    return managers
+
+
+def _task_name(data, start:int) -> str:
+    """
+    Name of the DTS:Executable an <ExecutePackageTask> block belongs to, read from the last executable tag before it.
+    """
+    position = data.rfind(EXECUTABLE_TAG, 0, start)
+    # skip <DTS:Executables> and any other tag sharing the prefix
+    while position >= 0 and not EXECUTABLE_REGEX.match(data, position):
+        position = data.rfind(EXECUTABLE_TAG, 0, position)
+    if position < 0:
+        return None
+    end = data.find(b'>', position)
+    name = _attributes(data[position:end]).get('ObjectName')
+    return _text(name) if name is not None else None
+
+
+def _package_name(path:str) -> str:
+    return re.split(r'[\\/]', path.rstrip('\\/'))[-1] or None
+
+
+def _task_blocks(data):
+    start = data.find(TASK_START)
+    while start >= 0:
+        end = data.find(TASK_END, start)
+        if end < 0:
+            return
+        yield start, data[start + len(TASK_START):end]
+        start = data.find(TASK_START, end)
+
+
+def scan_bytes(data) -> list:
+    """
+    Returns the PackageReference of every ExecutePackageTask in the bytes (or mmap) of a package. Only the task
+    blocks, their executable tags and, for connection based tasks, the connection manager tags are decoded.
+    """
+    encoding = _encoding(data[:4])
+    if encoding != 'utf-8':
+        data = bytes(data).decode(encoding, errors='replace').encode('utf-8')
+
+    references = []
+    managers = None
+    for start, block in _task_blocks(data):
+        fields = {name.decode('ascii'): _text(value) for name, value in FIELD_REGEX.findall(block)}
+        task = _task_name(data, start)
+        if fields.get('UseProjectReference', '').lower() == 'true':
+            references.append(PackageReference(task, 'project', fields.get('PackageName') or None, None, None, None))
+            continue
+
+        name, creation_name, connection_string = None, None, None
+        if fields.get('Connection'):
+            if managers is None:
+                managers = _connection_managers(data)
+            name, creation_name, connection_string = managers.get(fields['Connection'], (None, None, None))
+        # a FILE connection points at the child .dtsx, an msdb one carries the child path in PackageName
+        if creation_name == 'FILE' and connection_string:
+            package_name = _package_name(connection_string)
+        else:
+            package_name = _package_name(fields['PackageName']) if fields.get('PackageName') else None
+        references.append(PackageReference(task, 'connection', package_name, name or fields.get('Connection') or None, creation_name, connection_string))
+    return references
+
+
+def scan_references(file_path:str) -> list:
+    """
+    Returns the PackageReference of every ExecutePackageTask of a .dtsx file. A package already in the package
+    cache is scanned from memory, a file on disk through a read-only memory map and an archive member from its bytes.
+    """
+    path = resolve(file_path)
+    document = package_cache.peek(path) if len(package_cache) else None
+    if document is not None:
+        return scan_bytes(document.data)
+
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        if split_archive_path(path) is None:
+            raise
+        with open_path(path) as member:
+            return scan_bytes(member.read())
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_bytes(data)
+
+
+def child_packages(file_path:str) -> list:
+    """
+    Returns the names of the packages a .dtsx file executes, in document order, skipping tasks whose child could not
+    be told.
+    """
+    return [reference.package_name for reference in scan_references(file_path) if reference.package_name]
@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+from cache import get_document
+
+
+def normalize_procedure_name(name) -> str:
+    """
+    Normalizes a stored procedure name for matching: surrounding whitespace, brackets and quotes are removed, the
+    SSMS ".StoredProcedure" script suffix is dropped and the result is case-folded, e.g. "[dbo].[spLoad]" -> "dbo.spload".
+    """
+    if not isinstance(name, str):
+        return None
+    parts = [part.strip().strip('[]"').strip() for part in name.strip().split('.')]
+    if len(parts) > 1 and parts[-1].casefold() == 'storedprocedure':
+        parts = parts[:-1]
+    return '.'.join(parts).casefold() or None
+
+
+class StoredProcedureCatalog:
+    """
+    Index of stored procedure .sql files by normalized procedure name, built once over the discovered files.
+
+    Methods:
+        match: Matches a column of referenced procedure names against the catalog in one vectorized join.
+        load_bodies: Reads the SQL of the matched files, each file once and only when it is matched.
+    """
+    def __init__(self, sql_files:list):
+        """
+        Builds the name index. Every file is reachable by its schema-qualified name and by its bare procedure name;
+        when two schemas define the same bare name the first file found wins the bare lookup.
+        """
+        qualified = {}
+        bare = {}
+        for file_path in sql_files:
+            key = normalize_procedure_name(os.path.splitext(os.path.basename(file_path))[0])
+            if key is None:
+                continue
+            qualified.setdefault(key, file_path)
+            bare.setdefault(key.rsplit('.', 1)[-1], file_path)
+        self.index = pd.concat([
+            pd.DataFrame({'_key': list(qualified), 'sp_file': list(qualified.values())}),
+            pd.DataFrame({'_key': list(bare), 'sp_file': list(bare.values())}),
+        ], ignore_index=True).drop_duplicates('_key')
+
+    def match(self, df:pd.DataFrame, column:str='store_procedure_name') -> pd.DataFrame:
+        """
+        Returns df with an 'sp_file' column holding the matched .sql file (or NaN) and a boolean 'Match' column.
+        Names are looked up schema-qualified first and by bare procedure name otherwise.
+        """
+        keys = df[column].map(normalize_procedure_name)
+        lookup = self.index.set_index('_key')['sp_file']
+        sp_file = keys.map(lookup)
+        sp_file = sp_file.fillna(keys.str.rsplit('.', n=1).str[-1].map(lookup))
+        return df.assign(sp_file=sp_file, Match=sp_file.notna())
+
+    def load_bodies(self, sp_files:pd.Series) -> pd.Series:
+        """
+        Returns the SQL text of each matched file (NaN where nothing matched), reading every distinct file once.
+        """
+        bodies = {file_path: get_document(file_path).text for file_path in sp_files.dropna().unique()}
+        return sp_files.map(bodies)
@@ -0,0 +1,124 @@
+import re
+from collections import namedtuple
+
+SqlReference = namedtuple('SqlReference', ['object', 'role', 'db', 'schema'])
+
+TOKEN_REGEX = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>N?'(?:[^']|'')*(?:'|\Z))
+  | (?P<name>\[(?:[^\]]|\]\])*(?:\]|\Z)|"(?:[^"]|"")*(?:"|\Z)|[A-Za-z_@#][\w@#$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+RESERVED_WORDS = frozenset("""
+    ADD ALL ALTER AND ANY APPLY AS ASC BEGIN BETWEEN BREAK BY CASE CROSS CURSOR DECLARE DEFAULT DELETE DESC DISTINCT
+    DROP ELSE END EXCEPT EXEC EXECUTE EXISTS FETCH FOR FROM FULL GO GROUP HAVING IF IN INNER INSERT INTERSECT INTO IS
+    JOIN LEFT LIKE MERGE NOT NULL ON OPTION OR ORDER OUTER OUTPUT OVER PIVOT PROCEDURE RETURN RIGHT SELECT SET TABLE
+    THEN TO TOP UNION UNPIVOT UPDATE USING VALUES WHEN WHERE WHILE WITH
+""".split())
+
+REFERENCE_ROLES = {'FROM': 'FROM', 'JOIN': 'JOIN', 'UPDATE': 'UPDATE', 'DECLARE': 'DECLARE', 'INSERT': 'INSERT INTO'}
+
+
+def tokenize_sql(sql:str) -> list:
+    """
+    Splits a SQL statement into (kind, text) tokens in one regex pass, dropping whitespace, comments and string
+    literals so that keywords inside them are never mistaken for references.
+    """
+    return [(match.lastgroup, match.group()) for match in TOKEN_REGEX.finditer(sql)
+            if match.lastgroup not in ('space', 'comment', 'string')]
+
+
+def _unquote(name:str) -> str:
+    if name[:1] == '[':
+        return name[1:-1].replace(']]', ']') if name.endswith(']') else name[1:]
+    if name[:1] == '"':
+        return name[1:-1].replace('""', '"') if name.endswith('"') else name[1:]
+    return name
+
+
+def _is_name(token) -> bool:
+    kind, text = token
+    return kind == 'name' and (text[:1] in '["' or text.upper() not in RESERVED_WORDS)
+
+
+def _read_name(tokens:list, position:int):
+    """
+    Reads a possibly multi-part object name (server.db.schema.object, db..object, [quoted] parts) at position.
+    Returns the unquoted parts and the position after the name; parts is empty when no name starts there.
+    """
+    if position >= len(tokens) or not _is_name(tokens[position]):
+        return [], position
+    parts = [_unquote(tokens[position][1])]
+    position += 1
+    while position < len(tokens) and tokens[position] == ('symbol', '.'):
+        position += 1
+        if position < len(tokens) and tokens[position][0] == 'name':
+            parts.append(_unquote(tokens[position][1]))
+            position += 1
+        else:
+            parts.append('')
+    return parts, position
+
+
+def _reference(parts:list, role:str) -> SqlReference:
+    object_name = '.'.join(parts)
+    db = parts[-3] if len(parts) >= 3 and parts[-3] else None
+    schema = parts[-2] if len(parts) >= 2 and parts[-2] else None
+    return SqlReference(object_name, role, db, schema)
+
+
+def iter_sql_references(sql:str):
+    """
+    Yields a SqlReference(object, role, db, schema) for every object read or written by a SQL statement: tables and
+    views after FROM/JOIN (including comma-separated FROM lists), INSERT [INTO] and UPDATE targets, and DECLAREd
+    variables. db and schema are None when the name does not qualify them.
+    """
+    tokens = tokenize_sql(sql)
+    position = 0
+    while position < len(tokens):
+        kind, text = tokens[position]
+        role = REFERENCE_ROLES.get(text.upper()) if kind == 'name' else None
+        position += 1
+        if role is None:
+            continue
+        if role == 'INSERT INTO' and position < len(tokens) and tokens[position][1].upper() == 'INTO':
+            position += 1
+
+        parts, position = _read_name(tokens, position)
+        while parts:
+            yield _reference(parts, role)
+            if role != 'FROM':
+                break
+            # FROM a x, b AS y: skip the alias and continue with the next item of the list
+            if position < len(tokens) and tokens[position][1].upper() == 'AS':
+                position += 1
+            if position < len(tokens) and _is_name(tokens[position]):
+                position += 1
+            if position < len(tokens) and tokens[position] == ('symbol', ','):
+                parts, position = _read_name(tokens, position + 1)
+            else:
+                parts = []
+
+
+def _extract_chunk(chunk:list) -> list:
+    """
+    Returns (row position, object, role, db, schema) tuples for a list of (row position, SQL text) pairs.
+    """
+    return [(row, *reference) for row, sql in chunk for reference in iter_sql_references(sql)]
+
+
+def extract_references(texts:list, workers:int=1, chunk_size:int=256) -> list:
+    """
+    Extracts the SQL references of a list of statements, returning (row position, object, role, db, schema) tuples.
+    With workers > 1 the statements are processed in parallel chunks of chunk_size.
+    """
+    items = list(enumerate(texts))
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [reference for chunk in chunks for reference in _extract_chunk(chunk)]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [reference for references in executor.map(_extract_chunk, chunks) for reference in references]
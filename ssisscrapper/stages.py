@@ -0,0 +1,211 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from archive import exists_path, stat_path
+from profiling import measure
+from staging import resolve
+
+
+class Stage:
+    """
+    One analysis step: a function of the results of the stages it depends on, plus the files it reads and writes.
+
+    Args:
+        name (str): unique stage name.
+        func (callable): called with the results of deps, in order; returns the stage result (usually a DataFrame)
+            and writes the outputs.
+        deps (list): names of the stages whose results func receives.
+        files (list or callable): input files read directly by func, or a callable returning them at run time.
+        outputs (list): files written by func. A stage whose outputs are missing always runs.
+        load (callable): rebuilds the result from the outputs, used when the stage is skipped but a dependent runs.
+        params (dict): settings that change the result; they are part of the fingerprint.
+    """
+    def __init__(self, name:str, func, deps:list=(), files=(), outputs:list=(), load=None, params:dict=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.files = files
+        self.outputs = list(outputs)
+        self.load = load
+        self.params = params or {}
+
+    def input_files(self) -> list:
+        return list(self.files() if callable(self.files) else self.files)
+
+    def code_version(self) -> str:
+        try:
+            return inspect.getsource(self.func)
+        except (OSError, TypeError):
+            return getattr(self.func, '__qualname__', repr(self.func))
+
+
+class StageRunner:
+    """
+    Runs declared stages in dependency order, skipping the ones whose fingerprint has not changed since the last run.
+
+    A stage fingerprint hashes its code, params, the size and mtime of its input files and the fingerprints of the
+    stages it depends on, so a change anywhere upstream invalidates everything below it and nothing else. Results
+    are kept in memory and handed to dependent stages; a skipped stage is only loaded from its outputs when a
+    dependent actually runs. Independent stages run concurrently in a thread pool.
+
+    Methods:
+        add: Declares a stage.
+        stage: Decorator form of add.
+        provide: Hands the runner the result of a stage computed elsewhere.
+        run: Runs the requested stages and everything they depend on.
+        result: Returns the in-memory result of a stage, loading it from its outputs if needed.
+    """
+    def __init__(self, state_path:str, workers:int=1):
+        """
+        Initializes the runner; fingerprints of previous runs are read from and saved to state_path.
+        """
+        self.state_path = state_path
+        self.workers = workers
+        self.stages = {}
+        self.results = {}
+        self.provided = set()
+        self.state = {}
+        self._lock = threading.Lock()
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                self.state = json.load(f)
+
+    def add(self, name:str, func, deps:list=(), files=(), outputs:list=(), load=None, params:dict=None) -> Stage:
+        """
+        Declares a stage, see Stage for the arguments.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already declared")
+        self.stages[name] = Stage(name, func, deps, files, outputs, load, params)
+        return self.stages[name]
+
+    def stage(self, name:str=None, **options):
+        """
+        Decorator form of add: @runner.stage('all_joined', outputs=[...]).
+        """
+        def decorator(func):
+            self.add(name or func.__name__, func, **options)
+            return func
+        return decorator
+
+    def provide(self, name:str, result) -> None:
+        """
+        Hands the runner a stage result computed elsewhere (e.g. frames parsed in the same process). The stage is not
+        executed but counts as ran, so every stage depending on it runs. Once its outputs exist it is recorded as up to
+        date, so a later run loads them instead of executing the stage.
+        """
+        if name not in self.stages:
+            raise KeyError(f"Unknown stage {name}")
+        self.results[name] = result
+        self.provided.add(name)
+
+    def _order(self, targets:list) -> list:
+        """
+        Returns the requested stages and everything they depend on, dependencies first.
+        """
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage {name} depends on itself")
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in targets:
+            visit(name)
+        return order
+
+    def _fingerprint(self, stage:Stage, fingerprints:dict) -> str:
+        digest = hashlib.sha256()
+        digest.update(stage.code_version().encode())
+        digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+        # files staged in virtual mode are fingerprinted through the source behind them
+        for file_path in sorted(stage.input_files()):
+            size, mtime_ns = stat_path(resolve(file_path))
+            digest.update(f'{file_path}\0{size}\0{mtime_ns}\n'.encode())
+        for dep in stage.deps:
+            digest.update(f'{dep}\0{fingerprints[dep]}\n'.encode())
+        return digest.hexdigest()
+
+    def _up_to_date(self, stage:Stage, fingerprint:str) -> bool:
+        recorded = self.state.get(stage.name)
+        return recorded is not None and recorded['fingerprint'] == fingerprint and self._outputs_exist(stage)
+
+    @staticmethod
+    def _outputs_exist(stage:Stage) -> bool:
+        return all(exists_path(resolve(output)) for output in stage.outputs)
+
+    def result(self, name:str):
+        """
+        Returns the in-memory result of a stage, loading it from its outputs when the stage was skipped.
+        """
+        with self._lock:
+            if name not in self.results:
+                stage = self.stages[name]
+                if stage.load is None:
+                    raise ValueError(f"Stage {name} was skipped and declares no load function")
+                self.results[name] = stage.load()
+            return self.results[name]
+
+    def _execute(self, stage:Stage):
+        inputs = [self.result(dep) for dep in stage.deps]
+        with measure(stage.name):
+            return stage.func(*inputs)
+
+    def run(self, targets:list=None, force:bool=False) -> dict:
+        """
+        Runs the requested stages (all by default) and the stages they depend on. Returns {stage: 'ran' or 'skipped'}.
+        With force every requested stage runs regardless of its fingerprint.
+        """
+        order = self._order(targets or list(self.stages))
+        fingerprints = {}
+        for name in order:
+            fingerprints[name] = self._fingerprint(self.stages[name], fingerprints)
+
+        # a stage runs when its fingerprint moved or an upstream stage runs
+        status = {}
+        for name in order:
+            stage = self.stages[name]
+            stale = force or name in self.provided or not self._up_to_date(stage, fingerprints[name]) or any(status[dep] == 'ran' for dep in stage.deps)
+            status[name] = 'ran' if stale else 'skipped'
+
+        pending = [name for name in order if status[name] == 'ran' and name not in self.provided]
+        finished = {name for name in order if status[name] == 'skipped' or name in self.provided}
+        for name in [name for name in order if name in self.provided]:
+            if self._outputs_exist(self.stages[name]):
+                self.state[name] = {'fingerprint': fingerprints[name], 'outputs': self.stages[name].outputs}
+                self._save()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            running = {}
+            while pending or running:
+                for name in [name for name in pending if all(dep in finished for dep in self.stages[name].deps)]:
+                    if len(running) >= max(1, self.workers):
+                        break
+                    pending.remove(name)
+                    running[executor.submit(self._execute, self.stages[name])] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.results[name] = future.result()
+                    self.state[name] = {'fingerprint': fingerprints[name], 'outputs': self.stages[name].outputs}
+                    self._save()
+                    finished.add(name)
+                    print(f"Stage {name} done")
+        return status
+
+    def _save(self) -> None:
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.state_path)
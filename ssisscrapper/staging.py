@@ -0,0 +1,185 @@
+import errno
+import json
+import os
+import shutil
+from archive import open_path, split_archive_path, stat_path
+
+STAGING_MODES = ('auto', 'copy', 'hardlink', 'reflink', 'symlink', 'virtual')
+VIEW_NAME = '.staging.json'
+FICLONE = 0x40049409
+
+_views = {}
+
+
+def reflink(source:str, target:str) -> None:
+    """
+    Clones source into target sharing its data blocks (btrfs, xfs, ...) with the FICLONE ioctl. Raises OSError when
+    the platform or filesystem does not support it.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+    shutil.copystat(source, target)
+
+
+def is_up_to_date(source:str, target:str, mode:str) -> bool:
+    """
+    Returns True when target already stages source: the same link for hardlinks and symlinks, or the same size and
+    modification time for copies and reflinks.
+    """
+    if not os.path.lexists(target):
+        return False
+    if split_archive_path(source) is not None:
+        target_stat = os.stat(target)
+        return (target_stat.st_size, target_stat.st_mtime_ns) == stat_path(source)
+    if mode == 'symlink' or os.path.islink(target):
+        return os.path.islink(target) and os.readlink(target) == os.path.abspath(source)
+    source_stat, target_stat = os.stat(source), os.stat(target)
+    if (source_stat.st_dev, source_stat.st_ino) == (target_stat.st_dev, target_stat.st_ino):
+        return True
+    return mode != 'hardlink' and source_stat.st_size == target_stat.st_size and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+
+
+def stage_file(source:str, target:str, mode:str='auto') -> str:
+    """
+    Stages source at target and returns the method actually used. 'auto' tries a hardlink, then a reflink, then a
+    copy; 'hardlink', 'reflink' and 'symlink' fall back to a copy when the filesystem refuses them. Archive members
+    can only be copied: they are streamed into target, which takes the member's modification time.
+    """
+    if os.path.lexists(target):
+        os.remove(target)
+    if split_archive_path(source) is not None:
+        with open_path(source) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        mtime_ns = stat_path(source)[1]
+        os.utime(target, ns=(mtime_ns, mtime_ns))
+        return 'copy'
+    attempts = {'auto': ('hardlink', 'reflink'), 'copy': ()}.get(mode, (mode,))
+    for method in attempts:
+        try:
+            if method == 'hardlink':
+                os.link(source, target)
+            elif method == 'reflink':
+                reflink(source, target)
+            elif method == 'symlink':
+                os.symlink(os.path.abspath(source), target)
+            return method
+        except (OSError, NotImplementedError):
+            continue
+    shutil.copy2(source, target)
+    return 'copy'
+
+
+class StagingView:
+    """
+    Virtual staging directory: a VIEW_NAME manifest in the target directory mapping each staged file name to its
+    source, so nothing is copied or linked. Later stages go through resolve() (the document cache, the manifests and
+    SSISDiscovery already do) to read the source behind a staged path.
+
+    Methods:
+        add: Maps a staged name to a source path.
+        remove: Forgets a staged name.
+        source: Returns the source behind a staged name, or None.
+        names: Returns every staged name.
+        save: Writes the view back to disk.
+    """
+    def __init__(self, target_dir:str):
+        self.target_dir = target_dir
+        self.view_path = os.path.join(target_dir, VIEW_NAME)
+        self.entries = {}
+        if os.path.exists(self.view_path):
+            with open(self.view_path, 'r') as f:
+                self.entries = json.load(f)
+
+    def add(self, name:str, source:str) -> None:
+        self.entries[name] = os.path.abspath(source)
+
+    def remove(self, name:str) -> None:
+        self.entries.pop(name, None)
+
+    def source(self, name:str):
+        return self.entries.get(name)
+
+    def names(self) -> list:
+        return list(self.entries)
+
+    def save(self) -> None:
+        """
+        Writes the view back to disk, replacing the previous version atomically.
+        """
+        tmp_path = self.view_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.view_path)
+        _views.pop(os.path.abspath(self.target_dir), None)
+
+
+def _view_entries(directory:str) -> dict:
+    """
+    Returns the entries of the virtual view of a directory ({} when it has none), reloading them only when the view
+    file changed.
+    """
+    directory = os.path.abspath(directory)
+    try:
+        mtime = os.stat(os.path.join(directory, VIEW_NAME)).st_mtime_ns
+    except OSError:
+        _views.pop(directory, None)
+        return {}
+    cached = _views.get(directory)
+    if cached is None or cached[0] != mtime:
+        cached = _views[directory] = (mtime, StagingView(directory).entries)
+    return cached[1]
+
+
+def virtual_names(directory:str) -> list:
+    """
+    Returns the file names staged in the virtual view of a directory.
+    """
+    return list(_view_entries(directory))
+
+
+def resolve(path:str) -> str:
+    """
+    Returns the source file behind a path staged in virtual mode, or the path itself when it is a real file.
+    """
+    if os.path.exists(path):
+        return path
+    return _view_entries(os.path.dirname(path)).get(os.path.basename(path), path)
+
+
+def staged_source(path:str):
+    """
+    Returns the source a staged path currently points to when that can be told (symlinks and virtual entries), else None.
+    """
+    if os.path.islink(path):
+        return os.readlink(path)
+    return _view_entries(os.path.dirname(path)).get(os.path.basename(path))
+
+
+def unstage(path:str) -> None:
+    """
+    Removes a staged file, or its entry in the virtual view of its directory.
+    """
+    if os.path.lexists(path):
+        os.remove(path)
+    elif os.path.basename(path) in _view_entries(os.path.dirname(path)):
+        view = StagingView(os.path.dirname(path))
+        view.remove(os.path.basename(path))
+        view.save()
+
+
+def staged_files(target_dir:str, file_extension:str=None) -> list:
+    """
+    Returns the files staged in target_dir, real and virtual, optionally only those with file_extension.
+    """
+    names = {entry.name for entry in os.scandir(target_dir) if not entry.name.startswith(VIEW_NAME)}
+    names.update(_view_entries(target_dir))
+    return [os.path.join(target_dir, name) for name in sorted(names) if file_extension is None or name.endswith(file_extension)]
@@ -0,0 +1,300 @@
+#%%
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+PROJECTS = ['StagingToEDW', 'DataLakeHRISToBase', 'DWMartIncrementalLoad', 'DataLakeBaseToMart']
+DTS_NAMESPACE = 'www.microsoft.com/SqlServer/Dts'
+SQLTASK_NAMESPACE = 'www.microsoft.com/sqlserver/dts/tasks/sqltask'
+
+
+def project_names(projects:int) -> list:
+    """
+    Returns project folder names that the default valid_dirs of main.py and analyzer.py pick up.
+    """
+    return [PROJECTS[i % len(PROJECTS)] + (str(i // len(PROJECTS)) if i >= len(PROJECTS) else '') for i in range(projects)]
+
+
+def procedure_name(k:int) -> str:
+    """
+    Name of the k-th stored procedure, spLoad_A, spLoad_B, ..., spLoad_Z, spLoad_AA... Letters only, since the
+    (sp[a-zA-Z_]+) extraction of analyzer.py and catalog.py stops at the first digit.
+    """
+    letters = ''
+    k += 1
+    while k:
+        k, rest = divmod(k - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return f'spLoad_{letters}'
+
+
+class EstateGenerator:
+    """
+    Writes a synthetic SSIS estate laid out like the client's bing folder:
+    bing/BING SSIS/<project>/<project>/*.dtsx and Project.params, and bing/BING DB/Stored Procedures/*.sql.
+
+    Methods:
+        generate: Writes every project, package and stored procedure and returns a summary of what was written.
+        package_xml: Builds the .dtsx XML of a single package.
+        params_xml: Builds the Project.params XML of a project.
+    """
+    def __init__(self, packages:int=100, projects:int=4, depth:int=2, components:int=4, precedence_edges:int=3,
+                 fanout:int=5, columns:int=3, seed:int=0):
+        """
+        Initializes the generator.
+
+        Args:
+            packages (int): total number of .dtsx packages.
+            projects (int): number of SSIS projects the packages are spread over.
+            depth (int): nesting depth of STOCK:SEQUENCE containers inside each package.
+            components (int): pipeline components per data flow (source, derived columns, destination).
+            precedence_edges (int): precedence constraints per container.
+            fanout (int): child packages called by each parent package through ExecutePackageTask.
+            columns (int): columns flowing through each data flow, at least one.
+            seed (int): random seed, so the same arguments always produce the same estate.
+        """
+        self.packages = packages
+        self.projects = project_names(projects)
+        self.depth = depth
+        self.components = max(components, 2)
+        self.precedence_edges = precedence_edges
+        self.fanout = fanout
+        self.columns = max(columns, 1)
+        self.stored_procedures = max(10, packages // 5)
+        self.random = random.Random(seed)
+
+    def generate(self, root_directory:str) -> dict:
+        """
+        Writes the estate under root_directory and returns a summary of the generated objects.
+        """
+        ssis_dir = os.path.join(root_directory, 'BING SSIS')
+        sp_dir = os.path.join(root_directory, 'BING DB', 'Stored Procedures')
+        os.makedirs(sp_dir, exist_ok=True)
+        summary = {'packages': 0, 'parents': 0, 'package_calls': 0, 'stored_procedures': 0, 'projects': len(self.projects)}
+
+        per_project = [self.packages // len(self.projects) + (1 if i < self.packages % len(self.projects) else 0) for i in range(len(self.projects))]
+        for project, count in zip(self.projects, per_project):
+            project_dir = os.path.join(ssis_dir, project, project)
+            os.makedirs(project_dir, exist_ok=True)
+            with open(os.path.join(project_dir, 'Project.params'), 'w') as f:
+                f.write(self.params_xml(project))
+
+            names = [f'{project}_Package{i:05d}' for i in range(count)]
+            parents = max(1, count // (self.fanout + 1)) if self.fanout and count > 1 else 0
+            for i, name in enumerate(names):
+                children = []
+                if i < parents:
+                    candidates = names[parents:]
+                    children = self.random.sample(candidates, min(self.fanout, len(candidates)))
+                    summary['parents'] += 1
+                xml = self.package_xml(name, children)
+                # counted from the written XML, so the summary always describes the files
+                summary['package_calls'] += xml.count('<ExecutePackageTask>')
+                with open(os.path.join(project_dir, f'{name}.dtsx'), 'w') as f:
+                    f.write(xml)
+                summary['packages'] += 1
+
+        for k in range(self.stored_procedures):
+            with open(os.path.join(sp_dir, f'dbo.{procedure_name(k)}.sql'), 'w') as f:
+                f.write(self.stored_procedure_sql(k))
+            summary['stored_procedures'] += 1
+        return summary
+
+    def params_xml(self, project:str) -> str:
+        """
+        Builds the Project.params XML of a project, with the same property layout SSIS writes.
+        """
+        parameters = []
+        for name, catalog in (('pBINGEDW', 'BING_EDW'), ('pSSISDB', 'SSISDB'), (f'p{project}Source', f'{project}_Source')):
+            value = f'Data Source=SQL{len(project)}01;Initial Catalog={catalog};Provider=SQLNCLI11.1;Integrated Security=SSPI;Auto Translate=False;'
+            properties = [('ID', '{%08x-0000-0000-0000-000000000000}' % self.random.getrandbits(32)), ('CreationName', ''),
+                          ('Description', ''), ('IncludeInDebugDump', '0'), ('Required', '0'), ('Sensitive', '0'),
+                          ('Value', value), ('DataType', '18')]
+            parameters.append(f'''  <SSIS:Parameter
+    SSIS:Name="{name}">
+    <SSIS:Properties>
+''' + ''.join(f'''      <SSIS:Property
+        SSIS:Name="{key}">{escape(text)}</SSIS:Property>
+''' for key, text in properties) + '''    </SSIS:Properties>
+  </SSIS:Parameter>
+''')
+        return '<?xml version="1.0"?>\n<SSIS:Parameters xmlns:SSIS="www.microsoft.com/SqlServer/SSIS">\n' + ''.join(parameters) + '</SSIS:Parameters>\n'
+
+    def stored_procedure_sql(self, k:int) -> str:
+        return f'''CREATE PROCEDURE [dbo].[{procedure_name(k)}] @RunId INT AS
+BEGIN
+    -- loads Dim_{k} from the staging area
+    INSERT INTO dbo.Dim_{k} (Id, Name)
+    SELECT s.Id, s.Name FROM BING_EDW.dbo.Stage_{k} s
+    LEFT JOIN dbo.Dim_{k} d ON d.Id = s.Id
+    WHERE d.Id IS NULL;
+
+    UPDATE dbo.AuditLog SET EndTime = GETDATE() WHERE RunId = @RunId;
+END
+'''
+
+    def package_xml(self, name:str, children:list) -> str:
+        """
+        Builds the .dtsx XML of a package. Parent packages spread their ExecutePackageTasks over the leaf containers,
+        every child being called exactly once.
+        """
+        leaves = 2 ** self.depth
+        shares = [children[i * len(children) // leaves:(i + 1) * len(children) // leaves] for i in range(leaves)]
+        connections = f'''  <DTS:ConnectionManagers>
+    <DTS:ConnectionManager DTS:refId="Package.ConnectionManagers[EDW]" DTS:CreationName="OLEDB" DTS:DTSID="{{00000000-0000-0000-0000-000000000001}}" DTS:ObjectName="EDW">
+      <DTS:PropertyExpression DTS:Name="ConnectionString">@[$Project::pBINGEDW]</DTS:PropertyExpression>
+      <DTS:ObjectData>
+        <DTS:ConnectionManager DTS:ConnectionString="Data Source=localhost;Initial Catalog=BING_EDW;Provider=SQLNCLI11.1;Integrated Security=SSPI;" />
+      </DTS:ObjectData>
+    </DTS:ConnectionManager>
+  </DTS:ConnectionManagers>
+  <DTS:Variables>
+    <DTS:Variable DTS:CreationName="" DTS:DTSID="{{00000000-0000-0000-0000-000000000002}}" DTS:Namespace="User" DTS:ObjectName="RowCount">
+      <DTS:VariableValue DTS:DataType="3">0</DTS:VariableValue>
+    </DTS:Variable>
+  </DTS:Variables>
+'''
+        body = self._container('Package', self.depth, '  ', shares)
+        return (f'<?xml version="1.0"?>\n<DTS:Executable xmlns:DTS="{DTS_NAMESPACE}"\n  DTS:refId="Package"\n'
+                f'  DTS:CreationName="Microsoft.Package"\n  DTS:ExecutableType="Microsoft.Package"\n  DTS:ObjectName={quoteattr(name)}>\n'
+                + connections + body + '</DTS:Executable>\n')
+
+    def _container(self, ref_id:str, depth:int, indent:str, shares:list) -> str:
+        """
+        Builds the Executables and PrecedenceConstraints of a container, nesting sequences until depth reaches zero.
+        Each leaf container takes the next list of child packages from shares.
+        """
+        executables = []
+        if depth > 0:
+            for i in range(2):
+                child_ref = f'{ref_id}\\Sequence {depth}.{i}'
+                executables.append((child_ref, f'{indent}  <DTS:Executable DTS:refId={quoteattr(child_ref)} DTS:CreationName="STOCK:SEQUENCE" DTS:ExecutableType="STOCK:SEQUENCE" DTS:ObjectName={quoteattr(f"Sequence {depth}.{i}")}>\n'
+                                    + self._container(child_ref, depth - 1, indent + '    ', shares) + f'{indent}  </DTS:Executable>\n'))
+        else:
+            executables.append(self._sql_task(ref_id, indent + '  '))
+            executables.append(self._pipeline(ref_id, indent + '  '))
+            for child in shares.pop(0):
+                executables.append(self._execute_package_task(ref_id, child, indent + '  '))
+
+        constraints = []
+        for i in range(min(self.precedence_edges, len(executables) - 1)):
+            source, target = executables[i][0], executables[i + 1][0]
+            constraints.append(f'{indent}  <DTS:PrecedenceConstraint DTS:refId={quoteattr(f"{ref_id}.PrecedenceConstraints[Constraint {i}]")} DTS:CreationName="" DTS:From={quoteattr(source)} DTS:To={quoteattr(target)} DTS:ObjectName="Constraint {i}" />\n')
+        if len(executables) > 2 and len(constraints) < self.precedence_edges:
+            constraints.append(f'{indent}  <DTS:PrecedenceConstraint DTS:refId={quoteattr(f"{ref_id}.PrecedenceConstraints[Constraint Failure]")} DTS:CreationName="" DTS:From={quoteattr(executables[0][0])} DTS:To={quoteattr(executables[-1][0])} DTS:LogicalAnd="False" DTS:Value="1" DTS:ObjectName="Constraint Failure" />\n')
+
+        xml = f'{indent}<DTS:Executables>\n' + ''.join(executable for _, executable in executables) + f'{indent}</DTS:Executables>\n'
+        if constraints:
+            xml += f'{indent}<DTS:PrecedenceConstraints>\n' + ''.join(constraints) + f'{indent}</DTS:PrecedenceConstraints>\n'
+        return xml
+
+    def _sql_task(self, ref_id:str, indent:str) -> tuple:
+        task_ref = f'{ref_id}\\SQL Load'
+        k = self.random.randrange(self.stored_procedures)
+        if self.random.random() < 0.5:
+            sql = f'EXEC dbo.{procedure_name(k)} ?'
+        else:
+            sql = f'INSERT INTO dbo.Audit_{k} SELECT s.* FROM BING_EDW.dbo.Stage_{k} s JOIN dbo.Dim_{k} d ON d.Id = s.Id -- FROM ignored.Table'
+        return task_ref, (f'{indent}<DTS:Executable DTS:refId={quoteattr(task_ref)} DTS:CreationName="Microsoft.ExecuteSQLTask" DTS:ExecutableType="Microsoft.ExecuteSQLTask" DTS:ObjectName="SQL Load">\n'
+                          f'{indent}  <DTS:ObjectData>\n'
+                          f'{indent}    <SQLTask:SqlTaskData xmlns:SQLTask="{SQLTASK_NAMESPACE}" SQLTask:Connection="{{00000000-0000-0000-0000-000000000001}}" SQLTask:SqlStatementSource={quoteattr(sql)} />\n'
+                          f'{indent}  </DTS:ObjectData>\n{indent}</DTS:Executable>\n')
+
+    def _execute_package_task(self, ref_id:str, child:str, indent:str) -> tuple:
+        task_ref = f'{ref_id}\\Execute {child}'
+        return task_ref, (f'{indent}<DTS:Executable DTS:refId={quoteattr(task_ref)} DTS:CreationName="Microsoft.ExecutePackageTask" DTS:ExecutableType="Microsoft.ExecutePackageTask" DTS:ObjectName={quoteattr(child)}>\n'
+                          f'{indent}  <DTS:ObjectData>\n{indent}    <ExecutePackageTask>\n'
+                          f'{indent}      <UseProjectReference>True</UseProjectReference>\n'
+                          f'{indent}      <PackageName>{escape(child)}.dtsx</PackageName>\n'
+                          f'{indent}    </ExecutePackageTask>\n{indent}  </DTS:ObjectData>\n{indent}</DTS:Executable>\n')
+
+    def _pipeline(self, ref_id:str, indent:str) -> tuple:
+        """
+        Builds a data flow whose source feeds a chain of derived column transforms ending in a destination, with
+        full column lineage (lineageId, externalMetadataColumnId and paths).
+        """
+        task_ref = f'{ref_id}\\DFT Load'
+        k = self.random.randrange(self.stored_procedures)
+        columns = [f'Col{c}' for c in range(self.columns)]
+        select = f"SELECT {', '.join(columns)} FROM [BING_EDW].[dbo].[Stage_{k}]"
+        components = []
+        paths = []
+        previous_output = None
+        lineage = {}
+
+        source = f'{task_ref}\\SRC Stage'
+        output = f'{source}.Outputs[OLE DB Source Output]'
+        output_columns = ''.join(f'{indent}                <outputColumn refId={quoteattr(f"{output}.Columns[{c}]")} lineageId={quoteattr(f"{output}.Columns[{c}]")} name="{c}" externalMetadataColumnId={quoteattr(f"{output}.ExternalColumns[{c}]")} />\n' for c in columns)
+        external_columns = ''.join(f'{indent}                <externalMetadataColumn refId={quoteattr(f"{output}.ExternalColumns[{c}]")} name="{c}" />\n' for c in columns)
+        components.append(f'{indent}          <component refId={quoteattr(source)} componentClassID="Microsoft.OLEDBSource" contactInfo="OLE DB Source;Microsoft Corporation; Microsoft SQL Server; (C) Microsoft Corporation; All Rights Reserved; http://www.microsoft.com/sql/support;7" description="OLE DB Source" name="SRC Stage">\n'
+                          f'{indent}            <properties>\n'
+                          f'{indent}              <property name="SqlCommand">{escape(select)}</property>\n'
+                          f'{indent}              <property name="OpenRowset"></property>\n'
+                          f'{indent}            </properties>\n'
+                          f'{indent}            <outputs>\n{indent}              <output refId={quoteattr(output)} name="OLE DB Source Output">\n'
+                          f'{indent}              <outputColumns>\n{output_columns}{indent}              </outputColumns>\n'
+                          f'{indent}              <externalMetadataColumns>\n{external_columns}{indent}              </externalMetadataColumns>\n'
+                          f'{indent}              </output>\n{indent}            </outputs>\n{indent}          </component>\n')
+        lineage = {c: f'{output}.Columns[{c}]' for c in columns}
+        previous_output = output
+
+        for d in range(self.components - 2):
+            derived = f'{task_ref}\\DER Step {d}'
+            input_ref = f'{derived}.Inputs[Derived Column Input]'
+            output = f'{derived}.Outputs[Derived Column Output]'
+            source_column = columns[d % len(columns)]
+            new_column = f'Derived{d}'
+            components.append(f'{indent}          <component refId={quoteattr(derived)} componentClassID="Microsoft.DerivedColumn" contactInfo="Derived Column;Microsoft Corporation; Microsoft SQL Server; (C) Microsoft Corporation; All Rights Reserved; http://www.microsoft.com/sql/support;0" description="Creates new column values by applying expressions to transformation input columns." name="DER Step {d}">\n'
+                              f'{indent}            <inputs>\n{indent}              <input refId={quoteattr(input_ref)} name="Derived Column Input">\n'
+                              f'{indent}                <inputColumns>\n'
+                              f'{indent}                  <inputColumn refId={quoteattr(f"{input_ref}.Columns[{source_column}]")} lineageId={quoteattr(lineage[source_column])} cachedName="{source_column}" />\n'
+                              f'{indent}                </inputColumns>\n{indent}              </input>\n{indent}            </inputs>\n'
+                              f'{indent}            <outputs>\n{indent}              <output refId={quoteattr(output)} name="Derived Column Output" synchronousInputId={quoteattr(input_ref)}>\n'
+                              f'{indent}                <outputColumns>\n'
+                              f'{indent}                  <outputColumn refId={quoteattr(f"{output}.Columns[{new_column}]")} lineageId={quoteattr(f"{output}.Columns[{new_column}]")} name="{new_column}">\n'
+                              f'{indent}                    <properties>\n'
+                              f'{indent}                      <property name="Expression">{escape("#{" + lineage[source_column] + "} + 1")}</property>\n'
+                              f'{indent}                    </properties>\n{indent}                  </outputColumn>\n'
+                              f'{indent}                </outputColumns>\n{indent}              </output>\n{indent}            </outputs>\n{indent}          </component>\n')
+            paths.append((previous_output, input_ref))
+            lineage[new_column] = f'{output}.Columns[{new_column}]'
+            previous_output = output
+
+        destination = f'{task_ref}\\DST Dim'
+        input_ref = f'{destination}.Inputs[OLE DB Destination Input]'
+        input_columns = ''.join(f'{indent}                  <inputColumn refId={quoteattr(f"{input_ref}.Columns[{c}]")} lineageId={quoteattr(l)} cachedName="{c}" externalMetadataColumnId={quoteattr(f"{input_ref}.ExternalColumns[{c}]")} />\n' for c, l in lineage.items())
+        external_columns = ''.join(f'{indent}                  <externalMetadataColumn refId={quoteattr(f"{input_ref}.ExternalColumns[{c}]")} name="{c}" />\n' for c in lineage)
+        components.append(f'{indent}          <component refId={quoteattr(destination)} componentClassID="Microsoft.OLEDBDestination" contactInfo="OLE DB Destination;Microsoft Corporation; Microsoft SQL Server; (C) Microsoft Corporation; All Rights Reserved; http://www.microsoft.com/sql/support;4" description="OLE DB Destination" name="DST Dim">\n'
+                          f'{indent}            <properties>\n{indent}              <property name="OpenRowset">[dbo].[Dim_{k}]</property>\n{indent}            </properties>\n'
+                          f'{indent}            <inputs>\n{indent}              <input refId={quoteattr(input_ref)} name="OLE DB Destination Input">\n'
+                          f'{indent}                <inputColumns>\n{input_columns}{indent}                </inputColumns>\n'
+                          f'{indent}                <externalMetadataColumns>\n{external_columns}{indent}                </externalMetadataColumns>\n'
+                          f'{indent}              </input>\n{indent}            </inputs>\n{indent}          </component>\n')
+        paths.append((previous_output, input_ref))
+
+        path_xml = ''.join(f'{indent}          <path refId={quoteattr(f"{task_ref}.Paths[Path {i}]")} endId={quoteattr(end)} name="Path {i}" startId={quoteattr(start)} />\n' for i, (start, end) in enumerate(paths))
+        return task_ref, (f'{indent}<DTS:Executable DTS:refId={quoteattr(task_ref)} DTS:CreationName="Microsoft.Pipeline" DTS:ExecutableType="Microsoft.Pipeline" DTS:ObjectName="DFT Load">\n'
+                          f'{indent}  <DTS:ObjectData>\n{indent}    <pipeline version="1">\n'
+                          f'{indent}      <components>\n' + ''.join(components) + f'{indent}      </components>\n'
+                          f'{indent}      <paths>\n' + path_xml + f'{indent}      </paths>\n'
+                          f'{indent}    </pipeline>\n{indent}  </DTS:ObjectData>\n{indent}</DTS:Executable>\n')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Writes a synthetic SSIS estate (.dtsx, .params and .sql files).")
+    parser.add_argument('target', help="Directory the estate is written to, e.g. ./bing")
+    parser.add_argument('--packages', type=int, default=100)
+    parser.add_argument('--projects', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--components', type=int, default=4)
+    parser.add_argument('--precedence-edges', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--columns', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = EstateGenerator(args.packages, args.projects, args.depth, args.components, args.precedence_edges,
+                                args.fanout, args.columns, args.seed)
+    print(generator.generate(args.target))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other by their flat names, as when the scripts are run from ssisscrapper
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import io
+import tarfile
+import threading
+import zipfile
+import pytest
+from archive import exists_path, member_path, read_path, split_archive_path, stat_path
+from SSISModule import SSISDiscovery
+
+FILES = {'BING SSIS/StagingToEDW/Load.dtsx': b'<Load/>', 'BING SSIS/StagingToEDW/Project.params': b'<Params/>',
+         'BING SSIS/Archive/Old.dtsx': b'<Old/>', 'BING DB/Stored Procedures/dbo.spLoad.sql': b'CREATE PROCEDURE'}
+
+
+def make_archive(tmp_path, kind):
+    if kind == 'zip':
+        path = str(tmp_path / 'bing.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, data in FILES.items():
+                archive.writestr(name, data)
+    else:
+        path = str(tmp_path / 'bing.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            for name, data in FILES.items():
+                info = tarfile.TarInfo('./' + name)
+                info.size, info.mtime = len(data), 1_700_000_000
+                archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+@pytest.mark.parametrize('kind', ['zip', 'tar'])
+def test_member_paths_read_like_files(tmp_path, kind):
+    archive_path = make_archive(tmp_path, kind)
+    path = member_path(archive_path, 'BING SSIS/StagingToEDW/Load.dtsx')
+    assert split_archive_path(path) == (archive_path, 'BING SSIS/StagingToEDW/Load.dtsx')
+    assert split_archive_path(archive_path) is None
+    assert read_path(path) == b'<Load/>'
+    assert stat_path(path)[0] == len(b'<Load/>')
+    assert exists_path(path)
+    assert not exists_path(member_path(archive_path, 'BING SSIS/StagingToEDW/Missing.dtsx'))
+
+
+@pytest.mark.parametrize('kind', ['zip', 'tar'])
+def test_discovery_walks_archive_members(tmp_path, kind):
+    archive_path = make_archive(tmp_path, kind)
+    files = SSISDiscovery(archive_path, valid_dirs=['StagingToEDW'], file_extension='.dtsx').get_files()
+    assert files == [member_path(archive_path, 'BING SSIS/StagingToEDW/Load.dtsx')]
+
+
+def test_tar_members_can_be_read_from_threads(tmp_path):
+    archive_path = make_archive(tmp_path, 'tar')
+    paths = {member_path(archive_path, name): data for name, data in FILES.items()}
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                for path, data in paths.items():
+                    assert read_path(path) == data
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,76 @@
+import os
+import threading
+from cache import PackageCache
+
+PACKAGE = b'<?xml version="1.0"?><Package Name="Load"><Task Name="SQL"/></Package>'
+
+
+def write(tmp_path, name, data=PACKAGE):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_get_reads_a_file_once(tmp_path):
+    cache = PackageCache()
+    path = write(tmp_path, 'Load.dtsx')
+    document = cache.get(path)
+    assert cache.get(path) is document
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert document.tree.getroot().get('Name') == 'Load'
+    assert document.text.startswith('<?xml')
+
+
+def test_derived_values_are_built_once(tmp_path):
+    document = PackageCache().get(write(tmp_path, 'Load.dtsx'))
+    calls = []
+    for _ in range(3):
+        document.derived('tasks', lambda doc: calls.append(1) or len(doc.tree.findall('Task')))
+    assert calls == [1]
+
+
+def test_a_changed_file_is_read_again(tmp_path):
+    cache = PackageCache()
+    path = write(tmp_path, 'Load.dtsx')
+    first = cache.get(path)
+    write(tmp_path, 'Load.dtsx', PACKAGE.replace(b'Load', b'Other'))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000_000))
+    assert cache.peek(path) is None
+    second = cache.get(path)
+    assert second is not first
+    assert second.tree.getroot().get('Name') == 'Other'
+    assert len(cache) == 1
+    assert cache.used_bytes == len(second.data) * cache.size_factor
+
+
+def test_least_recently_used_documents_are_evicted(tmp_path):
+    cache = PackageCache(max_bytes=2 * len(PACKAGE), size_factor=1)
+    first, second, third = (write(tmp_path, f'{name}.dtsx') for name in ('A', 'B', 'C'))
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)
+    cache.get(third)
+    assert cache.peek(first) is not None
+    assert cache.peek(second) is None
+    assert cache.used_bytes == 2 * len(PACKAGE)
+
+
+def test_concurrent_gets_keep_the_byte_count_consistent(tmp_path):
+    cache = PackageCache(max_bytes=3 * len(PACKAGE), size_factor=1)
+    paths = [write(tmp_path, f'P{i}.dtsx') for i in range(8)]
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                cache.get(paths[(i + offset) % len(paths)])
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.used_bytes == sum(cost for _, _, cost in cache._documents.values()) <= cache.max_bytes
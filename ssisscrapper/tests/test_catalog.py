@@ -0,0 +1,59 @@
+import glob
+import os
+import pytest
+from catalog import Catalog
+from cli import combine
+from SSISModule import SSISMigrator
+from synthetic import EstateGenerator
+
+
+@pytest.fixture
+def estate(tmp_path):
+    EstateGenerator(packages=12, projects=2, depth=2, fanout=3).generate(str(tmp_path / 'bing'))
+    packages = sorted(glob.glob(os.path.join(str(tmp_path / 'bing'), '**', '*.dtsx'), recursive=True))
+    with Catalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        catalog.sync(packages)
+        yield catalog, packages
+
+
+def parsed_all_joined(packages):
+    migrator = SSISMigrator()
+    return combine({file_path: migrator.get_df(migrator.parse_xml_file(file_path)) for file_path in packages})
+
+
+def test_all_joined_matches_the_parsed_packages(estate):
+    catalog, packages = estate
+    expected = parsed_all_joined(packages)
+    df = catalog.all_joined()
+    columns = ['File_path', 'RefId', 'ExecutableType', 'name']
+    assert sorted(df[columns].fillna('').itertuples(index=False)) == sorted(expected[columns].fillna('').itertuples(index=False))
+
+
+def test_executable_type_counts_count_component_rows(estate):
+    catalog, packages = estate
+    expected = parsed_all_joined(packages).groupby(['File_path', 'ExecutableType'])['RefId'].count().reset_index()
+    counts = catalog.executable_type_counts()
+    assert counts.to_dict('records') == expected.to_dict('records')
+    pipelines = counts[counts['ExecutableType'] == 'Microsoft.Pipeline']
+    assert (pipelines['RefId'] > 1).all()
+
+
+@pytest.mark.parametrize('column', ['ExecutableType', 'SqlTaskData', 'ObjectName', 'RefId'])
+def test_unique_values_match_all_joined(estate, column):
+    catalog, _ = estate
+    assert catalog.unique_values(column)[column].tolist() == list(catalog.all_joined()[column].unique())
+
+
+def test_calls_procedures_and_sync(estate):
+    catalog, packages = estate
+    calls = catalog.package_calls()
+    assert len(calls) > 0 and calls['use_project_reference'].eq(1).all()
+    child = calls['child'].iloc[0]
+    assert len(catalog.package_calls(child)) >= 1
+    procedures = catalog.stored_procedures()
+    assert procedures['store_procedure_name'].str.match('^spLoad_[A-Z]+$').all()
+    name = procedures['store_procedure_name'].iloc[0]
+    assert not catalog.packages_calling_procedure(f'[dbo].[{name}]').empty
+
+    assert catalog.sync(packages[1:]) == 0
+    assert len(catalog.package_names()) == len(packages) - 1
@@ -0,0 +1,35 @@
+from graph import DependencyGraph
+
+
+def test_from_map_dict_links_parents_and_children():
+    graph = DependencyGraph.from_map_dict({'A': ['B', 'C'], 'B': ['D'], 'C': None, 'D': None})
+    assert sorted(graph.children('A')) == ['B', 'C']
+    assert graph.parents('D') == ['B']
+    assert graph.roots() == ['A']
+    assert sorted(graph.leaves()) == ['C', 'D']
+
+
+def test_topological_order_puts_parents_first():
+    graph = DependencyGraph.from_map_dict({'A': ['B'], 'B': ['C'], 'C': None, 'X': ['C']})
+    order = graph.topological_order()
+    assert order.index('A') < order.index('B') < order.index('C')
+    assert order.index('X') < order.index('C')
+
+
+def test_ancestors_and_descendants_are_transitive():
+    graph = DependencyGraph.from_map_dict({'A': ['B'], 'B': ['C'], 'C': None})
+    assert sorted(graph.descendants('A')) == ['B', 'C']
+    assert sorted(graph.ancestors('C')) == ['A', 'B']
+    assert graph.descendants('C') == []
+
+
+def test_find_cycles_reports_loops_and_self_calls():
+    graph = DependencyGraph.from_map_dict({'A': ['B'], 'B': ['A'], 'C': ['C'], 'D': None})
+    assert sorted(sorted(cycle) for cycle in graph.find_cycles()) == [['A', 'B'], ['C']]
+
+
+def test_to_tree_deps_keeps_packages_of_an_uncalled_cycle():
+    graph = DependencyGraph.from_map_dict({'A': ['B'], 'B': ['A'], 'C': None})
+    tree = graph.to_tree_deps()
+    assert tree['C'] is None
+    assert len(set(tree) & {'A', 'B'}) == 1
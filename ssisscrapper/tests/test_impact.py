@@ -0,0 +1,76 @@
+import io
+import pandas as pd
+import pytest
+import cli
+from impact import ImpactIndex, ImpactNode, extracted_table, node_key, package_key
+
+
+def sample_index():
+    index = ImpactIndex()
+    index.add_edge(node_key('job', 'Nightly'), node_key('package', 'EDW|Master.dtsx'))
+    index.add_edge(node_key('package', 'EDW_Master'), node_key('package', 'EDW_LoadDim'))
+    index.add_edge(node_key('package', 'EDW_LoadDim'), node_key('procedure', '[dbo].[spLoadDim]'))
+    index.add_edge(node_key('procedure', 'spLoadDim'), node_key('table', '[BING_EDW].[dbo].[DimDate]'))
+    index.add_node(node_key('job', 'Idle'))
+    index.add_node(node_key('package', 'EDW_Standalone'))
+    return index
+
+
+def round_trip(index):
+    buffer = io.StringIO()
+    index.edges_frame().to_csv(buffer, index=False)
+    buffer.seek(0)
+    return ImpactIndex.from_frame(pd.read_csv(buffer, dtype=str, keep_default_na=False))
+
+
+def test_keys_normalize_the_forms_found_in_the_outputs():
+    assert package_key('EDW|Master.dtsx') == package_key('EDW\\Master.dtsx') == 'EDW_Master'
+    assert node_key('table', '[BING_EDW].[dbo].[DimDate]') == ImpactNode('table', 'dbo.dimdate')
+    assert node_key('procedure', 'spLoad') == node_key('procedure', '[dbo].[spLoad]')
+    assert extracted_table('INSERT INTO [dbo].[Fact]') == 'dbo.fact'
+    assert extracted_table('FROM @table') is None
+
+
+def test_impact_lists_everything_using_a_table():
+    affected = sample_index().impact(('table', 'dbo.DimDate'))
+    assert affected['job'] == ['Nightly']
+    assert sorted(affected['package']) == ['EDW_LoadDim', 'EDW_Master']
+    assert affected['procedure'] == ['dbo.sploaddim']
+
+
+def test_downstream_filters_by_kind():
+    index = sample_index()
+    assert index.downstream(('job', 'Nightly'), kinds=['table']) == [ImpactNode('table', 'dbo.dimdate')]
+    assert index.count_downstream(('job', 'Nightly')) == 4
+
+
+def test_round_trip_keeps_isolated_nodes():
+    index = sample_index()
+    reloaded = round_trip(index)
+    assert sorted(reloaded.nodes()) == sorted(index.nodes())
+    assert reloaded.upstream(('job', 'Idle')) == []
+    assert reloaded.downstream(('package', 'EDW_Standalone')) == []
+    assert sorted(reloaded.upstream(('table', 'dbo.dimdate'))) == sorted(index.upstream(('table', 'dbo.dimdate')))
+
+
+def test_unknown_and_blank_nodes_raise_key_error():
+    index = sample_index()
+    with pytest.raises(KeyError):
+        index.upstream(('table', 'dbo.missing'))
+    with pytest.raises(KeyError):
+        index.upstream(('job', '  '))
+
+
+def test_round_trip_keeps_numeric_and_null_like_names(tmp_path, capsys):
+    index = ImpactIndex()
+    index.add_edge(node_key('job', '2021'), node_key('package', 'NA'))
+    index.add_edge(node_key('package', 'NA'), node_key('table', 'null'))
+    index.add_node(node_key('job', '007'))
+    reloaded = round_trip(index)
+    assert sorted(reloaded.nodes()) == sorted(index.nodes())
+    assert reloaded.upstream(('table', 'null'), kinds=['job']) == [ImpactNode('job', '2021')]
+    assert reloaded.downstream(('job', '007')) == []
+
+    (tmp_path / 'analysis').mkdir()
+    index.edges_frame().to_csv(tmp_path / 'analysis' / 'impact_edges.csv', index=False)
+    assert cli.impact_query(str(tmp_path), 'table', 'null', kinds=['job']) == [ImpactNode('job', '2021')]
@@ -0,0 +1,8 @@
+from benchmark import import_times, IMPORT_BUDGET_SECONDS
+
+
+def test_light_modules_import_fast_without_heavy_libraries():
+    results = import_times(['utils', 'SSISModule', 'graph', 'main', 'cli'])
+    for module, result in results.items():
+        assert result['heavy'] == [], f"{module} loads {', '.join(result['heavy'])} at import time"
+        assert result['seconds'] < IMPORT_BUDGET_SECONDS, f"{module} takes {result['seconds']:.3f}s to import"
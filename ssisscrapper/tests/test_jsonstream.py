@@ -0,0 +1,44 @@
+import json
+import os
+import pytest
+from jsonstream import dump, entries, index_path, load, load_entry
+
+DOCUMENT = {'A': {'B': ['D'], 'C': None}, 'E': None, 'F': {'G': {'H': [1, 2.5, 'é']}}}
+
+
+@pytest.mark.parametrize('indent', [None, 4])
+def test_dump_writes_plain_json(tmp_path, indent):
+    file_path = str(tmp_path / 'tree_deps.json')
+    dump(DOCUMENT, file_path, indent=indent)
+    with open(file_path) as f:
+        assert json.load(f) == DOCUMENT
+    assert load(file_path) == DOCUMENT
+
+
+def test_load_entry_reads_indexed_and_nested_values(tmp_path):
+    file_path = str(tmp_path / 'tree_deps.json')
+    dump(DOCUMENT, file_path, indent=2, index_depth=2)
+    assert ('F', 'G') in entries(file_path)
+    assert load_entry(file_path, 'A') == DOCUMENT['A']
+    assert load_entry(file_path, 'F', 'G', 'H') == [1, 2.5, 'é']
+    assert load_entry(file_path, 'E') is None
+    with pytest.raises(KeyError):
+        load_entry(file_path, 'missing')
+
+
+def test_dump_without_index_removes_a_stale_one(tmp_path):
+    file_path = str(tmp_path / 'tree_deps.json')
+    dump(DOCUMENT, file_path)
+    assert os.path.exists(index_path(file_path))
+    dump(DOCUMENT, file_path, index_depth=0)
+    assert not os.path.exists(index_path(file_path))
+    assert entries(file_path) == []
+    assert load_entry(file_path, 'A', 'B') == ['D']
+
+
+def test_msgpack_round_trip(tmp_path):
+    pytest.importorskip('msgpack')
+    file_path = str(tmp_path / 'package.msgpack')
+    dump(DOCUMENT, file_path)
+    assert load(file_path) == DOCUMENT
+    assert load_entry(file_path, 'F', 'G') == DOCUMENT['F']['G']
@@ -0,0 +1,46 @@
+import io
+import pandas as pd
+from lineage import ColumnNode, LineageIndex, PATH_COLUMNS, TableColumn, table_column, table_key
+from synthetic import EstateGenerator
+
+
+def test_table_key_meets_on_one_name():
+    assert table_key('[BING_EDW].[dbo].[Stage_15]') == 'dbo.stage_15'
+    assert table_key('Stage_15') == table_key('"dbo"."STAGE_15"') == 'dbo.stage_15'
+    assert table_key('  ') is None and table_key(None) is None
+
+
+def test_origins_and_impact_across_a_generated_package(tmp_path):
+    file_path = tmp_path / 'Load.dtsx'
+    file_path.write_text(EstateGenerator(depth=1, components=1, columns=2).package_xml('Load', []))
+    index = LineageIndex.from_packages([str(file_path)])
+    sources = [node for node in map(index.graph.name, range(len(index.graph))) if isinstance(node, TableColumn) and node.table.startswith('dbo.stage_')]
+    assert sources
+    for source in sources:
+        impacted = index.impact(source)
+        assert impacted and all(node.table.startswith('dbo.dim_') for node in impacted)
+        for target in impacted:
+            assert source in index.upstream(target)
+            assert source in index.origins(target)
+    assert list(index.paths_frame().columns) == PATH_COLUMNS and len(index.paths_frame()) > 0
+
+
+def test_frames_round_trip_through_csv_with_numeric_ids():
+    index = LineageIndex()
+    source = table_column('[dbo].[Stage_1]', 'Id')
+    middle = ColumnNode('Load', 'Package\\DFT\\SRC', 'Id', '12')
+    target = table_column('dbo.Dim_1', 'Id')
+    index.add_edge(source, middle)
+    index.add_edge(middle, target)
+    index.paths = [('Load', 'Package\\DFT', 'Package\\DFT\\SRC', 'Package\\DFT\\DST')]
+
+    edges, paths = io.StringIO(), io.StringIO()
+    index.edges_frame().to_csv(edges, index=False)
+    index.paths_frame().to_csv(paths, index=False)
+    edges.seek(0)
+    paths.seek(0)
+    loaded = LineageIndex.from_frame(pd.read_csv(edges, dtype=str), pd.read_csv(paths, dtype=str))
+    assert middle in loaded
+    assert loaded.origins(target) == [source]
+    assert loaded.impact(source) == [target]
+    assert loaded.paths == index.paths
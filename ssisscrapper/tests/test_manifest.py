@@ -0,0 +1,51 @@
+import os
+from manifest import Manifest, file_hash
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_diff_classifies_files_against_the_saved_manifest(tmp_path):
+    manifest_path = str(tmp_path / 'dtsx.json')
+    kept, changed, deleted, touched = (write(tmp_path, f'{name}.dtsx', name) for name in ('Kept', 'Changed', 'Deleted', 'Touched'))
+    manifest = Manifest(manifest_path)
+    assert manifest.diff([kept, changed, deleted, touched])['added'] == [kept, changed, deleted, touched]
+    for file_path in (kept, changed, deleted, touched):
+        manifest.record(file_path, outputs=[file_path + '.csv'], data={'children': []})
+    manifest.save()
+
+    write(tmp_path, 'Changed.dtsx', 'Changed, longer')
+    touch(touched)
+    added = write(tmp_path, 'Added.dtsx', 'Added')
+    diff = Manifest(manifest_path).diff([kept, changed, touched, added])
+    assert diff == {'added': [added], 'changed': [changed], 'unchanged': [kept, touched], 'deleted': [deleted]}
+
+
+def test_record_and_remove_keep_outputs_and_data(tmp_path):
+    manifest = Manifest(str(tmp_path / 'dtsx.json'))
+    file_path = write(tmp_path, 'Load.dtsx', 'Load')
+    manifest.record(file_path, outputs=['Load.csv'], data=['Child'])
+    assert manifest.entries[file_path]['sha256'] == file_hash(file_path)
+    assert manifest.outputs(file_path) == ['Load.csv']
+    assert manifest.data(file_path) == ['Child']
+    assert manifest.remove(file_path) == ['Load.csv']
+    assert manifest.remove(file_path) == []
+
+
+def test_unchanged_files_are_not_hashed_again(tmp_path, monkeypatch):
+    manifest = Manifest(str(tmp_path / 'dtsx.json'))
+    file_path = write(tmp_path, 'Load.dtsx', 'Load')
+    manifest.record(file_path)
+
+    def fail(path, chunk_size=None):
+        raise AssertionError(f"{path} was hashed again")
+    monkeypatch.setattr('manifest.file_hash', fail)
+    assert manifest.diff([file_path])['unchanged'] == [file_path]
@@ -0,0 +1,61 @@
+import pytest
+from model import Container, Package, dump, load, load_package
+from SSISModule import SSISMigrator
+from synthetic import EstateGenerator
+
+PACKAGE = '''<?xml version="1.0"?>
+<DTS:Executable xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:refId="Package" DTS:ExecutableType="Microsoft.Package" DTS:ObjectName="Load">
+  <DTS:ConnectionManagers>
+    <DTS:ConnectionManager DTS:refId="Package.ConnectionManagers[EDW]" DTS:ObjectName="EDW" DTS:DTSID="{1}" DTS:CreationName="OLEDB">
+      <DTS:PropertyExpression DTS:Name="ServerName">@[$Project::pServer]</DTS:PropertyExpression>
+      <DTS:PropertyExpression>"unnamed"</DTS:PropertyExpression>
+      <DTS:ObjectData><DTS:ConnectionManager DTS:ConnectionString="Data Source=dev;Initial Catalog=EDW;" /></DTS:ObjectData>
+    </DTS:ConnectionManager>
+  </DTS:ConnectionManagers>
+  <DTS:Executables>
+    <DTS:Executable DTS:refId="Package\\DFT" DTS:ExecutableType="Microsoft.Pipeline" DTS:ObjectName="DFT">
+      <DTS:ObjectData><pipeline><components>
+        <component refId="Package\\DFT\\SRC" name="SRC" componentClassID="Microsoft.OLEDBSource">
+          <properties><property name="SqlCommand">SELECT 1</property><property>no name</property></properties>
+        </component>
+      </components></pipeline></DTS:ObjectData>
+    </DTS:Executable>
+  </DTS:Executables>
+</DTS:Executable>
+'''
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_rows_match_get_df(tmp_path):
+    xml = EstateGenerator(depth=2).package_xml('Load', ['Child1', 'Child2'])
+    file_path = write(tmp_path, 'Generated.dtsx', xml)
+    migrator = SSISMigrator()
+    expected = migrator.get_df(migrator.parse_xml_file(file_path)).fillna('').to_dict('records')
+    assert migrator.get_df_model(file_path).fillna('').to_dict('records') == expected
+    package = load_package(file_path)
+    assert isinstance(package, Package) and isinstance(package.executables[0], Container)
+    assert package.find(package.executables[0].ref_id) is package.executables[0]
+    assert {constraint.eval_op for constraint in package.precedence()} == {'Constraint'}
+
+
+def test_unnamed_properties_are_left_out(tmp_path):
+    package = load_package(write(tmp_path, 'Load.dtsx', PACKAGE))
+    assert package.connection_managers[0].property_expressions == {'ServerName': '@[$Project::pServer]'}
+    assert package.executables[0].components[0].properties == {'SqlCommand': 'SELECT 1'}
+
+
+@pytest.mark.parametrize('extension', ['.json', '.msgpack'])
+def test_dump_and_load_round_trip(tmp_path, extension):
+    if extension == '.msgpack':
+        pytest.importorskip('msgpack')
+    package = load_package(write(tmp_path, 'Load.dtsx', PACKAGE))
+    generated = load_package(write(tmp_path, 'Generated.dtsx', EstateGenerator().package_xml('G', ['C'])))
+    for obj in (package, [package, generated]):
+        path = str(tmp_path / f'model{extension}')
+        dump(obj, path)
+        assert load(path) == obj
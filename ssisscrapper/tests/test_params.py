@@ -0,0 +1,84 @@
+import os
+import pytest
+from params import ParameterResolver, parse_connection_string, project_name
+
+PARAMS = '''<?xml version="1.0"?>
+<SSIS:Parameters xmlns:SSIS="www.microsoft.com/SqlServer/SSIS">
+  <SSIS:Parameter SSIS:Name="pHR_Base"><SSIS:Properties><SSIS:Property SSIS:Name="Value">Data Source=SRV1;Initial Catalog=HR_Base;</SSIS:Property></SSIS:Properties></SSIS:Parameter>
+  <SSIS:Parameter SSIS:Name="pServer"><SSIS:Properties><SSIS:Property SSIS:Name="Value">SRV3</SSIS:Property></SSIS:Properties></SSIS:Parameter>
+  <SSIS:Parameter SSIS:Name="pUnused"><SSIS:Properties><SSIS:Property SSIS:Name="Value">Data Source=SRV2;Initial Catalog=Other;</SSIS:Property></SSIS:Properties></SSIS:Parameter>
+</SSIS:Parameters>
+'''
+
+CONMGR = '''<?xml version="1.0"?>
+<DTS:ConnectionManager xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:ObjectName="HR_Base" DTS:DTSID="{AAAA}" DTS:CreationName="OLEDB">
+  <DTS:PropertyExpression DTS:Name="ConnectionString">@[$Project::pHR_Base]</DTS:PropertyExpression>
+  <DTS:ObjectData><DTS:ConnectionManager DTS:ConnectionString="Data Source=dev;Initial Catalog=HR_Base;" /></DTS:ObjectData>
+</DTS:ConnectionManager>
+'''
+
+PACKAGE = '''<?xml version="1.0"?>
+<DTS:Executable xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:refId="Package" DTS:CreationName="Microsoft.Package" DTS:ExecutableType="Microsoft.Package" DTS:ObjectName="Load">
+  <DTS:ConnectionManagers>
+    <DTS:ConnectionManager DTS:refId="Package.ConnectionManagers[EDW]" DTS:ObjectName="EDW" DTS:DTSID="{BBBB}" DTS:CreationName="OLEDB">
+      <DTS:PropertyExpression DTS:Name="ServerName">@[$Project::pServer]</DTS:PropertyExpression>
+      <DTS:ObjectData><DTS:ConnectionManager DTS:ConnectionString="Data Source=dev;Initial Catalog=EDW;" /></DTS:ObjectData>
+    </DTS:ConnectionManager>
+  </DTS:ConnectionManagers>
+  <DTS:Executables>
+    <DTS:Executable DTS:refId="Package\\SQL" DTS:CreationName="Microsoft.ExecuteSQLTask" DTS:ExecutableType="Microsoft.ExecuteSQLTask" DTS:ObjectName="SQL">
+      <DTS:ObjectData><SQLTask:SqlTaskData xmlns:SQLTask="www.microsoft.com/sqlserver/dts/tasks/sqltask" SQLTask:Connection="{AAAA}" SQLTask:SqlStatementSource="EXEC dbo.spX" /></DTS:ObjectData>
+    </DTS:Executable>
+  </DTS:Executables>
+</DTS:Executable>
+'''
+
+
+@pytest.fixture
+def staged(tmp_path):
+    """
+    A project staged the way main.py does it, every file prefixed with its project name.
+    """
+    files = {'HR_Project.params': PARAMS, 'HR_HR_Base.conmgr': CONMGR, 'HR_Load.dtsx': PACKAGE}
+    for name, text in files.items():
+        (tmp_path / name).write_text(text, encoding='utf-8')
+    return {name: str(tmp_path / name) for name in files}
+
+
+def make_resolver(staged):
+    return ParameterResolver([staged['HR_Project.params']], [staged['HR_HR_Base.conmgr']])
+
+
+def rows_by_manager(rows):
+    return {(row['connection_manager'], row['property']): (row['parameter'], row['value']) for row in rows}
+
+
+def test_project_name_and_connection_string():
+    assert project_name(os.path.join('EDW', 'Project.params')) == 'EDW'
+    assert project_name('HR_Project.params') == 'HR'
+    assert parse_connection_string('Server=SRV1; Database=DB;Provider=X') == [
+        ('Data Source', 'SRV1'), ('Initial Catalog', 'DB'), ('Provider', 'X')]
+
+
+def test_resolve_expression_joins_parameters_and_literals(staged):
+    resolver = make_resolver(staged)
+    assert resolver.resolve_expression('@[$Project::pServer] + "\\\\SQL"', 'HR') == 'SRV3\\SQL'
+    assert resolver.resolve_expression('@[$Project::pMissing]', 'HR') is None
+    assert resolver.resolve_expression('@[User::Variable]', 'HR') is None
+
+
+def test_connection_rows_resolve_package_and_project_managers(staged):
+    rows = rows_by_manager(make_resolver(staged).connection_rows(staged['HR_Load.dtsx']))
+    assert rows[('EDW', 'Data Source')] == ('pServer', 'SRV3')
+    assert rows[('EDW', 'Initial Catalog')] == (None, 'EDW')
+    assert rows[('HR_Base', 'Data Source')] == ('pHR_Base', 'SRV1')
+    assert rows[('HR_Base', 'Initial Catalog')] == ('pHR_Base', 'HR_Base')
+
+
+def test_sources_and_catalogs_lists_unused_parameters(staged):
+    df = make_resolver(staged).sources_and_catalogs([staged['HR_Load.dtsx']])
+    unused = df[df['connection_manager'].isna()]
+    assert set(unused['parameter']) == {'pUnused'}
+    assert set(unused['File_path']) == {'HR_Project.params'}
+    assert dict(zip(unused['property'], unused['value'])) == {'Data Source': 'SRV2', 'Initial Catalog': 'Other'}
+    assert set(df.loc[df['connection_manager'].notna(), 'File_path']) == {'HR_Load'}
@@ -0,0 +1,55 @@
+from utils import PrecedenceEdge, build_dependencies, extract_precedence_graph, get_package_inner_execution_order
+
+PACKAGE = '''<?xml version="1.0"?>
+<DTS:Executable xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:refId="Package" DTS:ExecutableType="Microsoft.Package" DTS:ObjectName="Master">
+  <DTS:Executables>
+    <DTS:Executable DTS:refId="Package\\Stage" DTS:ExecutableType="STOCK:SEQUENCE" DTS:ObjectName="Stage">
+      <DTS:Executables>
+        <DTS:Executable DTS:refId="Package\\Stage\\Run A" DTS:ExecutableType="Microsoft.ExecutePackageTask" DTS:ObjectName="Run A" />
+      </DTS:Executables>
+    </DTS:Executable>
+    <DTS:Executable DTS:refId="Package\\Load" DTS:ExecutableType="STOCK:SEQUENCE" DTS:ObjectName="Load">
+      <DTS:Executables>
+        <DTS:Executable DTS:refId="Package\\Load\\Run B" DTS:ExecutableType="Microsoft.ExecutePackageTask" DTS:ObjectName="Run B" />
+      </DTS:Executables>
+    </DTS:Executable>
+    <DTS:Executable DTS:refId="Package\\Audit" DTS:ExecutableType="STOCK:SEQUENCE" DTS:ObjectName="Audit" />
+  </DTS:Executables>
+  <DTS:PrecedenceConstraints>
+    <DTS:PrecedenceConstraint DTS:refId="Package.PrecedenceConstraints[C1]" DTS:From="Package\\Stage" DTS:To="Package\\Load" />
+    <DTS:PrecedenceConstraint DTS:refId="Package.PrecedenceConstraints[C2]" DTS:From="Package\\Stage" DTS:To="Package\\Audit"
+      DTS:Value="1" DTS:EvalOp="1" DTS:Expression="@[User::Fail] == 1" DTS:LogicalAnd="False" />
+    <DTS:PrecedenceConstraint DTS:refId="Package.PrecedenceConstraints[C3]" DTS:From="Package\\Load" DTS:To="Package\\Audit"
+      DTS:Value="2" DTS:EvalOp="3" DTS:Expression="@[User::Rows] &gt; 0" />
+  </DTS:PrecedenceConstraints>
+</DTS:Executable>
+'''
+
+
+def package(tmp_path):
+    path = tmp_path / 'Master.dtsx'
+    path.write_text(PACKAGE)
+    return str(path)
+
+
+def test_precedence_graph_labels_values_and_eval_ops(tmp_path):
+    graph = extract_precedence_graph(package(tmp_path))
+    assert graph['successors']['Package\\Stage'] == [
+        PrecedenceEdge('Package\\Stage', 'Package\\Load', 'Success', 'Constraint', None, True),
+        PrecedenceEdge('Package\\Stage', 'Package\\Audit', 'Failure', 'Expression', '@[User::Fail] == 1', False),
+    ]
+    assert graph['predecessors']['Package\\Audit'][1] == PrecedenceEdge(
+        'Package\\Load', 'Package\\Audit', 'Completion', 'ExpressionAndConstraint', '@[User::Rows] > 0', True)
+
+
+def test_inner_execution_order(tmp_path):
+    assert get_package_inner_execution_order(package(tmp_path)) == {
+        'Package\\Load': ['Package\\Stage'], 'Package\\Audit': ['Package\\Stage', 'Package\\Load']}
+
+
+def test_build_dependencies_nests_containers_and_their_constraints(tmp_path):
+    stage, load, audit = build_dependencies(package(tmp_path))['Master']
+    assert stage == {'activity_name': 'Package\\Stage', 'depends_on': None, 'constraints': [], 'elements': ['Run A']}
+    assert load['depends_on'] == ['Package\\Stage']
+    assert load['elements'] == ['Run B']
+    assert [constraint['eval_op'] for constraint in audit['constraints']] == ['Expression', 'ExpressionAndConstraint']
@@ -0,0 +1,41 @@
+from refscan import PackageReference, scan_bytes
+
+PACKAGE = '''<?xml version="1.0"?>
+<DTS:Executable xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:refId="Package" DTS:ObjectName="Master">
+  <DTS:ConnectionManagers>
+    <DTS:ConnectionManager DTS:refId="Package.ConnectionManagers[Child.dtsx]" DTS:DTSID="{1111}" DTS:ObjectName="Child.dtsx" DTS:CreationName="FILE">
+      <DTS:ObjectData><DTS:ConnectionManager DTS:ConnectionString="C:\\SSIS\\EDW\\Child.dtsx" /></DTS:ObjectData>
+    </DTS:ConnectionManager>
+  </DTS:ConnectionManagers>
+  <DTS:Executables>
+    <DTS:Executable DTS:refId="Package\\Run Load" DTS:ObjectName="Run Load &amp; Check">
+      <DTS:ObjectData><ExecutePackageTask><UseProjectReference>True</UseProjectReference><PackageName>LoadDim.dtsx</PackageName></ExecutePackageTask></DTS:ObjectData>
+    </DTS:Executable>
+    <DTS:Executable DTS:refId="Package\\Run Child" DTS:ObjectName="Run Child">
+      <DTS:ObjectData><ExecutePackageTask><Connection>{1111}</Connection></ExecutePackageTask></DTS:ObjectData>
+    </DTS:Executable>
+  </DTS:Executables>
+</DTS:Executable>
+'''
+
+
+def test_scan_bytes_reads_project_and_file_references():
+    assert scan_bytes(PACKAGE.encode('utf-8')) == [
+        PackageReference('Run Load & Check', 'project', 'LoadDim.dtsx', None, None, None),
+        PackageReference('Run Child', 'connection', 'Child.dtsx', 'Child.dtsx', 'FILE', 'C:\\SSIS\\EDW\\Child.dtsx'),
+    ]
+
+
+def test_scan_bytes_decodes_utf16_packages():
+    assert scan_bytes(PACKAGE.encode('utf-16')) == scan_bytes(PACKAGE.encode('utf-8'))
+
+
+def test_scan_bytes_without_tasks():
+    assert scan_bytes(b'<DTS:Executable DTS:ObjectName="Empty" />') == []
+
+
+def test_scan_bytes_reads_attributes_on_the_lines_after_the_tag():
+    package = PACKAGE.replace('<DTS:Executable DTS:refId="Package\\Run Child" DTS:ObjectName="Run Child">',
+                              '<DTS:Executable\r\n      DTS:refId="Package\\Run Child"\r\n      DTS:ObjectName="Run Child">')
+    assert package != PACKAGE
+    assert [reference.task for reference in scan_bytes(package.encode('utf-8'))] == ['Run Load & Check', 'Run Child']
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import tarfile
+import threading
+import pytest
+from stages import StageRunner
+from staging import StagingView
+from synthetic import EstateGenerator
+
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def runner_with_calls(tmp_path, files=()):
+    runner = StageRunner(str(tmp_path / 'state.json'))
+    calls = []
+    output = str(tmp_path / 'total.txt')
+
+    def load_source():
+        calls.append('source')
+        return [1, 2, 3]
+
+    def total(values):
+        calls.append('total')
+        with open(output, 'w') as f:
+            f.write(str(sum(values)))
+        return sum(values)
+
+    runner.add('source', load_source, files=files, outputs=[])
+    runner.add('total', total, deps=['source'], outputs=[output], load=lambda: int(open(output).read()))
+    return runner, calls
+
+
+def test_up_to_date_stages_are_skipped_and_loaded(tmp_path):
+    runner, calls = runner_with_calls(tmp_path)
+    assert runner.run() == {'source': 'ran', 'total': 'ran'}
+    runner, calls = runner_with_calls(tmp_path)
+    assert runner.run() == {'source': 'skipped', 'total': 'skipped'}
+    assert calls == []
+    assert runner.result('total') == 6
+    assert runner.run(force=True) == {'source': 'ran', 'total': 'ran'}
+
+
+def test_a_changed_input_reruns_the_stage_and_everything_below(tmp_path):
+    source = tmp_path / 'input.params'
+    source.write_text('a')
+    runner, _ = runner_with_calls(tmp_path, files=[str(source)])
+    runner.run()
+    source.write_text('ab')
+    runner, calls = runner_with_calls(tmp_path, files=[str(source)])
+    assert runner.run() == {'source': 'ran', 'total': 'ran'}
+    assert calls == ['source', 'total']
+
+
+def test_virtually_staged_inputs_are_fingerprinted_through_their_source(tmp_path):
+    source = tmp_path / 'Project.params'
+    source.write_text('a')
+    staged_dir = tmp_path / 'Sources_and_catalogs'
+    staged_dir.mkdir()
+    view = StagingView(str(staged_dir))
+    view.add('EDW_Project.params', str(source))
+    view.save()
+    staged = [str(staged_dir / 'EDW_Project.params')]
+
+    runner, _ = runner_with_calls(tmp_path, files=staged)
+    assert runner.run() == {'source': 'ran', 'total': 'ran'}
+    runner, _ = runner_with_calls(tmp_path, files=staged)
+    assert runner.run() == {'source': 'skipped', 'total': 'skipped'}
+    source.write_text('ab')
+    runner, _ = runner_with_calls(tmp_path, files=staged)
+    assert runner.run()['source'] == 'ran'
+
+
+def test_provided_results_are_not_executed(tmp_path):
+    runner, calls = runner_with_calls(tmp_path)
+    runner.provide('source', [10, 20])
+    runner.run()
+    assert calls == ['total']
+    assert runner.result('total') == 30
+
+
+def test_independent_stages_run_in_parallel(tmp_path):
+    runner = StageRunner(str(tmp_path / 'state.json'), workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    runner.add('left', lambda: barrier.wait())
+    runner.add('right', lambda: barrier.wait())
+    assert runner.run() == {'left': 'ran', 'right': 'ran'}
+
+
+@pytest.mark.parametrize('source', ['bing', 'bing.tar.gz'])
+def test_analysis_runs_over_a_virtually_staged_tree(tmp_path, source):
+    EstateGenerator(packages=12, projects=4).generate(str(tmp_path / 'bing'))
+    if source != 'bing':
+        with tarfile.open(str(tmp_path / source), 'w:gz') as archive:
+            archive.add(str(tmp_path / 'bing'), arcname='bing')
+
+    def cli(*args):
+        command = [sys.executable, 'cli.py', '--root', str(tmp_path), '--source', source, *args]
+        return subprocess.run(command, cwd=MODULE_DIR, capture_output=True, text=True, check=True).stdout
+
+    assert '13 stages ran, 0 up to date' in cli('all', '--staging', 'virtual')
+    assert not any(entry.name.endswith('.params') for entry in os.scandir(str(tmp_path / 'Sources_and_catalogs')))
+    assert '0 stages ran, 13 up to date' in cli('analyze')
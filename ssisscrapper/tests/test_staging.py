@@ -0,0 +1,71 @@
+import os
+import pytest
+from main import extract_changed_files
+from manifest import Manifest
+from SSISModule import SSISDiscovery
+from staging import is_up_to_date, resolve, stage_file, staged_files, staged_source, unstage, StagingView
+
+
+def source_tree(tmp_path, files):
+    for name, text in files.items():
+        path = tmp_path / 'src' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    target = tmp_path / 'dtsx'
+    target.mkdir(exist_ok=True)
+    return str(tmp_path / 'src'), str(target)
+
+
+@pytest.mark.parametrize('mode', ['copy', 'hardlink', 'symlink', 'auto'])
+def test_stage_file_and_is_up_to_date(tmp_path, mode):
+    source = tmp_path / 'Load.dtsx'
+    source.write_text('<Package/>')
+    target = str(tmp_path / 'Staged.dtsx')
+    assert not is_up_to_date(str(source), target, mode)
+    used = stage_file(str(source), target, mode)
+    assert used in {'auto': ('hardlink', 'reflink', 'copy')}.get(mode, (mode, 'copy'))
+    assert open(target).read() == '<Package/>'
+    assert is_up_to_date(str(source), target, mode)
+    assert (staged_source(target) is not None) == (used == 'symlink')
+
+
+def test_virtual_view_resolves_staged_names(tmp_path):
+    source = tmp_path / 'Load.dtsx'
+    source.write_text('<Package/>')
+    target_dir = tmp_path / 'dtsx'
+    target_dir.mkdir()
+    view = StagingView(str(target_dir))
+    view.add('Project_Load.dtsx', str(source))
+    view.save()
+
+    staged = str(target_dir / 'Project_Load.dtsx')
+    assert not os.path.exists(staged)
+    assert staged_files(str(target_dir), '.dtsx') == [staged]
+    assert resolve(staged) == str(source)
+    assert staged_source(staged) == str(source)
+    unstage(staged)
+    assert staged_files(str(target_dir)) == []
+    assert resolve(staged) == staged
+
+
+@pytest.mark.parametrize('mode', ['auto', 'copy', 'virtual'])
+def test_a_new_file_never_takes_the_name_of_an_unchanged_one(tmp_path, mode):
+    source, target = source_tree(tmp_path, {'ProjA/Load.dtsx': 'A'})
+    manifest_path = str(tmp_path / 'dtsx.json')
+
+    def run():
+        discovery = SSISDiscovery(source, valid_dirs=['Proj'], file_extension='.dtsx')
+        extract_changed_files(discovery, target, Manifest(manifest_path), add_prefix=False, mode=mode)
+        return discovery
+
+    run()
+    source_tree(tmp_path, {'ProjB/Load.dtsx': 'B'})
+    discovery = run()
+    staged = os.path.join(target, 'Load.dtsx')
+    assert [rejected for _, _, rejected in discovery.collisions] == [os.path.join(source, 'ProjB', 'Load.dtsx')]
+    assert open(resolve(staged)).read() == 'A'
+
+    # once the owner is deleted the name is free, and the rejected file is staged on the next run
+    os.remove(os.path.join(source, 'ProjA', 'Load.dtsx'))
+    run()
+    assert open(resolve(staged)).read() == 'B'
@@ -0,0 +1,44 @@
+import glob
+import io
+import os
+import pytest
+from SSISModule import SSISMigrator
+from synthetic import EstateGenerator
+
+
+class CountingReader(io.BytesIO):
+    """
+    Remembers the furthest position read, to tell when the parser has seen the whole file.
+    """
+    furthest = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.furthest = self.tell()
+        return data
+
+
+@pytest.fixture
+def packages(tmp_path):
+    EstateGenerator(packages=6, projects=1, depth=3, fanout=2).generate(str(tmp_path))
+    return sorted(glob.glob(os.path.join(str(tmp_path), '**', '*.dtsx'), recursive=True))
+
+
+def test_streaming_rows_match_get_df(packages):
+    migrator = SSISMigrator()
+    for file_path in packages:
+        expected = migrator.get_df(migrator.parse_xml_file(file_path)).fillna('').to_dict('records')
+        assert migrator.get_df_streaming(file_path).fillna('').to_dict('records') == expected
+
+
+def test_streaming_yields_rows_before_the_end_of_the_file():
+    xml = EstateGenerator(depth=7, components=6).package_xml('Big', [])
+    source = CountingReader(xml.encode('utf-8'))
+    rows = SSISMigrator()._stream_executable_types(source)
+    first = next(rows)
+    assert first['RefId'] == 'Package'
+    assert source.furthest < len(xml)
+    # the first task row is complete long before the last container closes
+    while first['ExecutableType'] != 'Microsoft.ExecuteSQLTask':
+        first = next(rows)
+    assert source.furthest < len(xml)
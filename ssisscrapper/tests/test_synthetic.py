@@ -0,0 +1,33 @@
+import glob
+import os
+import re
+from synthetic import EstateGenerator, procedure_name
+
+# the extraction analyzer.py and catalog.py apply to EXEC statements
+PROCEDURE_REGEX = re.compile('(sp[a-zA-Z_]+)', re.IGNORECASE)
+
+
+def test_procedure_names_survive_the_extraction():
+    names = [procedure_name(k) for k in range(800)]
+    assert names[:3] == ['spLoad_A', 'spLoad_B', 'spLoad_C']
+    assert procedure_name(26) == 'spLoad_AA'
+    assert [PROCEDURE_REGEX.search(f'EXEC dbo.{name} ?').group(1) for name in names] == names
+    assert len(set(names)) == len(names)
+
+
+def test_summary_describes_the_written_files(tmp_path):
+    summary = EstateGenerator(packages=24, projects=2, depth=2, fanout=5).generate(str(tmp_path))
+    packages = glob.glob(os.path.join(str(tmp_path), 'BING SSIS', '**', '*.dtsx'), recursive=True)
+    procedures = glob.glob(os.path.join(str(tmp_path), 'BING DB', 'Stored Procedures', '*.sql'))
+    calls = 0
+    for file_path in packages:
+        with open(file_path) as f:
+            calls += f.read().count('<PackageName>')
+    assert summary['packages'] == len(packages) == 24
+    assert summary['package_calls'] == calls > 0
+    assert summary['stored_procedures'] == len(procedures)
+
+
+def test_zero_columns_still_builds_a_data_flow():
+    xml = EstateGenerator(columns=0, depth=1).package_xml('Load', [])
+    assert '<outputColumn ' in xml
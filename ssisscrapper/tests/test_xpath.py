@@ -0,0 +1,57 @@
+from utils import extract_values
+from xpath import COMPONENT_PROPERTIES, PARAMETER_VALUES, ExtractionEngine, ResultBuilder, XPathPattern
+
+PACKAGE = '''<?xml version="1.0"?>
+<DTS:Executable xmlns:DTS="www.microsoft.com/SqlServer/Dts" DTS:ObjectName="Load">
+  <DTS:Executables>
+    <DTS:Executable DTS:ObjectName="SQL">
+      <DTS:ObjectData><SQLTask:SqlTaskData xmlns:SQLTask="www.microsoft.com/sqlserver/dts/tasks/sqltask" SQLTask:SqlStatementSource="EXEC dbo.spLoad" /></DTS:ObjectData>
+    </DTS:Executable>
+    <DTS:Executable DTS:ObjectName="DFT">
+      <DTS:ObjectData><pipeline><components>
+        <component name="SRC"><properties><property name="SqlCommand">SELECT Id FROM dbo.Stage</property><property name="OpenRowset"></property></properties></component>
+      </components></pipeline></DTS:ObjectData>
+    </DTS:Executable>
+  </DTS:Executables>
+</DTS:Executable>
+'''
+
+PARAMS = '''<?xml version="1.0"?>
+<SSIS:Parameters xmlns:SSIS="www.microsoft.com/SqlServer/SSIS">
+  <SSIS:Parameter SSIS:Name="pEDW"><SSIS:Properties>
+    <SSIS:Property SSIS:Name="ID">1</SSIS:Property><SSIS:Property SSIS:Name="CreationName" /><SSIS:Property SSIS:Name="Description" />
+    <SSIS:Property SSIS:Name="IncludeInDebugDump">0</SSIS:Property><SSIS:Property SSIS:Name="Required">0</SSIS:Property>
+    <SSIS:Property SSIS:Name="Sensitive">0</SSIS:Property><SSIS:Property SSIS:Name="Value">Data Source=SRV;Initial Catalog=EDW</SSIS:Property>
+  </SSIS:Properties></SSIS:Parameter>
+</SSIS:Parameters>
+'''
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_every_pattern_runs_on_one_parse(tmp_path):
+    package = write(tmp_path, 'Load.dtsx', PACKAGE)
+    engine = ExtractionEngine([('sql', '//SQLTask:SqlTaskData/@SQLTask:SqlStatementSource'), ('components', COMPONENT_PROPERTIES)])
+    results = engine.run([package, package])
+    assert results['sql'].to_dict('records') == [{'File_path': package.split('\\')[-1].replace('.dtsx', ''), 'SqlTaskData': 'EXEC dbo.spLoad'}] * 2
+    assert results['components']['SqlTaskData'].tolist() == ['SELECT Id FROM dbo.Stage'] * 2
+    timings = engine.timings().set_index('step')
+    assert timings.loc['parse', 'matches'] == 2
+    assert timings.loc['sql', 'matches'] == 2
+
+
+def test_split_values_spread_into_columns(tmp_path):
+    params = write(tmp_path, 'Project.params', PARAMS)
+    df = extract_values([params], PARAMETER_VALUES, split_values=True)
+    assert df[['value_1', 'value_2']].values.tolist() == [['Data Source=SRV', 'Initial Catalog=EDW']]
+
+
+def test_add_prefix_names_rows_after_the_parent_folder():
+    builder = ResultBuilder(XPathPattern('values', COMPONENT_PROPERTIES, add_prefix=True))
+    builder.add('C:\\bing\\StagingToEDW\\Load.dtsx', ['SELECT 1'])
+    builder.add('C:\\bing\\StagingToEDW\\Empty.dtsx', [])
+    assert builder.frame().to_dict('records') == [{'File_path': 'StagingToEDW_Load', 'SqlTaskData': 'SELECT 1'}]
@@ -1,11 +1,10 @@
 #%%
 import os
-import re
-import bs4 as bs
-import lxml
-import lxml.etree
-import pandas as pd
-from lxml import etree
+from collections import namedtuple
+from cache import get_document
+from sqlrefs import extract_references
+from refscan import child_packages
+from profiling import profiled
 
 def create_directories(dirs:list, path:str) -> None: 
     for directory in dirs:
@@ -13,6 +12,84 @@ def create_directories(dirs:list, path:str) -> None:
         if not os.path.exists(dir_to_create):  # Check if the directory exists
             os.makedirs(dir_to_create)  # Create the directory if it does not exist
 
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+@profiled('write_frame', 'file_path')
+def write_frame(df, file_path, output_format:str='csv', index:bool=False) -> None:
+    """
+    Writes a DataFrame as CSV, Parquet or Arrow IPC (Feather v2). Columnar formats need pyarrow.
+
+    Args:
+        df (pd.DataFrame): the frame to write.
+        file_path (str): the target file, including its extension.
+        output_format (str): one of OUTPUT_FORMATS.
+        index (bool): whether to keep the DataFrame index as a column.
+    """
+    if output_format == 'csv':
+        df.to_csv(file_path, index=index)
+    elif output_format == 'parquet':
+        df.to_parquet(file_path, index=index, row_group_size=64 * 1024)
+    elif output_format == 'arrow':
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=index), file_path)
+    else:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {list(OUTPUT_FORMATS)}")
+
+@profiled('read_frame')
+def read_frame(file_paths, columns:list=None, filters:list=None) -> 'pd.DataFrame':
+    """
+    Reads one or more files written by write_frame into a single DataFrame. The format is taken from the extension.
+
+    For Parquet and Arrow IPC only the requested columns are read, and filters are pushed down to the scan in
+    pyarrow's format, e.g. [('ExecutableType', '==', 'Microsoft.Pipeline')], so row groups and files whose
+    statistics cannot match are skipped. CSV files are read whole and filtered afterwards.
+
+    Args:
+        file_paths (str or list): a file, a list of files of the same format, or a directory of Parquet/Arrow files.
+        columns (list, optional): the columns to load.
+        filters (list, optional): (column, op, value) predicates, all of which must hold.
+
+    Returns:
+        pd.DataFrame: the combined rows.
+    """
+    import pandas as pd
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    source = file_paths
+    if len(file_paths) == 1 and os.path.isdir(file_paths[0]):
+        source = file_paths[0]
+        file_paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+    extension = os.path.splitext(file_paths[0])[1] if file_paths else '.csv'
+
+    if extension in ('.parquet', '.arrow'):
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        dataset = ds.dataset(source, format='ipc' if extension == '.arrow' else 'parquet')
+        expression = pq.filters_to_expression(filters) if filters else None
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + [column for column, _, _ in filters or []]))
+    df = pd.concat([pd.read_csv(file_path, usecols=usecols) for file_path in file_paths], ignore_index=True) if file_paths else pd.DataFrame(columns=columns)
+    return filter_frame(df, columns, filters)
+
+def filter_frame(df, columns:list=None, filters:list=None) -> 'pd.DataFrame':
+    """
+    Applies read_frame's column projection and (column, op, value) filters to an in-memory DataFrame.
+    """
+    for column, op, value in filters or []:
+        if op in ('==', '='):
+            df = df[df[column] == value]
+        elif op == '!=':
+            df = df[df[column] != value]
+        elif op == 'in':
+            df = df[df[column].isin(value)]
+        elif op == 'not in':
+            df = df[~df[column].isin(value)]
+        else:
+            df = df.query(f"`{column}` {op} @value")
+    return df if columns is None else df[columns]
+
 def mapping_out(file_path, map_dict, visited=None):
     if visited is None:
         visited = set()
@@ -22,11 +99,8 @@ def mapping_out(file_path, map_dict, visited=None):
         return None
     visited.add(file_path)
 
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Extract with this pattern <PackageName>(.*?)<\/PackageName> all the matches
-    matches = re.findall('<PackageName>(.*?)<\/PackageName>', content)
+    # Child packages of the ExecutePackageTasks, scanned from the raw bytes of the file
+    matches = child_packages(file_path)
     if len(matches) > 0:
         dtsxs_path = os.path.dirname(file_path)
         for match in matches:
@@ -44,9 +118,11 @@ def mapping_out(file_path, map_dict, visited=None):
 
     return map_dict
 
+@profiled('dependencies', 'file_path')
 def dependencies(file_path):
     """
     Extracts the package names from an SSIS file and returns a list of file paths for the dependent packages.
+    Project references and file connection references are both followed, see refscan.scan_references.
 
     Args:
         file_path (str): The path to the SSIS file.
@@ -55,10 +131,7 @@ def dependencies(file_path):
         list: A list of file paths for the dependent packages.
 
     """
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    matches = re.findall('<PackageName>(.*?)<\/PackageName>', content)
+    matches = child_packages(file_path)
 
     dir_name = os.path.dirname(file_path)
     matches = [os.path.join(dir_name, match) for match in matches]  # Assuming '.dtsx' needs to be appended
@@ -105,62 +178,41 @@ def collect_keys_values(json_obj, keys=set(), values=set()):
     return keys | values
 
 
-def process_map_dict(map_dict):
-    """
-    Process a dictionary of mappings and returns a new dictionary with dependencies.
-
-    Args:
-        map_dict (dict): A dictionary containing mappings.
-
-    Returns:
-        tuple: A tuple containing the new dependency dictionary and a list of iterated keys.
-
-    Example:
-        >>> map_dict = {'A': ['B', 'C'], 'B': ['D'], 'C': ['E']}
-        >>> process_map_dict(map_dict)
-        ({'A': {'B': ['D'], 'C': ['E']}, 'B': {'D': []}, 'C': {'E': []}}, ['B', 'C', 'D', 'E'])
-    """
-    # Function implementation goes here
-    map_dict = {k: v for k, v in sorted(map_dict.items(), key=lambda item: len(item[1]) if item[1] is not None else 0, reverse=True)}
-    iterated_keys = []
-    new_dep_dict = {}
-    for key, value in map_dict.items():
-        # print(f"{key} : {value}")
-        if key not in iterated_keys:
-            if value:
-                for v in value:
-                    # print(f"    {v}")
-                    if key not in new_dep_dict:
-                        new_dep_dict[key] = {v: map_dict[v]}
-                    else:
-                        new_dep_dict[key].update({v: map_dict[v]})
-                    iterated_keys.append(v)
-            else:
-                new_dep_dict[key] = None
-        else:
-            new_dep_dict[key] = None
-    return new_dep_dict, iterated_keys
+PrecedenceEdge = namedtuple('PrecedenceEdge', ['source', 'target', 'value', 'eval_op', 'expression', 'logical_and'])
 
-def clean_dep_dict(new_dep_dict, iterated_keys):
-    """
-    Removes specified keys from the dependency dictionary and returns a new dictionary.
+PRECEDENCE_VALUES = {'0': 'Success', '1': 'Failure', '2': 'Completion'}
+# DTSPrecedenceEvalOp; an absent EvalOp attribute means a plain constraint
+PRECEDENCE_EVAL_OPS = {'1': 'Expression', '2': 'Constraint', '3': 'ExpressionAndConstraint', '4': 'ExpressionOrConstraint'}
 
+def extract_precedence_graph(file_path):
+    '''
+    Extracts every precedence constraint of a SSIS package in a single namespace-aware pass over its parsed tree.
+    
     Args:
-        new_dep_dict (dict): The dependency dictionary to clean.
-        iterated_keys (iterable): The keys to remove from the dictionary.
-
+        file_path (string): local path to the SSIS package.
+        
     Returns:
-        dict: A new dictionary with the specified keys removed.
-
-    Example:
-        >>> dep_dict = {'A': [1, 2, 3], 'B': [4, 5, 6], 'C': [7, 8, 9]}
-        >>> keys_to_remove = ['A', 'C']
-        >>> clean_dep_dict(dep_dict, keys_to_remove)
-        {'B': [4, 5, 6]}
-    """
-    for key in set(iterated_keys):
-        new_dep_dict.pop(key, None)  # Use pop with None as default to avoid KeyError
-    return {k: v for k, v in sorted(new_dep_dict.items(), key=lambda item: len(item[1]) if item[1] is not None else 0, reverse=True)}
+        graph (dict): 'successors' maps each activity refId to the edges leaving it and 'predecessors' maps each
+        activity refId to the edges entering it. Edges are PrecedenceEdge tuples carrying the constraint value
+        (Success/Failure/Completion), evaluation operation, expression and whether it is combined with a logical AND.
+    '''
+    def build(doc):
+        prefix='{www.microsoft.com/SqlServer/Dts}'
+        graph = {'successors': {}, 'predecessors': {}}
+        for constraint in doc.tree.iter(f'{prefix}PrecedenceConstraint'):
+            attrib = constraint.attrib
+            edge = PrecedenceEdge(
+                attrib.get(f'{prefix}From'),
+                attrib.get(f'{prefix}To'),
+                PRECEDENCE_VALUES.get(attrib.get(f'{prefix}Value', '0'), attrib.get(f'{prefix}Value')),
+                PRECEDENCE_EVAL_OPS.get(attrib.get(f'{prefix}EvalOp', '2'), attrib.get(f'{prefix}EvalOp')),
+                attrib.get(f'{prefix}Expression'),
+                attrib.get(f'{prefix}LogicalAnd', 'True').lower() != 'false')
+            graph['successors'].setdefault(edge.source, []).append(edge)
+            graph['predecessors'].setdefault(edge.target, []).append(edge)
+        return graph
+
+    return get_document(file_path).derived('precedence_graph', build)
 
 def get_package_inner_execution_order(file_path):
     '''
@@ -170,21 +222,10 @@ def get_package_inner_execution_order(file_path):
         file_path (string): local path to the SSIS package.
         
     Returns:
-        inner_dependencies (dict): dictionary containing the precedence order of the activities.
+        inner_dependencies (dict): dictionary mapping each activity to the list of every activity it depends on.
     '''
-    with open(file_path, 'r') as file:
-        content = file.read()
-    
-    soup = bs.BeautifulSoup(content, 'lxml')
-
-    inner_dependencies = {}
-
-    for i in soup.find_all('DTS:PrecedenceConstraints'.lower()):
-            for x in i.findChildren():
-                    # print(f"from: {x.attrs.get('dts:from')} to {x.attrs.get('dts:to')}")
-                    inner_dependencies[x.attrs.get('dts:to')] = x.attrs.get('dts:from')
-
-    return inner_dependencies
+    predecessors = extract_precedence_graph(file_path)['predecessors']
+    return {target: [edge.source for edge in edges] for target, edges in predecessors.items()}
 
 def extract_activities(container, inner_dependencies):
     '''
@@ -192,26 +233,32 @@ def extract_activities(container, inner_dependencies):
     
     Args:
         container (lxml.etree._Element): a STOCK:SEQUENCE SSIS activity that contains other activities within it, be it package execution tasks or more container activities.
-        inner_dependencies (dict): the precedence order of the activities within the original container.
+        inner_dependencies (dict): the precedence graph of the original package, as returned by extract_precedence_graph.
         
     Returns:
-        pack_dict (dict): a dictionary containing the activity name, what it depends on to run, and the elements contained within the container. Elements may be the packages invoked, or inner containers.
+        pack_dict (dict): a dictionary containing the activity name, what it depends on to run, the constraints on those dependencies, and the elements contained within the container. Elements may be the packages invoked, or inner containers.
     '''
     prefix='{www.microsoft.com/SqlServer/Dts}'
     
-    activities = container.findall(f'{prefix}Executables')[0].getchildren()
+    edges = inner_dependencies['predecessors'].get(container.attrib[f'{prefix}refId'], [])
     pack_dict = {
         'activity_name' : container.attrib[f'{prefix}refId'],
-        'depends_on' : inner_dependencies.get(container.attrib[f'{prefix}refId'], None),
+        'depends_on' : [edge.source for edge in edges] or None,
+        'constraints' : [{'from': edge.source, 'value': edge.value, 'eval_op': edge.eval_op, 'expression': edge.expression, 'logical_and': edge.logical_and} for edge in edges],
         'elements' : []}
-    for act in activities:
-        if act.attrib[f'{prefix}ExecutableType'] == 'Microsoft.ExecutePackageTask':
-            pack_dict['elements'].append(act.attrib[f'{prefix}ObjectName'])
-        elif act.attrib[f'{prefix}ExecutableType'] == 'STOCK:SEQUENCE':
-            pack_dict['elements'].append(extract_activities(act, inner_dependencies))
+    
+    if len(container.findall(f'{prefix}Executables')) > 0:
+        activities = container.findall(f'{prefix}Executables')[0].getchildren()
+
+        for act in activities:
+            if act.attrib[f'{prefix}ExecutableType'] == 'Microsoft.ExecutePackageTask':
+                pack_dict['elements'].append(act.attrib[f'{prefix}ObjectName'])
+            elif act.attrib[f'{prefix}ExecutableType'] == 'STOCK:SEQUENCE':
+                pack_dict['elements'].append(extract_activities(act, inner_dependencies))
     
     return pack_dict
 
+@profiled('build_dependencies', 'file_path')
 def build_dependencies(file_path):
     '''
     Given the file path pointing to a parent SSIS package, it builds the dependencies and relationships of the packages contained within the parent one.
@@ -222,12 +269,12 @@ def build_dependencies(file_path):
     Returns:
         pack_dependencies (dict): dictionary in which the key is the parent package name, and it's value is the composition of the activities' dependencies and relations.
     '''
-    tree = lxml.etree.parse(file_path)
+    tree = get_document(file_path).tree
     prefix='{www.microsoft.com/SqlServer/Dts}'
     root = tree.getroot()
     
     pack_dependencies = {root.attrib[f'{prefix}ObjectName'] : []}
-    inner_order = get_package_inner_execution_order(file_path)
+    inner_order = extract_precedence_graph(file_path)
     
     cajas = root.findall(f'{prefix}Executables')[0].getchildren()
     
@@ -236,178 +283,54 @@ def build_dependencies(file_path):
     
     return pack_dependencies
 
-def extract_sql_data(input_df, columns_to_keep:list=['File_path', 'Extracted', 'db']):
-    regex = "FROM\\s+[ _@A-Za-z0-9.\\[\\]]+|join[ _A-Za-z0-9.\\[\\]]+|insert\\s+into\\s+[ _@A-Za-z0-9.\\[\\]]+|declare[ _@A-Za-z0-9.\\[\\]]+|update\\s+[ _@A-Za-z0-9.\[\]]+"
-    # Filter rows based on the presence of SQL keywords and patterns
-    filtered_df = input_df[input_df['SqlTaskData'].str.contains(regex, case=False, na=False)]
-    
-    # Extract all matches of SQL keywords and patterns
-    matches_df = filtered_df['SqlTaskData'].str.extractall(f'({regex})', flags=re.IGNORECASE)
-    matches_df = matches_df.astype(str)
-    
-    # Aggregate matches and split; then explode to separate rows
-    filtered_df['Extracted'] = matches_df.groupby(level=0).agg('; '.join)
-    filtered_df['Extracted'] = filtered_df['Extracted'].str.split('; ')
-    exploded_df = filtered_df.explode('Extracted')
-    
-    # Extract database names, fill missing values with "No db found"
-    exploded_df['db'] = exploded_df['Extracted'].str.extract('([a-zA-Z0-9_\\[\\]]+)\\.', flags=re.IGNORECASE).fillna("No db found")
-    
-    # Select specific columns and remove duplicates
-    final_df = exploded_df[columns_to_keep].drop_duplicates()
-    
-    return final_df
-
-def extract_values(all_files_path, pattern, split_values=False, add_prefix:bool=False) -> pd.DataFrame:
+@profiled('extract_sql_data')
+def extract_sql_data(input_df, columns_to_keep:list=['File_path', 'Extracted', 'db'], workers:int=1):
     """
-    Extracts values from XML files based on a given pattern. Can optionally split values and save them to a CSV file.
+    Extracts the objects referenced by the SQL in the SqlTaskData column, one row per reference.
 
-    Parameters:
-    - all_files_path: List of paths to the XML files.
-    - pattern: XPath pattern to extract values.
-    - split_values: Boolean indicating whether to split the extracted values by ';'.
+    Each statement is tokenized once (comments and string literals are skipped) by sqlrefs.iter_sql_references and
+    the output frame is built once at the end. Besides the input columns, the available columns are 'Extracted'
+    (role and object, e.g. "FROM BING_EDW.dbo.DimDate"), 'role', 'object', 'db' ("No db found" unless the name is
+    database-qualified) and 'schema'.
+
+    Args:
+        input_df (pd.DataFrame): frame with a SqlTaskData column.
+        columns_to_keep (list): columns of the result, which is deduplicated on them.
+        workers (int): number of processes used to tokenize the statements in parallel chunks.
 
     Returns:
-    - A pandas DataFrame with the extracted values.
+        pd.DataFrame: the extracted references.
     """
-    results = []
-    max_split_values = 0
-
-    for file_path in all_files_path:
-        tree = etree.parse(file_path)
-        values = tree.xpath(pattern)
-
-        for value in values:
-            file_path = '_'.join(file_path.split('\\')[-2:]) if add_prefix else file_path.split('\\')[-1]
-            result_dict = {"File_path": file_path.replace('.dtsx', '')}
-            if split_values and len(value) > 0:
-                split_values_list = value.split(';')
-                # Update max_split_values if the current list is longer
-                max_split_values = max(max_split_values, len(split_values_list))
-                for i, split_value in enumerate(split_values_list):
-                    result_dict[f"value_{i+1}"] = split_value
-            else:
-                result_dict["SqlTaskData"] = value
-            results.append(result_dict)
-
-    df = pd.DataFrame(results)
-
-    # If split_values was used, ensure all expected columns are present
-    if split_values:
-        for i in range(1, max_split_values + 1):
-            if f"value_{i}" not in df.columns:
-                df[f"value_{i}"] = None
-
-    return df
-
-def get_package_inner_execution_order(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-    
-    soup = bs.BeautifulSoup(content, 'lxml')
-
-    inner_dependencies = {}
-
-    for i in soup.find_all('DTS:PrecedenceConstraints'.lower()):
-            for x in i.findChildren():
-                    # print(f"from: {x.attrs.get('dts:from')} to {x.attrs.get('dts:to')}")
-                    inner_dependencies[x.attrs.get('dts:to')] = x.attrs.get('dts:from')
-
-    return inner_dependencies
-
-def extract_activities(container, inner_dependencies):
-    prefix='{www.microsoft.com/SqlServer/Dts}'
-    
-    pack_dict = {
-        'activity_name' : container.attrib[f'{prefix}refId'],
-        'depends_on' : inner_dependencies.get(container.attrib[f'{prefix}refId'], None),
-        'elements' : []}
-    
-    if len(container.findall(f'{prefix}Executables')) > 0:
-        activities = container.findall(f'{prefix}Executables')[0].getchildren()
-
-        for act in activities:
-            if act.attrib[f'{prefix}ExecutableType'] == 'Microsoft.ExecutePackageTask':
-                pack_dict['elements'].append(act.attrib[f'{prefix}ObjectName'])
-            elif act.attrib[f'{prefix}ExecutableType'] == 'STOCK:SEQUENCE':
-                pack_dict['elements'].append(extract_activities(act, inner_dependencies))
-    
-    return pack_dict
+    rows = input_df[input_df['SqlTaskData'].notna()]
+    references = extract_references(rows['SqlTaskData'].astype(str).tolist(), workers=workers)
+
+    positions = [reference[0] for reference in references]
+    final_df = rows[[column for column in columns_to_keep if column in rows.columns]].iloc[positions]
+    final_df = final_df.assign(
+        Extracted=[f"{reference[2]} {reference[1]}" for reference in references],
+        object=[reference[1] for reference in references],
+        role=[reference[2] for reference in references],
+        db=[reference[3] or "No db found" for reference in references],
+        schema=[reference[4] for reference in references])
 
-def build_dependencies(file_path):
-    tree = lxml.etree.parse(file_path)
-    prefix='{www.microsoft.com/SqlServer/Dts}'
-    root = tree.getroot()
-    
-    pack_dependencies = {root.attrib[f'{prefix}ObjectName'] : []}
-    inner_order = get_package_inner_execution_order(file_path)
-    
-    cajas = root.findall(f'{prefix}Executables')[0].getchildren()
-    
-    for caja in cajas:
-        pack_dependencies[root.attrib[f'{prefix}ObjectName']].append(extract_activities(caja, inner_order))
-    
-    return pack_dependencies
-def extract_sql_data(input_df, columns_to_keep:list=['File_path', 'Extracted', 'db']):
-    regex = "FROM\\s+[ _@A-Za-z0-9.\\[\\]]+|join[ _A-Za-z0-9.\\[\\]]+|insert\\s+into\\s+[ _@A-Za-z0-9.\\[\\]]+|declare[ _@A-Za-z0-9.\\[\\]]+|update\\s+[ _@A-Za-z0-9.\[\]]+"
-    # Filter rows based on the presence of SQL keywords and patterns
-    filtered_df = input_df[input_df['SqlTaskData'].str.contains(regex, case=False, na=False)]
-    
-    # Extract all matches of SQL keywords and patterns
-    matches_df = filtered_df['SqlTaskData'].str.extractall(f'({regex})', flags=re.IGNORECASE)
-    matches_df = matches_df.astype(str)
-    
-    # Aggregate matches and split; then explode to separate rows
-    filtered_df['Extracted'] = matches_df.groupby(level=0).agg('; '.join)
-    filtered_df['Extracted'] = filtered_df['Extracted'].str.split('; ')
-    exploded_df = filtered_df.explode('Extracted')
-    
-    # Extract database names, fill missing values with "No db found"
-    exploded_df['db'] = exploded_df['Extracted'].str.extract('([a-zA-Z0-9_\\[\\]]+)\\.', flags=re.IGNORECASE).fillna("No db found")
-    
     # Select specific columns and remove duplicates
-    final_df = exploded_df[columns_to_keep].drop_duplicates()
-    
-    return final_df
+    return final_df[columns_to_keep].drop_duplicates().reset_index(drop=True)
 
-def extract_values(all_files_path, pattern, split_values=False, add_prefix:bool=False) -> pd.DataFrame:
+@profiled('extract_values')
+def extract_values(all_files_path, pattern, split_values=False, add_prefix:bool=False) -> 'pd.DataFrame':
     """
     Extracts values from XML files based on a given pattern. Can optionally split values and save them to a CSV file.
 
     Parameters:
     - all_files_path: List of paths to the XML files.
-    - pattern: XPath pattern to extract values.
+    - pattern: XPath pattern to extract values, may use the DTS, SQLTask and SSIS prefixes of xpath.NAMESPACES.
     - split_values: Boolean indicating whether to split the extracted values by ';'.
 
     Returns:
     - A pandas DataFrame with the extracted values.
-    """
-    results = []
-    max_split_values = 0
-
-    for file_path in all_files_path:
-        tree = etree.parse(file_path)
-        values = tree.xpath(pattern)
-
-        for value in values:
-            file_path = '_'.join(file_path.split('\\')[-2:]) if add_prefix else file_path.split('\\')[-1]
-            result_dict = {"File_path": file_path.replace('.dtsx', '')}
-            if split_values and len(value) > 0:
-                split_values_list = value.split(';')
-                # Update max_split_values if the current list is longer
-                max_split_values = max(max_split_values, len(split_values_list))
-                for i, split_value in enumerate(split_values_list):
-                    result_dict[f"value_{i+1}"] = split_value
-            else:
-                result_dict["SqlTaskData"] = value
-            results.append(result_dict)
 
-    df = pd.DataFrame(results)
-
-    # If split_values was used, ensure all expected columns are present
-    if split_values:
-        for i in range(1, max_split_values + 1):
-            if f"value_{i}" not in df.columns:
-                df[f"value_{i}"] = None
-
-    return df
\ No newline at end of file
+    To extract several patterns from the same files in one parse use xpath.ExtractionEngine directly.
+    """
+    from xpath import ExtractionEngine, XPathPattern
+    engine = ExtractionEngine([XPathPattern('values', pattern, split_values=split_values, add_prefix=add_prefix)])
+    return engine.run(all_files_path)['values']
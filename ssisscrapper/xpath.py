@@ -0,0 +1,130 @@
+import time
+import pandas as pd
+from lxml import etree
+from cache import get_document
+
+NAMESPACES = {
+    'DTS': 'www.microsoft.com/SqlServer/Dts',
+    'SQLTask': 'www.microsoft.com/sqlserver/dts/tasks/sqltask',
+    'SSIS': 'www.microsoft.com/SqlServer/SSIS',
+}
+
+# pipeline elements carry no namespace, the .params elements live in the SSIS one
+COMPONENT_PROPERTIES = "//component/properties/property/text()"
+PARAMETER_VALUES = "//SSIS:Parameter/SSIS:Properties/SSIS:Property[7]/text()"
+
+
+class XPathPattern:
+    """
+    A named XPath expression compiled once with the SSIS namespace prefixes, plus how its values become rows.
+
+    Args:
+        name (str): key of the pattern in the engine results and timings.
+        expression (str): XPath expression, may use the DTS, SQLTask and SSIS prefixes.
+        split_values (bool): splits every value by ';' into value_1..value_n columns instead of a SqlTaskData column.
+        add_prefix (bool): names rows after the parent folder and the file instead of the file alone.
+    """
+    def __init__(self, name:str, expression:str, split_values:bool=False, add_prefix:bool=False):
+        self.name = name
+        self.expression = expression
+        self.split_values = split_values
+        self.add_prefix = add_prefix
+        self.compiled = etree.XPath(expression, namespaces=NAMESPACES, smart_strings=False)
+
+
+class ResultBuilder:
+    """
+    Collects the rows of one pattern across documents and builds its DataFrame at the end.
+
+    Methods:
+        add: Appends the rows for the values found in one file.
+        frame: Returns the collected rows as a DataFrame.
+    """
+    def __init__(self, pattern:XPathPattern):
+        self.pattern = pattern
+        self.rows = []
+        self.max_split_values = 0
+
+    def add(self, file_path:str, values:list) -> None:
+        """
+        Appends one row per value found in file_path.
+        """
+        if not values:
+            return
+        name = '_'.join(file_path.split('\\')[-2:]) if self.pattern.add_prefix else file_path.split('\\')[-1]
+        name = name.replace('.dtsx', '')
+        for value in values:
+            if self.pattern.split_values and len(value) > 0:
+                split_values_list = value.split(';')
+                self.max_split_values = max(self.max_split_values, len(split_values_list))
+                row = {"File_path": name}
+                for i, split_value in enumerate(split_values_list):
+                    row[f"value_{i+1}"] = split_value
+                self.rows.append(row)
+            else:
+                self.rows.append({"File_path": name, "SqlTaskData": value})
+
+    def frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.rows)
+        # If split_values was used, ensure all expected columns are present
+        if self.pattern.split_values:
+            for i in range(1, self.max_split_values + 1):
+                if f"value_{i}" not in df.columns:
+                    df[f"value_{i}"] = None
+        return df
+
+
+class ExtractionEngine:
+    """
+    Evaluates a set of precompiled XPath patterns against each document in a single parse.
+
+    Every file is parsed once (through the shared document cache) and all patterns run against the same tree, their
+    values streamed into one ResultBuilder per pattern. The time spent parsing and in each pattern is accumulated so
+    the query that dominates an extraction shows up in timings().
+
+    Methods:
+        evaluate: Runs every pattern against one parsed tree.
+        run: Extracts all patterns from a list of files and returns one DataFrame per pattern.
+        timings: Returns the accumulated parse and per-pattern time.
+    """
+    def __init__(self, patterns:list):
+        """
+        Initializes the engine with XPathPattern objects, or (name, expression) pairs compiled with the defaults.
+        """
+        self.patterns = [pattern if isinstance(pattern, XPathPattern) else XPathPattern(*pattern) for pattern in patterns]
+        self._seconds = {'parse': 0.0, **{pattern.name: 0.0 for pattern in self.patterns}}
+        self._matches = {'parse': 0, **{pattern.name: 0 for pattern in self.patterns}}
+
+    def evaluate(self, tree) -> dict:
+        """
+        Runs every pattern against one parsed tree. Returns {pattern name: list of values}.
+        """
+        results = {}
+        for pattern in self.patterns:
+            start = time.perf_counter()
+            results[pattern.name] = pattern.compiled(tree)
+            self._seconds[pattern.name] += time.perf_counter() - start
+            self._matches[pattern.name] += len(results[pattern.name])
+        return results
+
+    def run(self, files:list) -> dict:
+        """
+        Parses every file once, evaluates all patterns on it and returns {pattern name: DataFrame}.
+        """
+        builders = {pattern.name: ResultBuilder(pattern) for pattern in self.patterns}
+        for file_path in files:
+            start = time.perf_counter()
+            tree = get_document(file_path).tree
+            self._seconds['parse'] += time.perf_counter() - start
+            self._matches['parse'] += 1
+            for name, values in self.evaluate(tree).items():
+                builders[name].add(file_path, values)
+        return {name: builder.frame() for name, builder in builders.items()}
+
+    def timings(self) -> pd.DataFrame:
+        """
+        Returns the accumulated time per step ('parse' and one row per pattern) with its matches (files for parse),
+        slowest first.
+        """
+        df = pd.DataFrame({'step': list(self._seconds), 'seconds': list(self._seconds.values()), 'matches': list(self._matches.values())})
+        return df.sort_values('seconds', ascending=False, ignore_index=True)